@@ -1,11 +1,19 @@
 """ABRP Telemetry API integration"""
 
 import logging
+import threading
 import time
-import requests
 import urllib
 import json
 
+from collections import OrderedDict
+
+import requests
+
+from events import STATUS_CHANGED, EventSink
+from metrics import ABRP_FAILURES, ABRP_RETRIES, ABRP_SEND_TIME
+from sessions import get_session, request_timeout
+
 
 _LOGGER = logging.getLogger("fordconnect")
 
@@ -13,42 +21,185 @@ _LOGGER = logging.getLogger("fordconnect")
 class AbrpClient:
     """Class to encapsulate the ABRP Telemetry API."""
 
-    def __init__(self, api_key, token):
+    def __init__(self, api_key, token, session=None, timeout=None):
         """Create the ABRP Telemetry client."""
         self._api_key = api_key
         self._token = token
+        self._session = session or get_session("abrp")
+        self._timeout = timeout or request_timeout()
         self._last_data_time = None
 
-    def post(self, status):
-        """Post an update to the ABRP Telemetry client."""
-
-        utc = int(time.time())
-        soc = float(status.get("batteryFillLevel").get("value"))
-        latitude = status.get("gps").get("latitude")
-        longitude = status.get("gps").get("longitude")
-        odometer = float(status.get("odometer").get("value"))
-        chargingStatus = status.get("chargingStatus").get("value")
-        ignitionStatus = 1 if status.get("ignitionStatus").get("value") == "Off" else 0
-        data = {
-            "utc": utc,
-            "soc": soc,
-            "odometer": odometer,
-            "lat": latitude,
-            "lon": longitude,
-            "is_parked": ignitionStatus,
-            "is_charging": chargingStatus,
+    def telemetry(self, status):
+        """Build the ABRP telemetry sample for a vehicle status."""
+        return {
+            "utc": int(time.time()),
+            "soc": status.soc,
+            "odometer": status.odometer,
+            "lat": status.latitude,
+            "lon": status.longitude,
+            "is_parked": 1 if status.ignition == "Off" else 0,
+            "is_charging": status.charging,
         }
+
+    def request_url(self, data):
+        """URL sending a telemetry sample."""
         params = {"token": self._token, "api_key": self._api_key, "tlm": json.dumps(data, separators=(",", ":"))}
-        url = "https://api.iternio.com/1/tlm/send?" + urllib.parse.urlencode(params)
+        return "https://api.iternio.com/1/tlm/send?" + urllib.parse.urlencode(params)
+
+    def send(self, data):
+        """Send a telemetry sample, returns True if ABRP accepted it."""
+        url = self.request_url(data)
         try:
-            status = requests.get(url)
-            if status.status_code == 200:
-                self._last_data_time = int(time.time())
-        except:
-            status = None
+            response = self._session.get(url, timeout=self._timeout)
+        except requests.RequestException as e:
+            _LOGGER.info(f"ABRP telemetry update failed: {e}")
+            return False
 
-        if status.status_code == 200:
+        if response.status_code == 200:
             # _LOGGER.info(f"ABRP telemetry update was successful")
-            pass
-        else:
-            _LOGGER.info(f"ABRP telemetry update failed: {status.status_code}")
+            self._last_data_time = int(time.time())
+            return True
+        _LOGGER.info(f"ABRP telemetry update failed: {response.status_code}")
+        return False
+
+    def post(self, status):
+        """Post an update to the ABRP Telemetry client."""
+        return self.send(self.telemetry(status))
+
+
+class AbrpSender:
+    """Class to send ABRP telemetry from a background thread, only the newest sample of a vehicle is kept."""
+
+    def __init__(self, client, max_pending=32, retries=3, backoff=2.0):
+        """Create the sender and start the worker thread."""
+        self._client = client
+        self._max_pending = max_pending
+        self._retries = retries
+        self._backoff = backoff
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+        self._stopping = False
+
+        self.enqueued = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.sent = 0
+        self.failed = 0
+        self.attempts = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.delay_total = 0.0
+        self.delay_max = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="abrp", daemon=True)
+        self._thread.start()
+
+    def enqueue(self, vin, status):
+        """Queue the telemetry for a vehicle status, replaces any sample of the vehicle not yet sent."""
+        data = self._client.telemetry(status)
+        with self._condition:
+            self.enqueued += 1
+            if vin in self._pending:
+                self.coalesced += 1
+                del self._pending[vin]
+            elif len(self._pending) >= self._max_pending:
+                self.dropped += 1
+                self._pending.popitem(last=False)
+            self._pending[vin] = (data, time.monotonic())
+            self._condition.notify()
+
+    def _run(self):
+        """Worker thread sending the queued samples, oldest vehicle first."""
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopping:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                vin, (data, enqueuedAt) = self._pending.popitem(last=False)
+
+            attempt = 0
+            while True:
+                started = time.monotonic()
+                ok = self._client.send(data)
+                latency = time.monotonic() - started
+                ABRP_SEND_TIME.observe(latency)
+                with self._condition:
+                    self.attempts += 1
+                    self.latency_total += latency
+                    self.latency_max = max(self.latency_max, latency)
+                    if ok:
+                        self.sent += 1
+                        delay = time.monotonic() - enqueuedAt
+                        self.delay_total += delay
+                        self.delay_max = max(self.delay_max, delay)
+                        break
+                    attempt += 1
+                    if attempt <= self._retries:
+                        deadline = time.monotonic() + self._backoff * 2 ** (attempt - 1)
+                        while not self._stopping and vin not in self._pending:
+                            remaining = deadline - time.monotonic()
+                            if remaining <= 0:
+                                break
+                            self._condition.wait(remaining)
+                    # give up if out of retries or a newer sample for the vehicle has arrived
+                    if attempt > self._retries or vin in self._pending or self._stopping:
+                        self.failed += 1
+                        ABRP_FAILURES.inc()
+                        break
+                ABRP_RETRIES.inc()
+
+    def depth(self):
+        """Number of samples waiting to be sent."""
+        with self._condition:
+            return len(self._pending)
+
+    def metrics(self):
+        """Queue depth, send counters, request latency and the delay from enqueue to delivery in seconds."""
+        with self._condition:
+            return {
+                "depth": len(self._pending),
+                "enqueued": self.enqueued,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "sent": self.sent,
+                "failed": self.failed,
+                "latency_avg": self.latency_total / self.attempts if self.attempts else 0.0,
+                "latency_max": self.latency_max,
+                "delay_avg": self.delay_total / self.sent if self.sent else 0.0,
+                "delay_max": self.delay_max,
+            }
+
+    def log_metrics(self):
+        """Log the sender metrics."""
+        metrics = self.metrics()
+        _LOGGER.info(
+            f"ABRP telemetry: {metrics.get('sent')} sent, {metrics.get('failed')} failed, "
+            f"{metrics.get('coalesced')} coalesced, {metrics.get('dropped')} dropped, {metrics.get('depth')} queued, "
+            f"request latency {metrics.get('latency_avg') * 1000:.0f} ms avg / {metrics.get('latency_max') * 1000:.0f} ms max"
+        )
+
+    def close(self, timeout=5.0):
+        """Stop the worker thread once the queued samples are sent."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+
+class AbrpSink(EventSink):
+    """Class to send the telemetry of every status change to ABRP through a sender."""
+
+    name = "abrp"
+    types = [STATUS_CHANGED]
+
+    def __init__(self, sender):
+        """Send through an AbrpSender, which keeps only the newest sample of each vehicle."""
+        self._sender = sender
+
+    def handle(self, event):
+        self._sender.enqueue(event.vin, event.status)
+
+    def close(self):
+        self._sender.close()
+        self._sender.log_metrics()
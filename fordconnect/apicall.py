@@ -0,0 +1,259 @@
+"""Retries, backoff and circuit breakers for the FordPass API calls."""
+
+import logging
+import random
+import threading
+import time
+
+import requests
+
+from metrics import API_FAILURES, API_LATENCY, API_RETRIES
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+# HTTP status codes worth trying again, anything else is the caller's problem
+_RETRYABLE_STATUS = [429, 500, 502, 503, 504]
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without calling the API while the circuit breaker of an endpoint is open."""
+
+
+def is_retryable(e):
+    """True for connection errors, timeouts, rate limiting and server errors."""
+    if isinstance(e, (requests.ConnectionError, requests.Timeout)):
+        return not isinstance(e, CircuitOpenError)
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code in _RETRYABLE_STATUS
+    return False
+
+
+def _retry_after(e):
+    """Seconds from the Retry-After header of a rate limited response, None if absent."""
+    response = getattr(e, "response", None)
+    if response is None or response.status_code != 429:
+        return None
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Class to stop calling an endpoint after repeated failures, one trial call is let through after 'reset_timeout' seconds."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=60.0, clock=time.monotonic):
+        """Create a closed circuit breaker."""
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._failures = 0
+        self._openedAt = None
+        self._trial = False
+        self.opened = 0
+
+    @property
+    def state(self):
+        """'closed', 'open' or 'half-open'."""
+        if self._openedAt is None:
+            return "closed"
+        return "half-open" if self._clock() - self._openedAt >= self._reset_timeout else "open"
+
+    def allow(self):
+        """True if a call may be made now, caller holds the lock."""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def success(self):
+        """Record a successful call, closes the breaker."""
+        self._failures = 0
+        self._openedAt = None
+        self._trial = False
+
+    def failure(self):
+        """Record a failed call, returns True if this failure opened a closed breaker."""
+        self._failures += 1
+        if self._trial or self._failures >= self._failure_threshold:
+            opening = self._openedAt is None
+            self.opened += opening
+            self._openedAt = self._clock()
+            self._trial = False
+            return opening
+        return False
+
+
+class EndpointStats:
+    """Class to count the calls, errors and latency of an endpoint."""
+
+    def __init__(self):
+        self.calls = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retries = 0
+        self.rejected = 0
+        self.attempts = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_error = None
+
+    def as_dict(self):
+        """Counters and latency in seconds."""
+        return {
+            "calls": self.calls,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "latency_avg": self.latency_total / self.attempts if self.attempts else 0.0,
+            "latency_max": self.latency_max,
+            "last_error": self.last_error,
+        }
+
+
+class ApiCaller:
+    """Class to make API calls with retries, exponential backoff with jitter and a circuit breaker per endpoint."""
+
+    def __init__(
+        self,
+        attempts=3,
+        backoff=1.0,
+        max_backoff=30.0,
+        failure_threshold=5,
+        reset_timeout=60.0,
+        sleep=time.sleep,
+        clock=time.monotonic,
+    ):
+        """Create the caller, all times are in seconds."""
+        self._attempts = max(1, attempts)
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._sleep = sleep
+        self._clock = clock
+        self._breakers = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, endpoint):
+        """Circuit breaker and counters of an endpoint, caller holds the lock."""
+        if endpoint not in self._breakers:
+            self._breakers[endpoint] = CircuitBreaker(self._failure_threshold, self._reset_timeout, self._clock)
+            self._stats[endpoint] = EndpointStats()
+        return self._breakers[endpoint], self._stats[endpoint]
+
+    def call(self, endpoint, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) for a named endpoint, the last error is raised once the attempts run out."""
+        with self._lock:
+            breaker, stats = self._endpoint(endpoint)
+            stats.calls += 1
+
+        attempt = 0
+        while True:
+            with self._lock:
+                if not breaker.allow():
+                    stats.rejected += 1
+                    stats.failed += 1
+                    API_FAILURES.inc(endpoint, "circuit_open")
+                    raise CircuitOpenError(f"FordPass API endpoint '{endpoint}' is unavailable, circuit breaker is open")
+
+            started = self._clock()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                latency = self._clock() - started
+                API_LATENCY.observe(latency, endpoint)
+                retryable = is_retryable(e)
+                with self._lock:
+                    stats.attempts += 1
+                    stats.latency_total += latency
+                    stats.latency_max = max(stats.latency_max, latency)
+                    stats.last_error = str(e)
+                    if retryable:
+                        if breaker.failure():
+                            _LOGGER.warning(
+                                f"FordPass API endpoint '{endpoint}' keeps failing, pausing calls for {self._reset_timeout} s"
+                            )
+                    else:
+                        # the API answered, it is up even if it did not like the request
+                        breaker.success()
+                    attempt += 1
+                    if not retryable or attempt >= self._attempts:
+                        stats.failed += 1
+                        API_FAILURES.inc(endpoint, "error")
+                        if retryable:
+                            _LOGGER.error(f"FordPass Connect API unavailable ({endpoint}): {e}")
+                        raise
+                    stats.retries += 1
+                    API_RETRIES.inc(endpoint)
+
+                delay = random.uniform(0, min(self._max_backoff, self._backoff * 2 ** (attempt - 1)))
+                retryAfter = _retry_after(e)
+                if retryAfter is not None:
+                    delay = min(self._max_backoff, max(delay, retryAfter))
+                _LOGGER.debug(f"FordPass API call '{endpoint}' failed ({e}), retrying in {delay:.1f} s")
+                self._sleep(delay)
+                continue
+
+            latency = self._clock() - started
+            API_LATENCY.observe(latency, endpoint)
+            with self._lock:
+                stats.attempts += 1
+                stats.latency_total += latency
+                stats.latency_max = max(stats.latency_max, latency)
+                stats.succeeded += 1
+                breaker.success()
+            return result
+
+    def stats(self):
+        """Counters, latency and circuit breaker state of every endpoint called so far."""
+        with self._lock:
+            return {
+                endpoint: {**stats.as_dict(), "breaker": self._breakers[endpoint].state, "opened": self._breakers[endpoint].opened}
+                for endpoint, stats in self._stats.items()
+            }
+
+    def log_stats(self):
+        """Log the counters of every endpoint called so far."""
+        for endpoint, stats in self.stats().items():
+            _LOGGER.info(
+                f"FordPass API '{endpoint}': {stats.get('calls')} calls, {stats.get('failed')} failed, "
+                f"{stats.get('retries')} retries, {stats.get('rejected')} rejected, breaker {stats.get('breaker')}, "
+                f"latency {stats.get('latency_avg') * 1000:.0f} ms avg / {stats.get('latency_max') * 1000:.0f} ms max"
+            )
+
+
+_CALLER = ApiCaller()
+
+
+def configure_api(options):
+    """Replace the shared caller with one using the configured retry and circuit breaker settings."""
+    global _CALLER
+    _CALLER = ApiCaller(
+        attempts=options.get('attempts'),
+        backoff=options.get('backoff'),
+        max_backoff=options.get('max_backoff'),
+        failure_threshold=options.get('failure_threshold'),
+        reset_timeout=options.get('reset_timeout'),
+    )
+
+
+def api_call(endpoint, fn, *args, **kwargs):
+    """Call the FordPass API through the shared caller."""
+    return _CALLER.call(endpoint, fn, *args, **kwargs)
+
+
+def api_stats():
+    """Counters of the shared caller."""
+    return _CALLER.stats()
+
+
+def log_api_stats():
+    """Log the counters of the shared caller."""
+    _CALLER.log_stats()
@@ -0,0 +1,171 @@
+"""Benchmarks of the FordPass API retries, token cache and shared HTTP sessions"""
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from apicall import ApiCaller
+from benchdata import sample_status
+from sessions import close_sessions, get_session
+from tokencache import CachedVehicle
+
+
+class FlakyApi:
+    """Stand-in FordPass endpoint on a virtual clock, down for a while and returning transient errors otherwise."""
+
+    def __init__(self, clock, outage=(600, 900), error_rate=0.2, seed=1):
+        self._clock = clock
+        self._outage = outage
+        self._error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.requests = 0
+        self.outage_requests = 0
+
+    def status(self):
+        self.requests += 1
+        now = self._clock()
+        if self._outage[0] <= now < self._outage[1]:
+            self.outage_requests += 1
+            raise requests.ConnectionError("connection refused")
+        if self._rng.random() < self._error_rate:
+            response = requests.Response()
+            response.status_code = self._rng.choice((429, 503))
+            raise requests.HTTPError(f"{response.status_code} Server Error", response=response)
+        return sample_status()
+
+
+def legacy_get_status(api):
+    """The original retry loop, three immediate tries on connection errors only."""
+    tries = 3
+    while tries > 0:
+        try:
+            return api.status()
+        except requests.ConnectionError:
+            tries -= 1
+            if tries == 0:
+                raise
+
+
+def bench_api(duration=1800, interval=15):
+    """Poll a flaky endpoint on a virtual clock with the original retry loop and the resilient call layer."""
+    print(f"Polling a flaky API every {interval} s for {duration} s, 20% 429/503 responses and a 5 minute outage")
+    for label in ("original", "resilient"):
+        now = [0.0]
+        clock = lambda: now[0]  # noqa: E731
+
+        def sleep(seconds):
+            now[0] += seconds
+
+        api = FlakyApi(clock)
+        caller = ApiCaller(sleep=sleep, clock=clock)
+        polls = succeeded = 0
+        while now[0] < duration:
+            polls += 1
+            try:
+                if label == "original":
+                    legacy_get_status(api)
+                else:
+                    caller.call("status", api.status)
+                succeeded += 1
+            except requests.RequestException:
+                pass
+            now[0] = polls * interval
+        print(
+            f"  {label:9s}: {succeeded}/{polls} polls succeeded, {api.requests} requests, "
+            f"{api.outage_requests} of them during the outage"
+        )
+
+
+class StubLoginVehicle(CachedVehicle):
+    """CachedVehicle whose login and status requests are local stand-ins with fixed latencies."""
+
+    def __init__(self, cache_file, login_latency, latency):
+        super().__init__(username="user@example.com", password="secret", vin="1234567890", cache_file=cache_file)
+        self._login_latency = login_latency
+        self._latency = latency
+
+    def _login(self):
+        time.sleep(self._login_latency)
+        self.token = "token"
+        self.expiresAt = time.time() + 3600
+        return True
+
+    def status(self):
+        self._Vehicle__acquireToken()
+        time.sleep(self._latency)
+        return sample_status()
+
+
+def bench_token_cache(login_latency=0.8, latency=0.3, runs=3):
+    """Time to the first status of a one-shot command, logging in (cold) or with a cached token (warm)."""
+    print(f"One-shot command start, {login_latency * 1000:.0f} ms stub login and {latency * 1000:.0f} ms status request")
+    with tempfile.TemporaryDirectory() as directory:
+        cacheFile = os.path.join(directory, "token.json")
+        for label in ("cold", "warm"):
+            times = []
+            for _ in range(runs):
+                if label == "cold" and os.path.exists(cacheFile):
+                    os.remove(cacheFile)
+                started = time.perf_counter()
+                StubLoginVehicle(cacheFile, login_latency, latency).status()
+                times.append(time.perf_counter() - started)
+            print(f"  {label}: {sum(times) / len(times) * 1000:6.0f} ms to the first status")
+        print(f"  token cache file mode {oct(os.stat(cacheFile).st_mode & 0o777)}")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """HTTP/1.1 keep-alive handler answering every GET with a small JSON body."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    body = json.dumps({"status": "ok", "USGS_Elevation_Point_Query_Service": {"Elevation_Query": {"Elevation": 170.2}}})
+
+    def do_GET(self):
+        body = self.body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def bench_sessions(count=500):
+    """Latency of per-call requests.get() versus a pooled session against a local HTTP stub."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/1/tlm/send"
+
+    def run(get):
+        latencies = []
+        for _ in range(count):
+            started = time.perf_counter()
+            get(url, timeout=10).json()
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        return sum(latencies) / count, latencies[int(count * 0.99)]
+
+    session = get_session("benchmark")
+    print(f"HTTP request latency over {count} requests to a local stub")
+    for name, get in [("requests.get", requests.get), ("pooled session", session.get)]:
+        mean, p99 = run(get)
+        print(f"  {name:14s}: {mean * 1000:6.3f} ms mean, {p99 * 1000:6.3f} ms p99")
+    close_sessions()
+    server.shutdown()
+    server.server_close()
+
+
+def run(statuses):
+    """FordPass API call benchmarks against local stubs, 'statuses' are not used."""
+    bench_api()
+    bench_token_cache()
+    bench_sessions()
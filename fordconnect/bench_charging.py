@@ -0,0 +1,61 @@
+"""Benchmarks of the charge session analytics"""
+
+import math
+import os
+import tempfile
+import time
+
+from benchdata import sample_chargelogs
+from chargeanalytics import ChargeAnalytics
+
+
+def recompute_charge_totals(analytics, vin):
+    """Month totals rebuilt from every stored session, what each run would cost without the running totals."""
+    months = {}
+    for session in analytics.sessions(vin):
+        totals = months.setdefault(session.month, [0, 0.0])
+        totals[0] += 1
+        totals[1] += session.kwh
+    return months
+
+
+def bench_charge_analytics(history=2000, batches=20, batch=5, capacity=88):
+    """Time adding a few new charge logs to a long history against rebuilding the totals from the history."""
+    chargeLogs = sample_chargelogs(history + batches * batch)
+    vin = "1234567890"
+    with tempfile.TemporaryDirectory() as directory:
+        analytics = ChargeAnalytics(os.path.join(directory, "charging.db"), capacity=capacity)
+        started = time.perf_counter()
+        analytics.add_logs(vin, chargeLogs[:history])
+        loaded = time.perf_counter() - started
+
+        incremental = recomputed = 0.0
+        for i in range(batches):
+            # the API returns the recent history every time, only the last few logs are new
+            logs = chargeLogs[: history + (i + 1) * batch][-history:]
+            started = time.perf_counter()
+            analytics.add_logs(vin, logs)
+            incremental += time.perf_counter() - started
+            started = time.perf_counter()
+            months = recompute_charge_totals(analytics, vin)
+            recomputed += time.perf_counter() - started
+
+        totals = {total.get("month"): total for total in analytics.month_totals(vin)}
+        mismatches = sum(
+            1
+            for month, (sessions, kwh) in months.items()
+            if totals[month].get("sessions") != sessions or not math.isclose(totals[month].get("kwh"), kwh)
+        )
+        locations = analytics.location_totals(vin)
+        analytics.close()
+    print(f"Charge analytics, {history} charge logs then {batches} updates of {batch} new logs")
+    print(
+        f"  first pass {loaded * 1000:.0f} ms, {len(locations)} locations, {len(totals)} months\n"
+        f"  update {incremental / batches * 1000:.2f} ms, rebuilding the totals {recomputed / batches * 1000:.2f} ms, "
+        f"{mismatches} mismatches"
+    )
+
+
+def run(statuses):
+    """Charge analytics benchmark on synthetic charge logs, 'statuses' are not used."""
+    bench_charge_analytics()
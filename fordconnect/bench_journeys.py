@@ -0,0 +1,144 @@
+"""Benchmarks of the journey prefetch, geocode and elevation caches and journey analytics"""
+
+import math
+import time
+
+import journeyanalytics
+import journeys as journeytool
+
+from benchdata import StubGeocoder, StubVehicle, sample_journeys, sample_locations
+from geocoder import CachedGeocoder
+from gridcache import GridCache
+from usgs_elevation import ElevationService
+
+
+def bench_geocache(journeys, precision=4):
+    """Replay journey endpoints through the reverse geocode cache and report the hit rate."""
+    client = StubGeocoder()
+    geocoder = CachedGeocoder(client, GridCache(":memory:", "reverse_geocode", precision=precision))
+    for journey in journeys:
+        for point in (journey.get("start"), journey.get("end")):
+            geocoder.reverse((point.get("latitude"), point.get("longitude")))
+    stats = geocoder.stats()
+    print(f"Reverse geocoding of {len(journeys)} journeys, grid precision {precision} decimal places")
+    print(
+        f"  {client.requests} Geocodio requests, {stats.get('hits')} cache hits, "
+        f"hit rate {stats.get('hit_rate') * 100:.1f}%"
+    )
+
+
+def bench_elevation(journeys, precision=4):
+    """Replay journey endpoints through the elevation service twice and count USGS requests."""
+    requests = []
+
+    def fetch(lat, lon):
+        requests.append((lat, lon))
+        return 100.0
+
+    service = ElevationService(cache=GridCache(":memory:", "elevation", precision=precision), fetch=fetch)
+    print(f"Elevation lookups for {len(journeys)} journeys, grid precision {precision} decimal places")
+    for replay in range(2):
+        before = len(requests)
+        for journey in journeys:
+            start = journey.get("start")
+            end = journey.get("end")
+            service.elevation_change(
+                start=(start.get("latitude"), start.get("longitude")), end=(end.get("latitude"), end.get("longitude"))
+            )
+        print(f"  pass {replay + 1}: {len(requests) - before} USGS requests for {2 * len(journeys)} lookups")
+
+
+def bench_journeys(journeys, workers=(1, 4, 16), latency=0.05):
+    """Wall-clock time to prefetch detailed journeys with elevations and addresses."""
+    vehicle = StubVehicle("1234567890", latency)
+    vehicle.journeys = {journey.get("journeyID"): journey for journey in journeys}
+
+    def elevation(lat, lon):
+        time.sleep(latency)
+        return 100.0
+
+    print(f"Prefetching {len(journeys)} detailed journeys, 50 ms stub latency for every request")
+    for count in workers:
+        journeytool._VEHICLECLIENT = vehicle
+        journeytool._GEOCLIENT = CachedGeocoder(StubGeocoder(latency), GridCache(":memory:", "reverse_geocode"))
+        journeytool._ELEVATION = ElevationService(fetch=elevation)
+        started = time.perf_counter()
+        journeytool.prefetch_journeys(
+            journeys, detailed=True, showReverseAddress=True, showElevation=True, workers=count
+        )
+        print(f"  {count:3d} worker(s): {time.perf_counter() - started:6.2f} s")
+
+
+def python_journey_analytics(journeys, stopSpeed=0.5, minStop=30):
+    """Pure Python version of journeyanalytics.analyze() used as the baseline."""
+    results = []
+    for journey in journeys:
+        locations = journey.get("locations")
+        distance = moving = idle = maxAccel = maxBraking = absAccel = 0.0
+        samples = stops = 0
+        runStart = None
+        for i, location in enumerate(locations):
+            if location.get("speed") <= stopSpeed:
+                if runStart is None:
+                    runStart = location.get("timestamp")
+            elif runStart is not None:
+                stops += locations[i - 1].get("timestamp") - runStart >= minStop
+                runStart = None
+            if i == 0:
+                continue
+            a, b = locations[i - 1], location
+            lat1, lon1 = math.radians(a.get("latitude")), math.radians(a.get("longitude"))
+            lat2, lon2 = math.radians(b.get("latitude")), math.radians(b.get("longitude"))
+            h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+            distance += 2 * 6371008.8 * math.asin(math.sqrt(h))
+            dt = b.get("timestamp") - a.get("timestamp")
+            if a.get("speed") <= stopSpeed and b.get("speed") <= stopSpeed:
+                idle += dt
+            else:
+                moving += dt
+            if dt > 0:
+                accel = (b.get("speed") - a.get("speed")) / dt
+                maxAccel, maxBraking = max(maxAccel, accel), max(maxBraking, -accel)
+                absAccel += abs(accel)
+                samples += 1
+        if runStart is not None and locations:
+            stops += locations[-1].get("timestamp") - runStart >= minStop
+        results.append((distance, moving, idle, stops, maxAccel, maxBraking, absAccel / max(samples, 1)))
+    return results
+
+
+def bench_journey_analytics(counts=(100, 1000, 5000), points=300):
+    """Time the vectorized journey analytics against a pure Python loop, including loading the arrays."""
+    keys = ("distance", "moving", "idle", "stops", "max_accel", "max_braking", "mean_abs_accel")
+    print(f"Journey location analytics, {points} locations per journey")
+    for count in counts:
+        journeys = sample_locations(count, points)
+
+        started = time.perf_counter()
+        expected = python_journey_analytics(journeys)
+        python = time.perf_counter() - started
+
+        started = time.perf_counter()
+        locations = journeyanalytics.JourneyLocations.from_journeys(journeys)
+        loaded = time.perf_counter() - started
+        results = journeyanalytics.analyze(locations)
+        numpy = time.perf_counter() - started
+
+        mismatches = sum(
+            1
+            for i, row in enumerate(expected)
+            for key, value in zip(keys, row)
+            if not math.isclose(float(results.get(key)[i]), value, rel_tol=1e-6, abs_tol=1e-6)
+        )
+        print(
+            f"  {count:5d} journeys: python {python * 1000:8.1f} ms, numpy {numpy * 1000:7.1f} ms "
+            f"({loaded * 1000:.1f} ms loading), {python / numpy:5.1f}x, {mismatches} mismatches"
+        )
+
+
+def run(statuses):
+    """Journey benchmarks on 60 synthetic journeys, 'statuses' are not used."""
+    bench_geocache(sample_journeys(60))
+    bench_elevation(sample_journeys(60))
+    bench_journeys(sample_journeys(60))
+    bench_journey_analytics()
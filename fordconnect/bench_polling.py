@@ -0,0 +1,306 @@
+"""Benchmarks of the poller, scheduler, replay, event sinks, ABRP telemetry and metrics"""
+
+import copy
+import logging
+import os
+import tempfile
+import time
+
+import requests
+
+import fordconnect
+
+from abrp import AbrpSender, AbrpSink
+from benchdata import StubAbrpClient, StubVehicle, fordtime, sample_day, sample_recording, sample_status
+from events import Event, EventBus, JsonLinesSink, STATUS_CHANGED, WebhookSink
+from metrics import Histogram, MetricsServer, REGISTRY
+from poller import VehiclePoller, VehicleState
+from replay import Recording, ReplayVehicle, VirtualClock
+from scheduler import PollScheduler
+from usgs_elevation import ElevationService
+from vehiclestatus import VehicleStatus
+
+
+def bench_poller(fleet_sizes=(1, 10, 100), max_workers=(1, 4, 16), latency=0.05, cycles=3):
+    """Time per poll cycle for fleets of stub vehicles."""
+    print(f"Poll cycle time, stub API latency {latency * 1000:.0f} ms")
+    for vehicles in fleet_sizes:
+        for workers in max_workers:
+            states = [VehicleState(vin=f"VIN{i:05d}", client=StubVehicle(f"VIN{i:05d}", latency)) for i in range(vehicles)]
+            poller = VehiclePoller(
+                vehicles=states,
+                fetch=lambda state: state.client.status(),
+                process=lambda state, status: None,
+                max_workers=workers,
+            )
+            elapsed = min(poller.poll_once() for _ in range(cycles))
+            poller.close()
+            print(
+                f"  {vehicles:4d} vehicle(s), {workers:3d} worker(s): {elapsed * 1000:8.1f} ms per cycle, "
+                f"{vehicles / elapsed:8.1f} vehicles/s"
+            )
+
+
+class _SimulatedVehicle:
+    """Vehicle of the synthetic day, its status at the time of a virtual clock."""
+
+    def __init__(self, events, clock):
+        self._events = events
+        self._clock = clock
+        self._status = sample_status()
+
+    def status(self):
+        now = self._clock.time()
+        changed, ignition, charging, sleep = [event for event in self._events if event[0] <= now][-1]
+        status = self._status
+        status["ignitionStatus"]["value"] = ignition
+        status["chargingStatus"]["value"] = charging
+        status["deepSleepInProgress"]["value"] = sleep
+        status["lastModifiedDate"] = fordtime(changed)
+        status["serverTime"] = fordtime(now)
+        return VehicleStatus.from_payload(copy.deepcopy(status))
+
+
+def simulate_polling(events, starts, ends, schedule, day=86400):
+    """Poll the synthetic day through the poller with a schedule(state), returns the API calls, trip start/end
+    detection delays and the number of trips where the status sent when the ignition changed was missed."""
+    clock = VirtualClock()
+    state = VehicleState("1234567890", _SimulatedVehicle(events, clock))
+    startDelays, endDelays = [], []
+    missed = [0]
+
+    def process(state, status):
+        now = clock.time()
+        seenIgnition = state.previousStatus.ignition if state.previousStatus else "Off"
+        if status.ignition != seenIgnition:
+            changedAt = max(t for t in (starts if status.ignition == "Run" else ends) if t <= now)
+            (startDelays if status.ignition == "Run" else endDelays).append(now - changedAt)
+            missed[0] += abs(status.modified - (1631404800 + changedAt)) > 1
+        if state.previousStatus is None or status.modified > state.previousStatus.modified:
+            state.previousStatus = status
+
+    poller = VehiclePoller(
+        [state],
+        fetch=lambda state: state.client.status(),
+        process=process,
+        schedule=schedule,
+        clock=clock.monotonic,
+        sleep=clock.sleep,
+    )
+    poller.run(until=lambda: clock.time() >= day)
+    poller.close()
+    return state.polls, startDelays, endDelays, missed[0]
+
+
+def bench_scheduler():
+    """Compare the fixed 15 second poll with the adaptive scheduler on a synthetic day."""
+    events, starts, ends = sample_day()
+    scheduler = PollScheduler()
+    print(f"Polling a synthetic day with {len(starts)} trips and an overnight charge")
+    for name, schedule in [("fixed 15 s", lambda state: 15), ("adaptive", scheduler.schedule)]:
+        polls, startDelays, endDelays, missed = simulate_polling(events, starts, ends, schedule)
+        print(
+            f"  {name:10s}: {polls:5d} API calls per day, trip start detected after "
+            f"{sum(startDelays) / len(startDelays):5.1f} s avg / {max(startDelays):5.1f} s max, "
+            f"trip end after {sum(endDelays) / len(endDelays):5.1f} s avg / {max(endDelays):5.1f} s max, "
+            f"{missed} ignition change report(s) missed"
+        )
+
+
+def bench_abrp(statuses, vehicles=10):
+    """Cost of queueing ABRP telemetry from the poll loop versus posting inline."""
+    client = StubAbrpClient()
+    statuses = [VehicleStatus.from_payload(status) for status in statuses]
+    started = time.perf_counter()
+    for status in statuses[:20]:
+        client.send(client.telemetry(status))
+    inline = (time.perf_counter() - started) / 20
+
+    sender = AbrpSender(client)
+    started = time.perf_counter()
+    for i, status in enumerate(statuses):
+        sender.enqueue(f"VIN{i % vehicles:05d}", status)
+    enqueue = (time.perf_counter() - started) / len(statuses)
+    sender.close(timeout=10.0)
+    metrics = sender.metrics()
+    print(f"ABRP telemetry for {len(statuses)} statuses of {vehicles} vehicles, stub latency 50 ms")
+    print(f"  inline post: {inline * 1e6:10.1f} us per status")
+    print(f"  enqueue:     {enqueue * 1e6:10.1f} us per status")
+    print(
+        f"  {metrics.get('sent')} sent, {metrics.get('coalesced')} coalesced, {metrics.get('dropped')} dropped, "
+        f"delivered {metrics.get('delay_avg') * 1000:.0f} ms avg after enqueue"
+    )
+
+
+class _TripCounter(logging.Handler):
+    """Count the trips the monitor detects."""
+
+    def __init__(self):
+        super().__init__()
+        self.trips = 0
+
+    def emit(self, record):
+        self.trips += record.getMessage().startswith("Trip ended")
+
+
+def bench_replay(days=3):
+    """Replay recorded days through the monitor on a virtual clock."""
+    logger = logging.getLogger("fordconnect")
+    counter = _TripCounter()
+    level = logger.level
+    logger.addHandler(counter)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    fordconnect._ELEVATION = ElevationService(fetch=lambda lat, lon: 100.0)
+    fordconnect._LOGSTATUS = False
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "recording.jsonl.gz")
+        trips = sample_recording(filename, days)
+        size = os.path.getsize(filename)
+        started = time.perf_counter()
+        recording = Recording(filename)
+        loaded = time.perf_counter() - started
+
+        clock = VirtualClock(start=recording.start)
+        scheduler = PollScheduler()
+        vehicles = [VehicleState(vin, ReplayVehicle(recording, vin, clock)) for vin in recording.vins]
+        poller = VehiclePoller(
+            vehicles,
+            fetch=lambda state: VehicleStatus.from_payload(state.client.status()),
+            process=fordconnect.process_status,
+            schedule=scheduler.schedule,
+            clock=clock.monotonic,
+            sleep=clock.sleep,
+        )
+        started = time.perf_counter()
+        poller.run(until=lambda: clock.time() > recording.end)
+        elapsed = time.perf_counter() - started
+        poller.close()
+    logger.removeHandler(counter)
+    logger.setLevel(level)
+    logger.propagate = True
+    fordconnect._ELEVATION = None
+    fordconnect._LOGSTATUS = True
+
+    hours = (clock.time() - recording.start) / 3600
+    print(f"Replay of {days} recorded days, {recording.count} status responses in {size / 1024:.0f} kB (loaded in {loaded * 1000:.0f} ms)")
+    print(
+        f"  {hours:.1f} hours replayed in {elapsed:.2f} s ({hours * 3600 / elapsed:.0f}x real time), "
+        f"{vehicles[0].polls} polls, {counter.trips} of {trips} trips detected"
+    )
+
+
+def bench_metrics(count=100000):
+    """Cost of recording a metric and of a scrape, then where the time of the benchmarks above went."""
+    histogram = Histogram("bench_seconds", "Benchmark histogram", ["endpoint"])
+    started = time.perf_counter()
+    for i in range(count):
+        histogram.observe(i * 1e-6, "status")
+    observe = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in range(count):
+        with histogram.time("status"):
+            pass
+    timed = time.perf_counter() - started
+
+    server = MetricsServer(REGISTRY, port=0)
+    server.start()
+    session = requests.Session()
+    url = f"http://127.0.0.1:{server.port}/metrics"
+    session.get(url)
+    started = time.perf_counter()
+    for _ in range(20):
+        response = session.get(url)
+    scrape = (time.perf_counter() - started) / 20
+    session.close()
+    server.close()
+
+    terminated = response.text.endswith("# EOF\n")
+    print(f"Metrics, {count} observations")
+    print(
+        f"  observe {observe / count * 1e9:.0f} ns, timed block {timed / count * 1e9:.0f} ns, "
+        f"scrape {scrape * 1000:.2f} ms for {len(response.content)} bytes, ends with EOF: {terminated}"
+    )
+    # histogram name -> labels -> (count, sum), parsed back from the exposition
+    totals = {}
+    for line in response.text.splitlines():
+        name, _, value = line.rpartition(" ")
+        for suffix in ("_count", "_sum"):
+            metric, brace, labels = name.partition("{")
+            if metric.endswith(suffix) and metric.endswith("seconds" + suffix):
+                entry = totals.setdefault((metric[: -len(suffix)], brace + labels), [0, 0.0])
+                entry[suffix == "_sum"] = float(value)
+    for (metric, labels), (observed, seconds) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        if observed:
+            print(f"  {metric}{labels}: {int(observed)} observed, {seconds:.2f} s total, {seconds / observed * 1000:.3f} ms avg")
+
+
+class StubWebhookSession:
+    """Session whose POST requests take a fixed latency and always succeed."""
+
+    class Response:
+        def raise_for_status(self):
+            pass
+
+    def __init__(self, latency):
+        self._latency = latency
+
+    def post(self, url, json=None, timeout=None):
+        time.sleep(self._latency)
+        return self.Response()
+
+
+def bench_events(statuses, count=400, abrp_latency=0.05, webhook_latency=0.02, poll=0.005):
+    """Time the poll loop spends on the ABRP, JSON-lines and webhook destinations, called inline or through the event bus."""
+    events = [
+        Event(STATUS_CHANGED, status.vin, status.modified, status)
+        for status in (VehicleStatus.from_payload(status) for status in statuses[:count])
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        abrp = StubAbrpClient(abrp_latency)
+        jsonl = JsonLinesSink(os.path.join(directory, "inline.jsonl"))
+        webhook = WebhookSink("http://127.0.0.1/webhook", session=StubWebhookSession(webhook_latency), timeout=1.0)
+        sample = events[:20]
+        started = time.perf_counter()
+        for event in sample:
+            abrp.post(event.status)
+            jsonl.handle(event)
+            webhook.handle(event)
+        inline = (time.perf_counter() - started) / len(sample)
+        jsonl.close()
+
+        bus = EventBus(queue_size=64)
+        bus.subscribe(AbrpSink(AbrpSender(StubAbrpClient(abrp_latency))))
+        bus.subscribe(JsonLinesSink(os.path.join(directory, "events.jsonl")))
+        bus.subscribe(WebhookSink("http://127.0.0.1/webhook", session=StubWebhookSession(webhook_latency), timeout=1.0))
+        publish = 0.0
+        for event in events:
+            started = time.perf_counter()
+            bus.publish(event)
+            publish += time.perf_counter() - started
+            # the rest of a poll cycle
+            time.sleep(poll)
+        bus.close(timeout=30.0)
+        metrics = bus.metrics()
+
+    print(
+        f"Event destinations for {len(events)} status changes, stub ABRP {abrp_latency * 1000:.0f} ms and "
+        f"webhook {webhook_latency * 1000:.0f} ms, a poll every {poll * 1000:.0f} ms"
+    )
+    print(f"  inline:    {inline * 1e6:10.1f} us of each poll")
+    print(f"  event bus: {publish / len(events) * 1e6:10.1f} us of each poll")
+    for name, sink in metrics.items():
+        print(
+            f"    {name:8s} {sink.get('handled')} handled, {sink.get('dropped')} dropped from its queue, "
+            f"{sink.get('failed')} failed"
+        )
+
+
+def run(statuses):
+    """Poll loop benchmarks, the event sink and ABRP benchmarks replay the status payloads."""
+    bench_poller()
+    bench_scheduler()
+    bench_replay()
+    bench_events(statuses)
+    bench_abrp(statuses)
+    bench_metrics()
@@ -0,0 +1,125 @@
+"""Benchmarks of the tool startup and configuration loading"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import version
+
+from readconfig import load_config
+
+
+_STARTUP_BUDGET = {
+    "fordconnect": 300,
+    "journeys": 300,
+    "chargelogs": 250,
+    "triplogs": 250,
+    "plugstatus": 250,
+    "triphistory": 250,
+}
+
+
+_LAZY_MODULES = ["geocodio", "numpy"]
+
+
+def import_time(module, runs=3):
+    """Median cumulative import time of a module in a fresh interpreter from 'python -X importtime', in ms."""
+    times = []
+    imported = set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+        )
+        for line in result.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) != 3 or not parts[1].strip().isdigit():
+                continue
+            name = parts[2].strip()
+            imported.add(name)
+            if parts[2].rstrip() == f" {module}":
+                times.append(int(parts[1]) / 1000)
+    times.sort()
+    return times[len(times) // 2] if times else None, imported
+
+
+def bench_startup():
+    """Import time of every tool against its budget, and the cost of looking up the version."""
+    started = time.perf_counter()
+    version.get_git_version()
+    git = time.perf_counter() - started
+    version.get_version.cache_clear()
+    started = time.perf_counter()
+    version.get_version()
+    cached = time.perf_counter() - started
+    print(f"Version lookup: git describe {git * 1000:.1f} ms, build time version {cached * 1000:.2f} ms")
+
+    print("Tool import time, median of 3 fresh interpreters")
+    over = []
+    for module, budget in _STARTUP_BUDGET.items():
+        elapsed, imported = import_time(module)
+        eager = [name for name in _LAZY_MODULES if name in imported]
+        ok = elapsed is not None and elapsed <= budget and not eager
+        if not ok:
+            over.append(module)
+        eagerText = f", imports {eager} eagerly" if eager else ""
+        print(f"  {module:12s} {elapsed or 0:6.1f} ms (budget {budget} ms) {'ok' if ok else 'OVER BUDGET'}{eagerText}")
+    return over
+
+
+def _fresh_load_time(yamlFile, cacheFile, runs=5):
+    """Median time to import readconfig and load the configuration in a fresh interpreter, in ms."""
+    script = (
+        "import time; started = time.perf_counter(); from readconfig import load_config; "
+        f"load_config({yamlFile!r}, {cacheFile!r}); print(time.perf_counter() - started)"
+    )
+    times = sorted(
+        float(subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                             capture_output=True, text=True, check=True).stdout)
+        for _ in range(runs)
+    )
+    return times[len(times) // 2] * 1000
+
+
+def bench_config(runs=20):
+    """Loading the configuration by parsing the YAML files and from the cache, which leaves out the secrets."""
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fordconnect.yaml")
+    names = ("fc_vehicle_name", "fc_vehicle_vin", "fc_vehicle_username", "fc_vehicle_password",
+             "geocodio_api_key", "abrp_api_key", "abrp_token")
+    with tempfile.TemporaryDirectory() as directory:
+        with open(config) as source, open(os.path.join(directory, "fordconnect.yaml"), "w") as target:
+            target.write(source.read())
+        with open(os.path.join(directory, "secrets.yaml"), "w") as secrets:
+            for name in names:
+                secrets.write(f"{name}: 'secret-{name}'\n")
+        yamlFile = os.path.join(directory, "fordconnect.yaml")
+        cacheFile = os.path.join(directory, "config.json")
+
+        def run(cache):
+            started = time.perf_counter()
+            for _ in range(runs):
+                options = load_config(yamlFile, cache)
+            return (time.perf_counter() - started) / runs, options
+
+        parsed, expected = run(None)
+        load_config(yamlFile, cacheFile)
+        cached, options = run(cacheFile)
+        with open(cacheFile) as f:
+            text = f.read()
+        leaked = sum(f"secret-{name}" in text for name in names)
+        parsedFresh = _fresh_load_time(yamlFile, None)
+        cachedFresh = _fresh_load_time(yamlFile, cacheFile)
+        print(f"Loading the configuration ({'same' if options == expected else 'DIFFERENT'} options)")
+        print(f"  YAML and secrets: {parsed * 1000:6.2f} ms, {parsedFresh:6.1f} ms in a fresh interpreter")
+        print(f"  cache:            {cached * 1000:6.2f} ms, {cachedFresh:6.1f} ms in a fresh interpreter")
+        print(f"  {leaked} of {len(names)} secrets found in the cache file")
+
+
+def run(statuses):
+    """Import times of the tools and the configuration load, 'statuses' are not used."""
+    bench_startup()
+    bench_config()
@@ -0,0 +1,380 @@
+"""Benchmarks of the status comparison, parsing, time parsing and status history"""
+
+import copy
+import gc
+import json
+import os
+import pprint
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from datetime import datetime, timezone
+from dateutil import tz
+
+from benchdata import best_time, sample_status
+from statusdiff import StatusDiffer
+from statusstore import StatusStore
+from utilities import fordtime_to_datetime, fordtime_to_epoch, fordtimes_to_epochs
+from vehiclestatus import VehicleStatus
+
+
+def legacy_differences(previous, current):
+    """The original hand-written status comparison, with the window position path corrected."""
+    _PSI = True
+    diffs = {}
+
+    # ignitionStatus
+    if previous.get("ignitionStatus").get("value") != current.get("ignitionStatus").get("value"):
+        diffs["ignitionStatus"] = current.get("ignitionStatus").get("value")
+    # odometer
+    if previous.get("odometer").get("value") != current.get("odometer").get("value"):
+        diffs["odometer"] = current.get("odometer").get("value")
+    # elVehDTE
+    if round(float(previous.get("elVehDTE").get("value")), 6) != round(float(current.get("elVehDTE").get("value")), 6):
+        diffs["elVehDTE"] = round(current.get("elVehDTE").get("value"), 1)
+    # batteryFillLevel
+    if previous.get("batteryFillLevel").get("value") != current.get("batteryFillLevel").get("value"):
+        diffs["batteryFillLevel"] = current.get("batteryFillLevel").get("value")
+    # battery
+    if previous.get("battery").get("batteryHealth").get("value") != current.get("battery").get("batteryHealth").get(
+        "value"
+    ):
+        diffs["batteryHealth"] = current.get("battery").get("batteryHealth").get("value")
+    if previous.get("battery").get("batteryStatusActual").get("value") != current.get("battery").get(
+        "batteryStatusActual"
+    ).get("value"):
+        diffs["batteryStatusActual"] = current.get("battery").get("batteryStatusActual").get("value")
+    # batteryPerfStatus
+    if previous.get("batteryPerfStatus").get("value") != current.get("batteryPerfStatus").get("value"):
+        diffs["batteryPerfStatus"] = current.get("batteryPerfStatus").get("value")
+    # batteryChargeStatus
+    if previous.get("batteryChargeStatus").get("value") != current.get("batteryChargeStatus").get("value"):
+        diffs["batteryChargeStatus"] = current.get("batteryChargeStatus").get("value")
+    # gps
+    if previous.get("gps").get("latitude") != current.get("gps").get("latitude"):
+        diffs["latitude"] = current.get("gps").get("latitude")
+        diffs["longitude"] = current.get("gps").get("longitude")
+    if previous.get("gps").get("longitude") != current.get("gps").get("longitude"):
+        diffs["latitude"] = current.get("gps").get("latitude")
+        diffs["longitude"] = current.get("gps").get("longitude")
+    # simple 'value' fields
+    for key in [
+        "lockStatus",
+        "alarm",
+        "chargingStatus",
+        "chargeStartTime",
+        "chargeEndTime",
+        "plugStatus",
+        "firmwareUpgInProgress",
+        "deepSleepInProgress",
+        "PrmtAlarmEvent",
+        "remoteStartStatus",
+        "preCondStatusDsply",
+        "tirePressure",
+    ]:
+        if previous.get(key).get("value") != current.get(key).get("value"):
+            diffs[key] = current.get(key).get("value")
+    # oilLife
+    if previous.get("oil").get("oilLife") != current.get("oil").get("oilLife"):
+        diffs["oilLife"] = current.get("oil").get("oilLife")
+    # oilLifeActual
+    if previous.get("oil").get("oilLifeActual") != current.get("oil").get("oilLifeActual"):
+        diffs["oilLifeActual"] = current.get("oil").get("oilLifeActual")
+    # TMPS
+    adjustKPA = 0.1450377 if _PSI else 1.0
+    oldTirePressures = [
+        int(round(float(previous.get("TPMS").get("leftFrontTirePressure").get("value")) * adjustKPA, 0)),
+        int(round(float(previous.get("TPMS").get("rightFrontTirePressure").get("value")) * adjustKPA, 0)),
+        int(round(float(previous.get("TPMS").get("outerLeftRearTirePressure").get("value")) * adjustKPA, 0)),
+        int(round(float(previous.get("TPMS").get("outerRightRearTirePressure").get("value")) * adjustKPA, 0)),
+    ]
+    newTirePressures = [
+        int(round(float(current.get("TPMS").get("leftFrontTirePressure").get("value")) * adjustKPA, 0)),
+        int(round(float(current.get("TPMS").get("rightFrontTirePressure").get("value")) * adjustKPA, 0)),
+        int(round(float(current.get("TPMS").get("outerLeftRearTirePressure").get("value")) * adjustKPA, 0)),
+        int(round(float(current.get("TPMS").get("outerRightRearTirePressure").get("value")) * adjustKPA, 0)),
+    ]
+    for i in range(len(oldTirePressures)):
+        if oldTirePressures[i] != newTirePressures[i]:
+            diffs["TPMS"] = newTirePressures
+            break
+    # dcFastChargeData
+    for key in ["fstChrgBulkTEst", "fstChrgCmpltTEst"]:
+        if previous.get("dcFastChargeData").get(key).get("value") != current.get("dcFastChargeData").get(key).get(
+            "value"
+        ):
+            diffs[key] = current.get("dcFastChargeData").get(key).get("value")
+    # more simple 'value' fields
+    for key in ["batteryTracLowChargeThreshold", "battTracLoSocDDsply"]:
+        if previous.get(key).get("value") != current.get(key).get("value"):
+            diffs[key] = current.get(key).get("value")
+    # doorStatus
+    for key in [
+        "rightRearDoor",
+        "leftRearDoor",
+        "driverDoor",
+        "passengerDoor",
+        "hoodDoor",
+        "tailgateDoor",
+        "innerTailgateDoor",
+    ]:
+        if previous.get("doorStatus").get(key).get("value") != current.get("doorStatus").get(key).get("value"):
+            diffs[key] = current.get("doorStatus").get(key).get("value")
+    # windowPosition
+    for key in ["driverWindowPosition", "passWindowPosition", "rearDriverWindowPos", "rearPassWindowPos"]:
+        if previous.get("windowPosition").get(key).get("value") != current.get("windowPosition").get(key).get(
+            "value"
+        ):
+            diffs[key] = current.get("windowPosition").get(key).get("value")
+
+    return diffs
+
+
+def bench_differences(statuses, rounds=5):
+    """Compare the compiled status differ with the original hand-written comparison."""
+    differ = StatusDiffer(psi=True)
+    pairs = list(zip(statuses, statuses[1:]))
+    parsed = [VehicleStatus.from_payload(status) for status in statuses]
+    parsedPairs = list(zip(parsed, parsed[1:]))
+
+    # the differ reports typed values, the original the values as they are in the payload
+    mismatches = 0
+    for (previous, current), (parsedPrevious, parsedCurrent) in zip(pairs, parsedPairs):
+        if differ.diff(parsedPrevious, parsedCurrent).keys() != legacy_differences(previous, current).keys():
+            mismatches += 1
+
+    def run(fn, pairs):
+        return best_time(lambda: [fn(previous, current) for previous, current in pairs], rounds) / len(pairs)
+
+    legacy = run(legacy_differences, pairs)
+    compiled = run(differ.diff, parsedPairs)
+    print(f"Status differences over {len(pairs)} consecutive pairs ({mismatches} reporting other fields)")
+    print(f"  original: {legacy * 1e6:8.2f} us per pair")
+    print(f"  compiled: {compiled * 1e6:8.2f} us per pair ({legacy / compiled:.1f}x)")
+
+
+def legacy_log_differences(previous, current, directory):
+    """The original full dump of both status reports."""
+    previousJSON = json.dumps(previous)
+    currentJSON = json.dumps(current)
+    with open(os.path.join(directory, "previous.txt"), "w") as previousFile:
+        prev = pprint.PrettyPrinter(indent=0, width=10, sort_dicts=True, stream=previousFile)
+        prev.pprint(previousJSON)
+    with open(os.path.join(directory, "current.txt"), "w") as currentFile:
+        cur = pprint.PrettyPrinter(indent=0, width=10, sort_dicts=True, stream=currentFile)
+        cur.pprint(currentJSON)
+
+
+def bench_untracked(count=500):
+    """Cost of logging status reports whose tracked fields did not change."""
+    differ = StatusDiffer(psi=True)
+    pairs = []
+    previous = sample_status()
+    for i in range(count):
+        current = copy.deepcopy(previous)
+        current["serverTime"] = f"09-12-2021 15:{i % 60:02d}:16.525"
+        current["lastModifiedDate"] = f"09-12-2021 15:{i % 60:02d}:01"
+        if i % 10 == 0:
+            current["gps"]["gpsState"] = "SHIFTED" if previous["gps"]["gpsState"] == "UNSHIFTED" else "UNSHIFTED"
+        pairs.append((previous, current))
+        previous = current
+    parsedPairs = [(VehicleStatus.from_payload(previous), VehicleStatus.from_payload(current)) for previous, current in pairs]
+
+    with tempfile.TemporaryDirectory() as directory:
+        started = time.perf_counter()
+        for previous, current in pairs:
+            legacy_log_differences(previous, current, directory)
+        legacy = (time.perf_counter() - started) / len(pairs)
+        legacySize = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+        written = 0
+        started = time.perf_counter()
+        with open(os.path.join(directory, "untracked.jsonl"), "w") as untrackedFile:
+            for previous, current in parsedPairs:
+                changes = differ.untracked(previous, current)
+                if changes:
+                    entry = {"vin": current.vin, "modified": current.modified, "changes": changes}
+                    written += untrackedFile.write(json.dumps(entry, separators=(",", ":"), default=str) + "\n")
+        untracked = (time.perf_counter() - started) / len(pairs)
+
+    print(f"Logging {len(pairs)} status reports with no tracked changes")
+    print(f"  full dump:      {legacy * 1e6:8.1f} us per report, {legacySize} bytes rewritten each time")
+    print(f"  untracked diff: {untracked * 1e6:8.1f} us per report, {written / len(pairs):.0f} bytes appended per report")
+
+
+def legacy_fordtime_to_datetime(fordTimeString, useUTC=True):
+    """The original Ford time parser."""
+    from_zone = tz.tzutc()
+    to_zone = tz.tzlocal()
+    try:
+        utc_dt = datetime.strptime(fordTimeString, "%m-%d-%Y %H:%M:%S.%f")
+    except:
+        utc_dt = datetime.strptime(fordTimeString, "%m-%d-%Y %H:%M:%S")
+    utc = utc_dt.replace(tzinfo=from_zone)
+    if useUTC:
+        return utc
+    return utc.astimezone(to_zone)
+
+
+def bench_fordtime(count=20000, rounds=3):
+    """Ford timestamp parsing, a time ordered list as in chargelogs and the repeated timestamps seen while polling."""
+    rng = random.Random(1)
+    distinct = []
+    seconds = 1609459200.0
+    for i in range(count):
+        seconds += rng.uniform(1, 600)
+        stamp = datetime.fromtimestamp(seconds, timezone.utc)
+        distinct.append(stamp.strftime("%m-%d-%Y %H:%M:%S") + (f".{stamp.microsecond // 1000:03d}" if i % 2 else ""))
+    # each poll parses serverTime once and lastModifiedDate three times
+    polled = []
+    for i in range(count // 4):
+        modified = distinct[i // 10]
+        polled.extend((distinct[i], modified, modified, modified))
+
+    def run(fn, values):
+        return best_time(lambda: fn(values), rounds) / len(values) * 1e6
+
+    legacyEpochs = [legacy_fordtime_to_datetime(s).timestamp() for s in distinct]
+    mismatches = sum(1 for a, b in zip(legacyEpochs, fordtimes_to_epochs(distinct)) if abs(a - b) > 1e-6)
+    print(f"Ford timestamp parsing, {count} timestamps ({mismatches} mismatched results)")
+    for label, values in (("distinct", distinct), ("polling", polled)):
+        legacy = run(lambda v: [legacy_fordtime_to_datetime(s) for s in v], values)
+        fast = run(lambda v: [fordtime_to_datetime(s) for s in v], values)
+        epoch = run(lambda v: [fordtime_to_epoch(s) for s in v], values)
+        bulk = run(fordtimes_to_epochs, values)
+        print(
+            f"  {label:8s}: original {legacy:5.2f} us, datetime {fast:5.2f} us ({legacy / fast:4.1f}x), "
+            f"epoch {epoch:5.2f} us, bulk {bulk:5.2f} us ({legacy / bulk:4.1f}x) per timestamp"
+        )
+
+
+def bench_history(statuses, repeats=5):
+    """Disk use and cost of the status history against storing every payload as JSON with a commit per poll."""
+    payloads = []
+    for i, status in enumerate(statuses):
+        for j in range(repeats):
+            poll = copy.copy(status)
+            seconds = (i * repeats + j) * 15
+            poll["serverTime"] = f"09-{12 + seconds // 86400:02d}-2021 {(seconds // 3600) % 24:02d}:{(seconds // 60) % 60:02d}:{seconds % 60:02d}.000"
+            payloads.append(poll)
+    polls = [VehicleStatus.from_payload(poll) for poll in payloads]
+
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "naive.db")
+        db = sqlite3.connect(filename)
+        db.execute("CREATE TABLE status (vin TEXT, polled TEXT, status TEXT)")
+        started = time.perf_counter()
+        for poll in payloads:
+            db.execute("INSERT INTO status VALUES (?, ?, ?)", (poll.get("vin"), poll.get("serverTime"), json.dumps(poll)))
+            db.commit()
+        naive = time.perf_counter() - started
+        db.close()
+        naiveSize = os.path.getsize(filename)
+
+        filename = os.path.join(directory, "status.db")
+        store = StatusStore(filename)
+        started = time.perf_counter()
+        for poll in polls:
+            store.append(poll.vin, poll)
+        store.flush()
+        appended = time.perf_counter() - started
+        started = time.perf_counter()
+        series = store.series(polls[0].vin, "batteryFillLevel")
+        scan = time.perf_counter() - started
+        store.close()
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory) if name.startswith("status"))
+
+    print(f"Status history, {len(polls)} polls of {len(statuses)} statuses")
+    print(f"  JSON per poll: {naive / len(polls) * 1e6:7.1f} us/poll, {naiveSize / len(polls):6.0f} bytes/poll")
+    print(f"  StatusStore:   {appended / len(polls) * 1e6:7.1f} us/poll, {size / len(polls):6.0f} bytes/poll")
+    print(f"  batteryFillLevel series: {len(series)} values in {scan * 1000:.2f} ms")
+
+
+_LEGACY_TIRES = ["leftFrontTirePressure", "rightFrontTirePressure", "outerLeftRearTirePressure", "outerRightRearTirePressure"]
+
+
+def legacy_status_reads(status):
+    """What the scheduler, ABRP telemetry, metrics, trip sampling and change check each read from a raw payload."""
+    _ = (
+        status.get("ignitionStatus").get("value"),
+        status.get("chargingStatus").get("value"),
+        status.get("deepSleepInProgress").get("value"),
+        fordtime_to_epoch(status.get("serverTime")) - fordtime_to_epoch(status.get("lastModifiedDate")),
+    )
+    _ = (
+        float(status.get("batteryFillLevel").get("value")),
+        status.get("gps").get("latitude"),
+        status.get("gps").get("longitude"),
+        float(status.get("odometer").get("value")),
+        status.get("chargingStatus").get("value"),
+        status.get("ignitionStatus").get("value") == "Off",
+    )
+    _ = [float(status.get(key).get("value")) for key in ("batteryFillLevel", "elVehDTE", "odometer")] + [
+        float(status.get("battery").get("batteryStatusActual").get("value"))
+    ]
+    _ = [float(status.get("TPMS").get(tire).get("value")) for tire in _LEGACY_TIRES]
+    _ = (
+        fordtime_to_epoch(status.get("lastModifiedDate")),
+        float(status.get("odometer").get("value")),
+        float(status.get("batteryFillLevel").get("value")),
+        float(status.get("gps").get("latitude")),
+        float(status.get("gps").get("longitude")),
+    )
+    _ = fordtime_to_datetime(status.get("lastModifiedDate"))
+
+
+def typed_status_reads(payload):
+    """The same reads from a status parsed once."""
+    status = VehicleStatus.from_payload(payload)
+    _ = (status.ignition, status.charging, status.deep_sleep, status.server_time - status.modified)
+    _ = (status.soc, status.latitude, status.longitude, status.odometer, status.charging, status.ignition == "Off")
+    _ = (status.soc, status.dte, status.odometer, status.battery_volts, status.modified)
+    _ = status.tire_pressures
+    _ = (status.modified, status.odometer, status.soc, status.latitude, status.longitude)
+    _ = status.modified
+
+
+def _traced_size(build):
+    """Bytes still allocated by what 'build' returns."""
+    gc.collect()
+    tracemalloc.start()
+    kept = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def bench_vehiclestatus(statuses, rounds=5):
+    """Cost of reading the per-poll fields from raw payloads versus a status parsed once, and the size of a status."""
+    payloads = statuses
+
+    def run(fn):
+        return best_time(lambda: [fn(payload) for payload in payloads], rounds) / len(payloads)
+
+    legacy = run(legacy_status_reads)
+    typed = run(typed_status_reads)
+
+    # a day of polls, every status is a fresh payload as decoded from the response
+    encoded = [json.dumps(payload) for payload in payloads]
+    raw = _traced_size(lambda: [json.loads(text) for text in encoded])
+    parsed = _traced_size(lambda: [VehicleStatus.from_payload(json.loads(text)) for text in encoded])
+    print(f"Status fields read each poll, {len(payloads)} statuses")
+    print(f"  dict walks in each consumer: {legacy * 1e6:7.2f} us per poll")
+    print(f"  parsed once, typed reads:    {typed * 1e6:7.2f} us per poll ({legacy / typed:.1f}x)")
+    print(
+        f"  size of a status: raw payload {raw / len(payloads):6.0f} bytes, "
+        f"parsed {parsed / len(payloads):6.0f} bytes (the typed fields and the shared compressed rest)"
+    )
+
+
+def run(statuses):
+    """Status comparison, parsing and history benchmarks over the status payloads."""
+    bench_differences(statuses)
+    bench_untracked()
+    bench_fordtime()
+    bench_vehiclestatus(statuses)
+    bench_history(statuses)
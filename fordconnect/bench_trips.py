@@ -0,0 +1,99 @@
+"""Benchmarks of the trip energy analysis and trip detection"""
+
+import math
+import os
+import tempfile
+import time
+
+import tripanalysis
+
+from benchdata import sample_history, sample_status, sample_trip
+from statusstore import StatusStore
+from tripdetector import DRIVING_STATES, TripDetector, stored_points
+from usgs_elevation import ElevationService
+
+
+def bench_trip_analysis(trips=200, capacity=88, latency=0.05):
+    """Compare the end point and path integrated trip energy estimates, and time the analysis with slow elevation lookups."""
+    endpoint, fitted, covered, methods = [], [], {}, {}
+    for seed in range(trips):
+        samples, locations, used = sample_trip(seed=seed)
+        endpoint.append(abs(samples.soc[0] - samples.soc[-1] - used))
+        estimate, bound, method = tripanalysis.soc_used(samples)
+        fitted.append(abs(estimate - used))
+        methods[method] = methods.get(method, 0) + 1
+        covered[method] = covered.get(method, 0) + (abs(estimate - used) <= bound)
+    print(f"Trip energy over {trips} synthetic 40 minute trips, {capacity} kWh battery")
+    for name, errors in (("end points", endpoint), ("reported", fitted)):
+        errors.sort()
+        print(
+            f"  {name:10s}: mean error {sum(errors) / trips * 0.01 * capacity:.3f} kWh, "
+            f"95th percentile {errors[int(trips * 0.95)] * 0.01 * capacity:.3f} kWh"
+        )
+    for method, count in sorted(methods.items()):
+        print(f"  {method} used for {count} trips, within its error bound for {covered[method]} of them")
+
+    def fetch(lat, lon):
+        time.sleep(latency)
+        return 100.0 + 50.0 * math.sin(lat * 200)
+
+    samples, locations, used = sample_trip()
+    service = ElevationService(fetch=fetch)
+    started = time.perf_counter()
+    trip = tripanalysis.analyze_trip(samples, capacity, locations=locations, elevation=service)
+    elapsed = time.perf_counter() - started
+    profile = trip.get("elevation")
+    print(
+        f"  analysis of {len(locations)} locations and {len(samples)} status reports in {elapsed * 1000:.0f} ms "
+        f"({service.fetches} elevation lookups at {latency * 1000:.0f} ms), {trip.get('distance') / 1000:.1f} km, "
+        f"{trip.get('kwh'):.2f} ± {trip.get('kwh_error'):.2f} kWh, climbed {profile.get('climb'):.0f} m"
+    )
+
+
+def legacy_trips(points):
+    """Trips found the way the monitor used to, a change of ignition state starts or ends a trip."""
+    trips, started, previous = 0, None, None
+    for point in points:
+        if previous is not None and point.ignition != previous.ignition:
+            if started is None and point.ignition in DRIVING_STATES:
+                started = point
+            elif started is not None and point.ignition == "Off":
+                trips += 1
+                started = None
+        previous = point
+    return trips
+
+
+def bench_trip_detection(days=365):
+    """Rebuild the trips of a year of stored statuses, with trips and status updates missed while polling."""
+    with tempfile.TemporaryDirectory() as directory:
+        store = StatusStore(os.path.join(directory, "status.db"), batch_size=1000)
+        started = time.perf_counter()
+        trips, driven = sample_history(store, days)
+        generated = time.perf_counter() - started
+        vin = sample_status().get("vin")
+
+        started = time.perf_counter()
+        points = stored_points(store, vin)
+        loaded = time.perf_counter() - started
+        started = time.perf_counter()
+        found = TripDetector(vin).feed(points)
+        detected = time.perf_counter() - started
+        store.close()
+
+    legacy = legacy_trips(points)
+    inferred = sum(trip.inferred for trip in found)
+    distance = sum(trip.distance or 0.0 for trip in found)
+    print(f"Trip history of {days} days, {len(points)} stored statuses (written in {generated:.1f} s), {trips} trips")
+    print(f"  ignition changes only: {legacy} trips found")
+    print(
+        f"  trip detector:         {len(found)} trips found ({inferred} from the odometer or ended by a gap), "
+        f"{distance:.0f} of {driven:.0f} km"
+    )
+    print(f"  {loaded * 1000:.0f} ms reading the history, {detected * 1000:.0f} ms detecting ({len(points) / detected:.0f} statuses/s)")
+
+
+def run(statuses):
+    """Trip benchmarks on synthetic trips and a year of history, 'statuses' are not used."""
+    bench_trip_analysis()
+    bench_trip_detection()
@@ -0,0 +1,374 @@
+"""Synthetic statuses, journeys, trips and charge logs and the API stubs shared by the benchmarks"""
+
+import copy
+import gzip
+import json
+import math
+import random
+import time
+
+from datetime import datetime, timezone
+
+import tripanalysis
+
+from abrp import AbrpClient
+from replay import Recorder
+from vehiclestatus import VehicleStatus
+
+
+def best_time(fn, rounds=5):
+    """Shortest time in seconds of 'rounds' calls of fn()."""
+    best = None
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def sample_status(vin="1234567890", minute=0):
+    """Synthetic vehicle status payload with the layout returned by the FordPass API."""
+    modified = f"09-12-2021 14:{minute % 60:02d}:01"
+    return {
+        "vin": vin,
+        "lastModifiedDate": modified,
+        "serverTime": f"09-12-2021 14:{minute % 60:02d}:16.525",
+        "ignitionStatus": {"value": "Off", "status": "CURRENT", "timestamp": modified},
+        "odometer": {"value": 3042.0, "status": "CURRENT", "timestamp": modified},
+        "elVehDTE": {"value": 311.3, "timestamp": modified},
+        "batteryFillLevel": {"value": 88.5, "timestamp": modified},
+        "battery": {
+            "batteryHealth": {"value": "STATUS_GOOD", "timestamp": modified},
+            "batteryStatusActual": {"value": 13.7, "timestamp": modified},
+        },
+        "batteryPerfStatus": {"value": "STATUS_GOOD", "timestamp": modified},
+        "batteryChargeStatus": {"value": "BATTERY_CHARGE_NORMAL", "timestamp": modified},
+        "gps": {"latitude": "42.955701", "longitude": "-76.921108", "gpsState": "UNSHIFTED", "timestamp": modified},
+        "lockStatus": {"value": "LOCKED", "timestamp": modified},
+        "alarm": {"value": "SET", "timestamp": modified},
+        "chargingStatus": {"value": "NotReady", "timestamp": modified},
+        "chargeStartTime": {"value": "09-12-2021 02:00:00", "timestamp": modified},
+        "chargeEndTime": {"value": "09-12-2021 05:00:00", "timestamp": modified},
+        "plugStatus": {"value": 0, "timestamp": modified},
+        "firmwareUpgInProgress": {"value": False, "timestamp": modified},
+        "deepSleepInProgress": {"value": False, "timestamp": modified},
+        "PrmtAlarmEvent": {"value": "Null", "timestamp": modified},
+        "remoteStartStatus": {"value": 0, "timestamp": modified},
+        "remoteStart": {"remoteStartDuration": 0, "remoteStartTime": 0, "timestamp": modified},
+        "preCondStatusDsply": {"value": "NotPreconditioning", "timestamp": modified},
+        "tirePressure": {"value": "STATUS_GOOD", "timestamp": modified},
+        "oil": {"oilLife": "STATUS_GOOD", "oilLifeActual": 100, "timestamp": modified},
+        "TPMS": {
+            "leftFrontTirePressure": {"value": "262", "timestamp": modified},
+            "rightFrontTirePressure": {"value": "258", "timestamp": modified},
+            "outerLeftRearTirePressure": {"value": "256", "timestamp": modified},
+            "outerRightRearTirePressure": {"value": "258", "timestamp": modified},
+        },
+        "dcFastChargeData": {
+            "fstChrgBulkTEst": {"value": None, "timestamp": modified},
+            "fstChrgCmpltTEst": {"value": None, "timestamp": modified},
+        },
+        "batteryTracLowChargeThreshold": {"value": None, "timestamp": modified},
+        "battTracLoSocDDsply": {"value": None, "timestamp": modified},
+        "doorStatus": {
+            "rightRearDoor": {"value": "Closed", "timestamp": modified},
+            "leftRearDoor": {"value": "Closed", "timestamp": modified},
+            "driverDoor": {"value": "Closed", "timestamp": modified},
+            "passengerDoor": {"value": "Closed", "timestamp": modified},
+            "hoodDoor": {"value": "Closed", "timestamp": modified},
+            "tailgateDoor": {"value": "Closed", "timestamp": modified},
+            "innerTailgateDoor": {"value": "Closed", "timestamp": modified},
+        },
+        "windowPosition": {
+            "driverWindowPosition": {"value": "Fully closed position", "timestamp": modified},
+            "passWindowPosition": {"value": "Fully closed position", "timestamp": modified},
+            "rearDriverWindowPos": {"value": "Fully closed position", "timestamp": modified},
+            "rearPassWindowPos": {"value": "Fully closed position", "timestamp": modified},
+        },
+    }
+
+
+def sample_statuses(count, vin="1234567890"):
+    """Sequence of synthetic status reports for a car that is parked, driven and charged."""
+    statuses = []
+    status = sample_status(vin)
+    for i in range(count):
+        status = copy.deepcopy(status)
+        status["lastModifiedDate"] = f"09-12-2021 {14 + (i // 3600) % 10:02d}:{(i // 60) % 60:02d}:{i % 60:02d}"
+        phase = (i // 20) % 3
+        if phase == 1:
+            status["ignitionStatus"]["value"] = "Run"
+            status["odometer"]["value"] += 1.0
+            status["gps"]["latitude"] = f"{float(status['gps']['latitude']) + 0.001:.6f}"
+            status["batteryFillLevel"]["value"] -= 0.5
+            status["elVehDTE"]["value"] -= 1.7
+        elif phase == 2:
+            status["ignitionStatus"]["value"] = "Off"
+            status["plugStatus"]["value"] = 1
+            status["chargingStatus"]["value"] = "ChargingAC"
+            status["batteryFillLevel"]["value"] += 0.5
+        else:
+            status["plugStatus"]["value"] = 0
+            status["chargingStatus"]["value"] = "NotReady"
+        if i % 7 == 0:
+            status["TPMS"]["leftFrontTirePressure"]["value"] = str(255 + i % 11)
+        statuses.append(status)
+    return statuses
+
+
+def load_statuses(filename):
+    """Load recorded status reports, one JSON payload per line or the status responses of a fordconnect recording."""
+    opener = gzip.open if filename.endswith(".gz") else open
+    with opener(filename, "rt") as statusFile:
+        lines = [json.loads(line) for line in statusFile if line.strip()]
+    # recordings wrap the responses of every endpoint
+    return [line.get("response") if "endpoint" in line else line for line in lines if line.get("endpoint", "status") == "status"]
+
+
+class StubVehicle:
+    """Stand-in for fordpass.Vehicle that answers status requests after a fixed latency."""
+
+    def __init__(self, vin, latency=0.05):
+        self.vin = vin
+        self._latency = latency
+        self._status = sample_status(vin)
+
+    def status(self):
+        time.sleep(self._latency)
+        return copy.deepcopy(self._status)
+
+    def journey_details(self, id):
+        time.sleep(self._latency)
+        journey = self.journeys.get(id)
+        return {"value": {"summary": journey, "start": journey.get("start"), "end": journey.get("end")}}
+
+
+def sample_journeys(count, places=6, seed=1):
+    """Synthetic journeys between a handful of places with a few meters of GPS jitter."""
+    rng = random.Random(seed)
+    spots = [(42.95 + rng.uniform(-0.2, 0.2), -76.92 + rng.uniform(-0.2, 0.2)) for _ in range(places)]
+    journeys = []
+    for i in range(count):
+        a, b = rng.sample(spots, 2)
+        jitter = lambda: rng.uniform(-0.00004, 0.00004)  # noqa: E731
+        journeys.append(
+            {
+                "journeyID": f"J{i:06d}",
+                "start": {"latitude": a[0] + jitter(), "longitude": a[1] + jitter(), "timestamp": 1631450000 + i * 3600},
+                "end": {"latitude": b[0] + jitter(), "longitude": b[1] + jitter(), "timestamp": 1631451200 + i * 3600},
+                "distance": 12000.0,
+                "avgSpeed": 10.0,
+            }
+        )
+    return journeys
+
+
+class StubGeocoder:
+    """Stand-in for GeocodioClient that counts reverse geocoding requests."""
+
+    def __init__(self, latency=0.0):
+        self.requests = 0
+        self._latency = latency
+
+    def reverse(self, location):
+        self.requests += 1
+        time.sleep(self._latency)
+        return {"results": [{"address_components": {"formatted_street": f"{location[0]:.3f} St", "city": "Town"}}]}
+
+
+def sample_day(trips=((7.513, 25), (12.004, 15), (17.259, 30), (19.537, 10)), charge=(22.0, 6.0), sleep_after=4.0):
+    """Events of a synthetic day as (hour, ignition, charging, deep sleep) and the trip start/end times."""
+    events = [(0.0, "Off", "ChargingAC", False)]
+    events.append((charge[1], "Off", "ChargeTargetReached", False))
+    starts, ends = [], []
+    for hour, minutes in trips:
+        end = hour + minutes / 60
+        events.append((hour, "Run", "NotReady", False))
+        events.append((hour + 1 / 60, "Run", "NotReady", False))
+        events.append((end, "Off", "NotReady", False))
+        events.append((end + 1 / 60, "Off", "NotReady", False))
+        starts.append(hour * 3600)
+        ends.append(end * 3600)
+    events.append((charge[0], "Off", "ChargingAC", False))
+    events.sort()
+
+    # the vehicle goes into deep sleep after being parked and not charging for a while
+    sleeping = []
+    for (hour, ignition, charging, _), following in zip(events, events[1:] + [(24.0 + events[0][0],)]):
+        if ignition == "Off" and charging != "ChargingAC" and following[0] - hour > sleep_after:
+            sleeping.append((hour + sleep_after, ignition, charging, True))
+    events = sorted(events + sleeping)
+    return [(hour * 3600, ignition, charging, sleep) for hour, ignition, charging, sleep in events], starts, ends
+
+
+def fordtime(seconds):
+    return datetime.fromtimestamp(1631404800 + seconds, tz=timezone.utc).strftime("%m-%d-%Y %H:%M:%S")
+
+
+class StubAbrpClient(AbrpClient):
+    """AbrpClient with the request to ABRP replaced by a fixed latency."""
+
+    def __init__(self, latency=0.05):
+        super().__init__(api_key="api_key", token="token", session=object(), timeout=1.0)
+        self._latency = latency
+
+    def send(self, data):
+        time.sleep(self._latency)
+        return True
+
+
+def sample_locations(count, points=300, seed=1):
+    """Synthetic journeys with a location logged every few seconds, stop and go with a few long stops."""
+    rng = random.Random(seed)
+    journeys = []
+    for i in range(count):
+        lat, lon, timestamp, speed = 42.95 + rng.uniform(-0.2, 0.2), -76.92 + rng.uniform(-0.2, 0.2), 1631450000 + i * 3600, 0.0
+        heading = rng.uniform(0, 2 * math.pi)
+        locations = []
+        for _ in range(points):
+            locations.append({"latitude": lat, "longitude": lon, "timestamp": timestamp, "speed": speed})
+            step = rng.choice((2, 3, 5))
+            speed = 0.0 if rng.random() < 0.05 else max(0.0, min(35.0, speed + rng.uniform(-3.0, 3.5)))
+            heading += rng.uniform(-0.3, 0.3)
+            lat += speed * step * math.cos(heading) / 111195.0
+            lon += speed * step * math.sin(heading) / (111195.0 * math.cos(math.radians(lat)))
+            timestamp += step if speed or rng.random() < 0.5 else 60
+        journeys.append({"journeyID": f"J{i:06d}", "locations": locations})
+    return journeys
+
+
+def sample_trip(minutes=40, poll=15, rate=0.19, seed=1):
+    """Status reports polled during a trip with a steady consumption in % per km, and the journey locations of the trip."""
+    rng = random.Random(seed)
+    journey = sample_locations(1, points=minutes * 20, seed=seed)[0]
+    locations = journey.get("locations")
+    cumulative = tripanalysis.path_distance(
+        [location.get("latitude") for location in locations], [location.get("longitude") for location in locations]
+    )
+    samples = tripanalysis.TripSamples()
+    soc = rng.uniform(40.0, 95.0)
+    for i in range(0, len(locations), max(1, poll // 3)):
+        location = locations[i]
+        km = cumulative[i] / 1000
+        samples.timestamp.append(float(location.get("timestamp")))
+        samples.odometer.append(3042.0 + round(km, 1))
+        # the vehicle reports the charge in 0.5 % steps
+        samples.soc.append(math.floor((soc - rate * km) * 2) / 2)
+        samples.latitude.append(location.get("latitude"))
+        samples.longitude.append(location.get("longitude"))
+    return samples, locations, rate * cumulative[-1] / 1000
+
+
+def sample_chargelogs(count, seed=1):
+    """Synthetic charge logs, mostly at home and work with some public chargers, one session every day or so."""
+    rng = random.Random(seed)
+    places = [("Home", 42.955701, -76.921108, 7.2), ("Work", 43.048122, -76.147424, 6.6)]
+    places += [(f"Charger {i}", 42.5 + rng.uniform(0, 1), -77.0 + rng.uniform(0, 1), 50.0) for i in range(20)]
+    chargeLogs = []
+    plugIn = -3 * 365 * 86400
+    for i in range(count):
+        name, lat, lon, power = places[0] if rng.random() < 0.6 else places[1] if rng.random() < 0.6 else rng.choice(places[2:])
+        start = rng.uniform(10, 60)
+        end = min(100.0, start + rng.uniform(10, 80))
+        plugOut = plugIn + int((end - start) * 0.01 * 88 / power * 3600) + rng.randint(0, 3600)
+        chargeLogs.append(
+            {
+                "chargeId": f"C{i:06d}",
+                "plugInTime": fordtime(plugIn),
+                "plugOutTime": fordtime(plugOut),
+                "startBatteryLevel": start,
+                "endBatteryLevel": end,
+                # GPS jitter of a few tens of meters
+                "chargeLocation": {"name": name, "latitude": lat + rng.gauss(0, 0.0002), "longitude": lon + rng.gauss(0, 0.0002)},
+            }
+        )
+        plugIn = plugOut + rng.randint(6 * 3600, 48 * 3600)
+    return chargeLogs
+
+
+def sample_recording(filename, days=3):
+    """Record a few synthetic days, the vehicle updates its status every minute while driving or charging."""
+    now = [0.0]
+    recorder = Recorder(filename, clock=lambda: 1631404800 + now[0])
+    status = sample_status()
+    soc, odometer, latitude = 60.0, 3042.0, 42.955701
+    trips = 0
+    for day in range(days):
+        events, starts, ends = sample_day()
+        trips += len(starts)
+        changes = []
+        for (hour, ignition, charging, sleep), following in zip(events, events[1:] + [(86400.0,)]):
+            changes.append((hour, ignition, charging, sleep))
+            if ignition == "Run" or charging == "ChargingAC":
+                changes.extend((t, ignition, charging, sleep) for t in range(int(hour) + 60, int(following[0]), 60))
+        for seconds, ignition, charging, sleep in changes:
+            if ignition == "Run":
+                soc, odometer, latitude = soc - 0.2, odometer + 0.9, latitude + 0.004
+            elif charging == "ChargingAC":
+                soc = min(90.0, soc + 0.05)
+            changed = day * 86400 + seconds
+            status = copy.deepcopy(status)
+            status["lastModifiedDate"] = fordtime(changed)
+            status["ignitionStatus"]["value"] = ignition
+            status["chargingStatus"]["value"] = charging
+            status["deepSleepInProgress"]["value"] = sleep
+            status["batteryFillLevel"]["value"] = math.floor(soc * 2) / 2
+            status["odometer"]["value"] = round(odometer)
+            status["gps"]["latitude"] = f"{latitude:.6f}"
+            now[0] = changed + 20
+            status["serverTime"] = fordtime(now[0])
+            recorder.record(status["vin"], "status", {}, status)
+    recorder.close()
+    return trips
+
+
+def sample_history(store, days=365, missed=0.1, outages=0.02, seed=1):
+    """A synthetic history of statuses, the vehicle updates its status every minute while driving or charging.
+
+    A 'missed' fraction of the trips only show up as a change of odometer between two parked statuses, and
+    an 'outages' fraction lose every status from the middle of the trip until two hours after it ended.
+    Returns the number of trips and the distance driven in km."""
+    rng = random.Random(seed)
+    status = sample_status()
+    soc, odometer, latitude = 60.0, 3042.0, 42.955701
+    trips, driven = 0, 0.0
+    for day in range(days):
+        events, starts, ends = sample_day()
+        trips += len(starts)
+        hidden = []
+        for start, end in zip(starts, ends):
+            chance = rng.random()
+            if chance < missed:
+                hidden.append((start, end + 1))
+            elif chance < missed + outages:
+                hidden.append(((start + end) / 2, end + 7200))
+        changes = []
+        for (hour, ignition, charging, sleep), following in zip(events, events[1:] + [(86400.0,)]):
+            changes.append((hour, ignition, charging, sleep))
+            if ignition == "Run" or charging == "ChargingAC":
+                changes.extend((t, ignition, charging, sleep) for t in range(int(hour) + 60, int(following[0]), 60))
+        for seconds, ignition, charging, sleep in changes:
+            if not any(start <= seconds < end for start, end in hidden):
+                changed = day * 86400 + seconds
+                # a new payload for every status as polled, only the parts that change are new dicts
+                status = {
+                    **status,
+                    "lastModifiedDate": fordtime(changed),
+                    "serverTime": fordtime(changed + 20),
+                    "ignitionStatus": {**status["ignitionStatus"], "value": ignition},
+                    "chargingStatus": {**status["chargingStatus"], "value": charging},
+                    "deepSleepInProgress": {**status["deepSleepInProgress"], "value": sleep},
+                    "batteryFillLevel": {**status["batteryFillLevel"], "value": math.floor(soc * 2) / 2},
+                    "odometer": {**status["odometer"], "value": round(odometer, 1)},
+                    "gps": {**status["gps"], "latitude": f"{latitude:.6f}"},
+                }
+                store.append(status["vin"], VehicleStatus.from_payload(status))
+            # the minute until the next status
+            if ignition == "Run":
+                soc, odometer, latitude = soc - 0.2, odometer + 0.9, latitude + 0.004
+                driven += 0.9
+            elif charging == "ChargingAC":
+                soc = min(90.0, soc + 0.05)
+    store.flush()
+    return trips, driven
@@ -0,0 +1,51 @@
+"""Benchmarks for the fordconnect polling and status processing code
+
+Each benchmark compares a part of fordconnect with the code it replaced or an alternative, using local stubs of
+the FordPass, ABRP and USGS services.  The benchmarks of an area are in its bench_*.py module and share the
+synthetic data in benchdata.py, benchsuite times the current per-poll processing on its own and compares runs.
+"""
+
+import argparse
+import sys
+
+import bench_api
+import bench_charging
+import bench_journeys
+import bench_polling
+import bench_startup
+import bench_status
+import bench_trips
+
+from benchdata import load_statuses, sample_statuses
+
+
+AREAS = {
+    "startup": bench_startup,
+    "status": bench_status,
+    "polling": bench_polling,
+    "api": bench_api,
+    "journeys": bench_journeys,
+    "trips": bench_trips,
+    "charging": bench_charging,
+}
+
+
+def main():
+    """Run the benchmarks of every area or the areas given."""
+    parser = argparse.ArgumentParser(description="Benchmark the fordconnect polling and status processing")
+    parser.add_argument("statuses", nargs="?", metavar="FILE", help="status payloads, one per line, or a fordconnect recording")
+    parser.add_argument("--area", action="append", choices=list(AREAS), help="only run the benchmarks of these areas")
+    args = parser.parse_args()
+
+    statuses = load_statuses(args.statuses) if args.statuses else sample_statuses(2000)
+    for name, area in AREAS.items():
+        if args.area is None or name in args.area:
+            area.run(statuses)
+
+
+if __name__ == "__main__":
+    # make sure we can run this
+    if sys.version_info[0] >= 3 and sys.version_info[1] >= 9:
+        main()
+    else:
+        print("python 3.9 or newer required")
@@ -0,0 +1,270 @@
+"""Benchmark suite for the per-poll status processing, with results saved as JSON to compare runs"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from datetime import datetime
+
+import fordconnect
+import version
+
+from abrp import AbrpClient
+from benchdata import load_statuses, sample_statuses, sample_trip
+from poller import VehicleState
+from usgs_elevation import ElevationService
+from utilities import fordtime_to_datetime
+from vehiclestatus import VehicleStatus
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+# metric -> True if bigger is better, used when comparing runs
+_METRICS = {"p50_us": False, "p99_us": False, "ops_per_s": True, "peak_kib": False, "bytes_per_op": False}
+
+_DECODERS = [
+    fordconnect.decode_lastupdate,
+    fordconnect.decode_odometer,
+    fordconnect.decode_dte,
+    fordconnect.decode_soc,
+    fordconnect.decode_tpms,
+    fordconnect.decode_ignition,
+    fordconnect.decode_plug,
+    fordconnect.decode_charging,
+    fordconnect.decode_preconditioning,
+    fordconnect.decode_doors,
+    fordconnect.decode_locked,
+    fordconnect.decode_windows,
+    fordconnect.decode_alarm,
+    fordconnect.decode_location,
+]
+
+
+def _decode_all(previous, current):
+    """Every decoder used when polling starts."""
+    for decoder in _DECODERS:
+        decoder(current)
+
+
+def _process_status():
+    """Monitor's status processing with a vehicle that has already been polled once."""
+    state = VehicleState("1234567890", client=None)
+
+    def process(previous, current):
+        state.previousStatus = previous
+        fordconnect.process_status(state, current)
+
+    return process
+
+
+def _process_trip():
+    """End of trip processing of a 40 minute trip seen in 160 polls."""
+    samples, locations, used = sample_trip()
+
+    def process(previous, current):
+        fordconnect.process_trip(None, None, samples=samples, client=None)
+
+    return process
+
+
+def _abrp_payload():
+    """ABRP telemetry sample and request URL, everything AbrpClient.post does before the request."""
+    client = AbrpClient("api-key", "token", session=object(), timeout=10)
+
+    def build(previous, current):
+        client.request_url(client.telemetry(current))
+
+    return build
+
+
+# name -> (factory of a fn(previous, current), number of calls in the bulk run, None for the suite's count)
+CASES = {
+    "parse": (lambda: lambda previous, current: VehicleStatus.from_payload(current), None),
+    "differences": (lambda: fordconnect.differences, None),
+    "decode_all": (lambda: _decode_all, None),
+    "decode_tpms": (lambda: lambda previous, current: fordconnect.decode_tpms(current), None),
+    "fordtime_to_datetime": (
+        lambda: lambda previous, current: (
+            fordtime_to_datetime(current.get("lastModifiedDate")),
+            fordtime_to_datetime(current.get("serverTime"), useUTC=False),
+        ),
+        None,
+    ),
+    "abrp_payload": (_abrp_payload, None),
+    "process_status": (_process_status, None),
+    "process_trip": (_process_trip, 200),
+}
+
+# cases given the raw payloads instead of the parsed statuses
+_RAW_CASES = {"parse", "fordtime_to_datetime"}
+
+
+def _pairs(statuses, count):
+    """'count' consecutive (previous, current) pairs, cycling through the statuses."""
+    n = len(statuses)
+    return [(statuses[i % n], statuses[(i + 1) % n]) for i in range(count)]
+
+
+def _percentile(values, fraction):
+    """Value at a fraction of the sorted values."""
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_case(fn, statuses, count, latency_count):
+    """Single call latency, bulk throughput and memory of one case."""
+    # single calls, each timed on its own
+    latencies = []
+    for previous, current in _pairs(statuses, latency_count):
+        started = time.perf_counter_ns()
+        fn(previous, current)
+        latencies.append(time.perf_counter_ns() - started)
+    latencies.sort()
+
+    # bulk, the throughput of a long run without the timer in the loop
+    pairs = _pairs(statuses, count)
+    gc.collect()
+    started = time.perf_counter()
+    for previous, current in pairs:
+        fn(previous, current)
+    elapsed = time.perf_counter() - started
+
+    # memory, traced separately since tracing slows everything down
+    traced = pairs[: max(1, min(count, 10000))]
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for previous, current in traced:
+        fn(previous, current)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "calls": count,
+        "p50_us": _percentile(latencies, 0.50) / 1000,
+        "p99_us": _percentile(latencies, 0.99) / 1000,
+        "max_us": latencies[-1] / 1000,
+        "ops_per_s": count / elapsed,
+        "peak_kib": (peak - before) / 1024,
+        "bytes_per_op": (after - before) / len(traced),
+    }
+
+
+def run_suite(statuses, count=100000, latency_count=5000, cases=None):
+    """Run the cases, returns the results keyed by case name."""
+    # parsed once as the poller does, the cases reading the raw payload get it as it was polled
+    payloads = statuses
+    statuses = [VehicleStatus.from_payload(status) for status in statuses]
+
+    # log as the monitor does, to a stream that is thrown away
+    devnull = open(os.devnull, "w")
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter("[%(asctime)s] [%(module)s] [%(levelname)s] %(message)s"))
+    propagate, level = _LOGGER.propagate, _LOGGER.level
+    _LOGGER.addHandler(handler)
+    _LOGGER.setLevel(logging.INFO)
+    _LOGGER.propagate = False
+    logStatus, elevation = fordconnect._LOGSTATUS, fordconnect._ELEVATION
+    fordconnect._LOGSTATUS = False
+    fordconnect._ELEVATION = ElevationService(fetch=lambda lat, lon: 100.0)
+
+    results = {}
+    try:
+        for name, (factory, fixedCount) in CASES.items():
+            if cases and name not in cases:
+                continue
+            calls = fixedCount or count
+            pairs = payloads if name in _RAW_CASES else statuses
+            results[name] = run_case(factory(), pairs, calls, min(latency_count, calls))
+            print_result(name, results[name])
+    finally:
+        _LOGGER.removeHandler(handler)
+        _LOGGER.setLevel(level)
+        _LOGGER.propagate = propagate
+        fordconnect._LOGSTATUS, fordconnect._ELEVATION = logStatus, elevation
+        devnull.close()
+    return results
+
+
+def print_result(name, result):
+    """Print the results of a case."""
+    print(
+        f"  {name:22s} p50 {result.get('p50_us'):9.2f} us  p99 {result.get('p99_us'):9.2f} us  "
+        f"{result.get('ops_per_s'):11.0f} ops/s  peak {result.get('peak_kib'):8.1f} KiB  "
+        f"{result.get('bytes_per_op'):7.1f} B/op retained"
+    )
+
+
+def compare(results, baseline, threshold):
+    """Metrics more than 'threshold' (a fraction) worse than the baseline, as (case, metric, old, new) tuples."""
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        for metric, biggerIsBetter in _METRICS.items():
+            before, after = old.get(metric), result.get(metric)
+            if before is None or after is None:
+                continue
+            # memory close to nothing is noise, not a regression
+            if metric in ("peak_kib", "bytes_per_op") and abs(after - before) < 1.0:
+                continue
+            worse = before - after if biggerIsBetter else after - before
+            if worse > threshold * abs(before):
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def main():
+    """Run the suite, optionally saving the results and comparing them with an earlier run."""
+    parser = argparse.ArgumentParser(description="Benchmark the per-poll status processing")
+    parser.add_argument("--statuses", metavar="FILE", help="status payloads, one per line, or a fordconnect recording")
+    parser.add_argument("--count", type=int, default=100000, help="calls in each bulk run")
+    parser.add_argument("--case", action="append", help="only run these cases")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="compare with the results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.15, help="fraction worse than the earlier run counted as a regression")
+    args = parser.parse_args()
+
+    statuses = load_statuses(args.statuses) if args.statuses else sample_statuses(2000)
+    source = args.statuses or "synthetic"
+    print(f"Status processing, {len(statuses)} {source} statuses, {args.count} calls per bulk run")
+    results = run_suite(statuses, count=args.count, cases=args.case)
+
+    report = {
+        "meta": {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "version": version.get_version(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "statuses": source,
+            "count": args.count,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        print(f"Compared with {args.compare} ({baseline.get('meta', {}).get('date')}): {len(regressions)} regression(s)")
+        for name, metric, before, after in regressions:
+            print(f"  {name} {metric}: {before:.2f} -> {after:.2f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    # make sure we can run this
+    if sys.version_info[0] >= 3 and sys.version_info[1] >= 9:
+        main()
+    else:
+        print("python 3.9 or newer required")
@@ -0,0 +1,342 @@
+"""Charge sessions and running per-location and per-month totals built from the FordPass charge logs."""
+
+import logging
+import math
+import os
+import sqlite3
+import threading
+
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from utilities import fordtime_to_epoch
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+# charge logs name the time charging started with one of these, depending on the charger
+_START_KEYS = ["plugInTime", "chargeStartTime", "startTime"]
+_NAME_KEYS = ["name", "address", "formattedAddress", "locationName"]
+
+_EARTH_RADIUS = 6371008.8
+
+
+class ChargeSession(NamedTuple):
+    """A charge session, times are seconds since the epoch, durations seconds and power kW."""
+
+    charge_id: str
+    vin: str
+    plug_in: Optional[int]
+    plug_out: int
+    month: str
+    location: int
+    location_name: str
+    start_soc: float
+    end_soc: float
+    soc_gained: float
+    kwh: float
+    duration: Optional[int]
+    average_power: Optional[float]
+
+
+def _epoch(fordTimeString):
+    """Ford UTC time string to seconds since the epoch, None if missing or malformed."""
+    try:
+        return int(fordtime_to_epoch(fordTimeString))
+    except (TypeError, ValueError):
+        return None
+
+
+def _location(chargeLocation):
+    """Name, latitude and longitude of a charge log location, the coordinates are None when not reported."""
+    if isinstance(chargeLocation, dict):
+        name = next((str(chargeLocation.get(key)) for key in _NAME_KEYS if chargeLocation.get(key)), None)
+        try:
+            latitude = float(chargeLocation.get("latitude"))
+            longitude = float(chargeLocation.get("longitude"))
+        except (TypeError, ValueError):
+            latitude = longitude = None
+        if name is None:
+            name = "unknown" if latitude is None else f"({latitude:.4f}, {longitude:.4f})"
+        return name, latitude, longitude
+    if chargeLocation:
+        return str(chargeLocation), None, None
+    return "unknown", None, None
+
+
+def _distance(lat1, lon1, lat2, lon2):
+    """Great circle distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * _EARTH_RADIUS * math.asin(math.sqrt(a))
+
+
+class ChargeTotals:
+    """Class to keep running totals of charge sessions, a session is added once and never revisited."""
+
+    COLUMNS = ["sessions", "duration", "soc_gained", "kwh", "timed_kwh", "max_power", "first", "last"]
+
+    def __init__(self, sessions=0, duration=0, soc_gained=0.0, kwh=0.0, timed_kwh=0.0, max_power=None, first=None, last=None):
+        self.sessions = sessions
+        self.duration = duration
+        self.soc_gained = soc_gained
+        self.kwh = kwh
+        # energy of the sessions with a known duration, the average power is only over those
+        self.timed_kwh = timed_kwh
+        self.max_power = max_power
+        self.first = first
+        self.last = last
+
+    def add(self, session):
+        """Add a session to the totals."""
+        self.sessions += 1
+        self.soc_gained += session.soc_gained
+        self.kwh += session.kwh
+        if session.duration:
+            self.duration += session.duration
+            self.timed_kwh += session.kwh
+            self.max_power = max(self.max_power or 0.0, session.average_power)
+        self.first = session.plug_out if self.first is None else min(self.first, session.plug_out)
+        self.last = session.plug_out if self.last is None else max(self.last, session.plug_out)
+
+    def row(self):
+        """Values in column order."""
+        return [getattr(self, column) for column in self.COLUMNS]
+
+    def as_dict(self):
+        """Totals plus the average energy per session and average power in kW."""
+        return {
+            **{column: getattr(self, column) for column in self.COLUMNS},
+            "kwh_per_session": self.kwh / self.sessions if self.sessions else 0.0,
+            "average_power": self.timed_kwh / (self.duration / 3600) if self.duration else None,
+        }
+
+
+class ChargeAnalytics:
+    """Class to turn charge logs into stored sessions, charge locations within 'radius' meters are one location.
+
+    Each charge log is processed once, the location and month totals are updated as new sessions arrive
+    and are kept in the store so the history is never processed again.
+    """
+
+    def __init__(self, filename, capacity, radius=150.0):
+        """Open (or create) the charge session store, 'capacity' is the usable battery size in kWh."""
+        if filename != ":memory:":
+            filename = os.path.expanduser(filename)
+            directory = os.path.dirname(filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+        self._capacity = capacity
+        self._radius = radius
+        self._lock = threading.Lock()
+        totals = ", ".join(
+            f"{column} {'REAL' if column in ('soc_gained', 'kwh', 'timed_kwh', 'max_power') else 'INTEGER'}"
+            for column in ChargeTotals.COLUMNS
+        )
+        self._db = sqlite3.connect(filename, timeout=5.0, check_same_thread=False)
+        self._db.executescript(
+            f"""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS sessions
+                (charge_id TEXT PRIMARY KEY, vin TEXT, plug_in INTEGER, plug_out INTEGER, month TEXT,
+                 location INTEGER, start_soc REAL, end_soc REAL, kwh REAL, duration INTEGER);
+            CREATE INDEX IF NOT EXISTS sessions_plug_out ON sessions (vin, plug_out);
+            CREATE TABLE IF NOT EXISTS locations
+                (location INTEGER PRIMARY KEY, name TEXT, latitude REAL, longitude REAL, sessions INTEGER);
+            CREATE TABLE IF NOT EXISTS location_totals
+                (vin TEXT, location INTEGER, {totals}, PRIMARY KEY (vin, location)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS month_totals
+                (vin TEXT, month TEXT, {totals}, PRIMARY KEY (vin, month)) WITHOUT ROWID;
+            """
+        )
+        self._db.commit()
+
+        # the locations and totals are small, keep them in memory
+        self._locations = {
+            row[0]: list(row[1:]) for row in self._db.execute("SELECT location, name, latitude, longitude, sessions FROM locations")
+        }
+        self._locationTotals = self._load_totals("location_totals", "location")
+        self._monthTotals = self._load_totals("month_totals", "month")
+
+    def _load_totals(self, table, key):
+        """Stored totals keyed by (vin, key)."""
+        columns = ", ".join(ChargeTotals.COLUMNS)
+        return {
+            (row[0], row[1]): ChargeTotals(*row[2:])
+            for row in self._db.execute(f"SELECT vin, {key}, {columns} FROM {table}")
+        }
+
+    def _cluster(self, name, latitude, longitude):
+        """Location id of the nearest known location within the radius, or of a new location; caller holds the lock."""
+        best, bestDistance = None, self._radius
+        for location, (knownName, knownLatitude, knownLongitude, _) in self._locations.items():
+            if latitude is None or knownLatitude is None:
+                if latitude is None and knownLatitude is None and knownName.casefold() == name.casefold():
+                    best = location
+                    break
+                continue
+            distance = _distance(latitude, longitude, knownLatitude, knownLongitude)
+            if distance <= bestDistance:
+                best, bestDistance = location, distance
+
+        if best is None:
+            best = max(self._locations, default=0) + 1
+            self._locations[best] = [name, latitude, longitude, 0]
+        known = self._locations[best]
+        known[3] += 1
+        if latitude is not None:
+            # the location is the running centroid of its sessions
+            known[1] += (latitude - known[1]) / known[3]
+            known[2] += (longitude - known[2]) / known[3]
+        return best
+
+    def session(self, vin, chargeLog, location=0, locationName="unknown"):
+        """Charge session of a charge log, None if the log is missing its levels or plug out time."""
+        plugOut = _epoch(chargeLog.get("plugOutTime"))
+        try:
+            startSoc = float(chargeLog.get("startBatteryLevel"))
+            endSoc = float(chargeLog.get("endBatteryLevel"))
+        except (TypeError, ValueError):
+            return None
+        if plugOut is None or chargeLog.get("chargeId") is None:
+            return None
+
+        plugIn = next((_epoch(chargeLog.get(key)) for key in _START_KEYS if chargeLog.get(key)), None)
+        duration = plugOut - plugIn if plugIn is not None and plugOut > plugIn else None
+        socGained = endSoc - startSoc
+        kwh = socGained * 0.01 * self._capacity
+        return ChargeSession(
+            charge_id=str(chargeLog.get("chargeId")),
+            vin=vin,
+            plug_in=plugIn,
+            plug_out=plugOut,
+            month=datetime.fromtimestamp(plugOut).strftime("%Y-%m"),
+            location=location,
+            location_name=locationName,
+            start_soc=startSoc,
+            end_soc=endSoc,
+            soc_gained=socGained,
+            kwh=kwh,
+            duration=duration,
+            average_power=kwh / (duration / 3600) if duration else None,
+        )
+
+    def add_logs(self, vin, chargeLogs):
+        """Add the charge logs not seen before in a single pass, returns the new sessions."""
+        added = []
+        with self._lock:
+            known = set()
+            ids = [str(chargeLog.get("chargeId")) for chargeLog in chargeLogs]
+            for i in range(0, len(ids), 500):
+                chunk = ids[i : i + 500]
+                known.update(
+                    row[0]
+                    for row in self._db.execute(
+                        f"SELECT charge_id FROM sessions WHERE charge_id IN ({', '.join('?' * len(chunk))})", chunk
+                    )
+                )
+
+            changedLocations, changedMonths = set(), set()
+            for chargeId, chargeLog in zip(ids, chargeLogs):
+                if chargeId in known:
+                    continue
+                session = self.session(vin, chargeLog)
+                if session is None:
+                    _LOGGER.debug(f"Skipping incomplete charge log {chargeId}")
+                    continue
+                name, latitude, longitude = _location(chargeLog.get("chargeLocation"))
+                location = self._cluster(name, latitude, longitude)
+                session = session._replace(location=location, location_name=self._locations[location][0])
+                known.add(chargeId)
+                added.append(session)
+
+                for totals, key, changed in (
+                    (self._locationTotals, (vin, session.location), changedLocations),
+                    (self._monthTotals, (vin, session.month), changedMonths),
+                ):
+                    if key not in totals:
+                        totals[key] = ChargeTotals()
+                    totals[key].add(session)
+                    changed.add(key)
+
+            if not added:
+                return added
+            self._db.executemany(
+                "INSERT INTO sessions (charge_id, vin, plug_in, plug_out, month, location, start_soc, end_soc, kwh, duration) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (s.charge_id, s.vin, s.plug_in, s.plug_out, s.month, s.location, s.start_soc, s.end_soc, s.kwh, s.duration)
+                    for s in added
+                ],
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO locations (location, name, latitude, longitude, sessions) VALUES (?, ?, ?, ?, ?)",
+                [(location, *self._locations[location]) for location in {s.location for s in added}],
+            )
+            placeholders = ", ".join("?" * (len(ChargeTotals.COLUMNS) + 2))
+            columns = ", ".join(ChargeTotals.COLUMNS)
+            for table, key, totals, changed in (
+                ("location_totals", "location", self._locationTotals, changedLocations),
+                ("month_totals", "month", self._monthTotals, changedMonths),
+            ):
+                self._db.executemany(
+                    f"INSERT OR REPLACE INTO {table} (vin, {key}, {columns}) VALUES ({placeholders})",
+                    [(*k, *totals[k].row()) for k in changed],
+                )
+            self._db.commit()
+        return added
+
+    def sessions(self, vin, start=None, end=None):
+        """Stored sessions of a vehicle unplugged in [start, end), oldest first."""
+        start = 0 if start is None else start
+        end = 2 ** 62 if end is None else end
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT charge_id, vin, plug_in, plug_out, month, location, start_soc, end_soc, kwh, duration "
+                "FROM sessions WHERE vin = ? AND plug_out >= ? AND plug_out < ? ORDER BY plug_out",
+                (vin, start, end),
+            ).fetchall()
+            names = {location: known[0] for location, known in self._locations.items()}
+        return [
+            ChargeSession(
+                charge_id=chargeId,
+                vin=vin,
+                plug_in=plugIn,
+                plug_out=plugOut,
+                month=month,
+                location=location,
+                location_name=names.get(location, "unknown"),
+                start_soc=startSoc,
+                end_soc=endSoc,
+                soc_gained=endSoc - startSoc,
+                kwh=kwh,
+                duration=duration,
+                average_power=kwh / (duration / 3600) if duration else None,
+            )
+            for chargeId, vin, plugIn, plugOut, month, location, startSoc, endSoc, kwh, duration in rows
+        ]
+
+    def location_totals(self, vin):
+        """Totals of a vehicle per charge location, most sessions first."""
+        with self._lock:
+            totals = [
+                {"location": location, "name": self._locations[location][0],
+                 "latitude": self._locations[location][1], "longitude": self._locations[location][2],
+                 **self._locationTotals[(v, location)].as_dict()}
+                for v, location in self._locationTotals
+                if v == vin
+            ]
+        return sorted(totals, key=lambda total: -total.get("sessions"))
+
+    def month_totals(self, vin):
+        """Totals of a vehicle per month, oldest first."""
+        with self._lock:
+            totals = [
+                {"month": month, **self._monthTotals[(v, month)].as_dict()} for v, month in self._monthTotals if v == vin
+            ]
+        return sorted(totals, key=lambda total: total.get("month"))
+
+    def close(self):
+        """Close the charge session store."""
+        with self._lock:
+            self._db.close()
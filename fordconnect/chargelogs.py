@@ -4,52 +4,47 @@
 import logging
 import sys
 import requests
-from datetime import datetime
-from dateutil import tz
 
 import version
 import logfiles
 from readconfig import read_config
+from apicall import api_call, configure_api
+from sessions import configure_sessions
+from utilities import fordtime_to_datetime
 
-from fordpass import Vehicle
+from tokencache import CachedVehicle, use_fordpass_sessions
+from chargeanalytics import ChargeAnalytics
 
 
 _VEHICLECLIENT = None
 
 _LOGGER = logging.getLogger("fordconnect")
 
+_EXTENDED = True
 
-def fordtime_to_datetime(fordTimeString):
-    """Convert Ford UTC time string to local datetime object"""
-    from_zone = tz.tzutc()
-    to_zone = tz.tzlocal()
-    try:
-        utc_dt = datetime.strptime(fordTimeString, "%m-%d-%Y %H:%M:%S.%f")
-    except:
-        utc_dt = datetime.strptime(fordTimeString, "%m-%d-%Y %H:%M:%S")
-    utc = utc_dt.replace(tzinfo=from_zone)
-    return utc.astimezone(to_zone)
+# standard and extended battery sizes in kWh
+_BATTERY = [68, 88]
 
 
 def get_chargelogs():
     global _VEHICLECLIENT
-    status = None
-    tries = 3
-    while tries > 0:
-        try:
-            status = _VEHICLECLIENT.chargelogs()
-            break
-        except requests.ConnectionError:
-            tries -= 1
-            # _LOGGER.info(f"request.get() timed out, {tries} remaining")
-            if tries == 0:
-                _LOGGER.error(f"FordPass Connect API unavailable")
-                raise
-            continue
-        except Exception as e:
-            _LOGGER.error(f"Unexpected exception: {e}")
-            break
-    return status
+
+    try:
+        return api_call("chargelogs", _VEHICLECLIENT.chargelogs)
+    except requests.ConnectionError:
+        raise
+    except Exception as e:
+        _LOGGER.error(f"Unexpected exception: {e}")
+        return None
+
+
+def log_totals(label, totals):
+    """Log the charging totals of a location or month."""
+    power = "unknown" if totals.get("average_power") is None else f"{totals.get('average_power'):.1f} kW"
+    _LOGGER.info(
+        f"{label}: {totals.get('sessions')} session(s), {totals.get('kwh'):.1f} kWh, "
+        f"{totals.get('kwh_per_session'):.1f} kWh per session, {totals.get('duration') / 3600:.1f} hours, average power {power}"
+    )
 
 
 def main():
@@ -64,17 +59,24 @@ def main():
     if not config:
         _LOGGER.error("Error processing YAML configuration - exiting")
         return
+    configure_api(config.get('api'))
+    configure_sessions(config.get('http'))
+    use_fordpass_sessions()
 
     fordconnect = config.get('fordconnect')
-    _VEHICLECLIENT = Vehicle(
+    _VEHICLECLIENT = CachedVehicle(
         username=fordconnect.get('username'),
         password=fordconnect.get('password'),
         vin=fordconnect.get('vin'),
+        cache_file=fordconnect.get('token_cache'),
     )
-    chargeLogs = get_chargelogs().get("chargeLogs")
+    response = get_chargelogs()
+    if response is None:
+        return
+    chargeLogs = response.get("chargeLogs") or []
     _LOGGER.info(f"Charge logs:")
     for chargeLog in chargeLogs:
-        plugOutTime = fordtime_to_datetime(fordTimeString=chargeLog.get("plugOutTime")).strftime("%Y-%m-%dY %H:%M")
+        plugOutTime = fordtime_to_datetime(fordTimeString=chargeLog.get("plugOutTime"), useUTC=False).strftime("%Y-%m-%dY %H:%M")
         startBatteryLevel = chargeLog.get("startBatteryLevel")
         endBatteryLevel = chargeLog.get("endBatteryLevel")
         chargeLocation = chargeLog.get("chargeLocation")
@@ -82,6 +84,30 @@ def main():
             f"ID: {chargeLog.get('chargeId')}, Plug out time: {plugOutTime}, startBatteryLevel: {startBatteryLevel}, End Battery Level: {endBatteryLevel}, Location: {chargeLocation}"
         )
 
+    charging = config.get('charging')
+    vin = fordconnect.get('vin')
+    analytics = ChargeAnalytics(
+        charging.get('store_file'), capacity=_BATTERY[_EXTENDED], radius=charging.get('location_radius')
+    )
+    try:
+        added = analytics.add_logs(vin, chargeLogs)
+        _LOGGER.info(f"")
+        _LOGGER.info(f"{len(added)} new charge session(s), {len(analytics.sessions(vin))} stored")
+        for session in added:
+            power = "unknown" if session.average_power is None else f"{session.average_power:.1f} kW"
+            _LOGGER.info(
+                f"ID: {session.charge_id}, {session.soc_gained:.1f}% ({session.kwh:.1f} kWh) at '{session.location_name}', "
+                f"average power {power}"
+            )
+        _LOGGER.info(f"Charging by location:")
+        for totals in analytics.location_totals(vin):
+            log_totals(totals.get("name"), totals)
+        _LOGGER.info(f"Charging by month:")
+        for totals in analytics.month_totals(vin):
+            log_totals(totals.get("month"), totals)
+    finally:
+        analytics.close()
+
 
 if __name__ == "__main__":
     # make sure we can run this
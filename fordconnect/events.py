@@ -0,0 +1,275 @@
+"""In-process event bus, status changes and trips are published to sinks that each run on their own thread."""
+
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+
+from collections import deque
+from typing import NamedTuple
+
+from metrics import EVENT_FAILURES, EVENT_HANDLE_TIME, EVENTS_DROPPED, EVENTS_PUBLISHED
+from sessions import get_session, request_timeout
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+STATUS_CHANGED = "status_changed"
+TRIP_STARTED = "trip_started"
+TRIP_ENDED = "trip_ended"
+CHARGING_STARTED = "charging_started"
+
+EVENT_TYPES = [STATUS_CHANGED, TRIP_STARTED, TRIP_ENDED, CHARGING_STARTED]
+
+
+class Event(NamedTuple):
+    """Event published for a vehicle, 'time' is when the vehicle last modified the status in epoch seconds.
+
+    'changes' are the differences from the previous status, for TRIP_ENDED 'previous' is the start of the trip
+    and 'trip' is the Trip found by the trip detector.
+    """
+
+    type: str
+    vin: str
+    time: float
+    status: object
+    changes: dict = None
+    previous: object = None
+    trip: object = None
+
+    def as_dict(self):
+        """Event as a dict that can be written as JSON."""
+        event = {
+            "type": self.type,
+            "vin": self.vin,
+            "time": self.time,
+            "status": self.status.as_dict() if self.status is not None else None,
+        }
+        if self.changes:
+            event["changes"] = self.changes
+        if self.previous is not None:
+            event["previous"] = self.previous.as_dict()
+        if self.trip is not None:
+            event["trip"] = self.trip.as_dict()
+        return event
+
+
+class EventSink:
+    """Base class of the event sinks, a sink handles the events of 'types' (every type if None) on its own thread."""
+
+    name = "sink"
+    types = None
+
+    def handle(self, event):
+        """Handle an event, exceptions are logged and counted as failures."""
+        raise NotImplementedError
+
+    def close(self):
+        """Release anything held by the sink, called once its queue is drained."""
+
+
+class _SinkWorker:
+    """Class to feed a sink from a bounded queue on a worker thread, the oldest event is dropped when it is full."""
+
+    def __init__(self, sink, queue_size):
+        self.sink = sink
+        self._types = frozenset(sink.types) if sink.types is not None else None
+        self._queue = deque()
+        self._queue_size = queue_size
+        self._condition = threading.Condition()
+        self._stopping = False
+
+        self.queued = 0
+        self.dropped = 0
+        self.handled = 0
+        self.failed = 0
+        self.busy = 0.0
+
+        self._thread = threading.Thread(target=self._run, name=f"events-{sink.name}", daemon=True)
+        self._thread.start()
+
+    def accepts(self, eventType):
+        """True if the sink handles events of this type."""
+        return self._types is None or eventType in self._types
+
+    def put(self, event):
+        """Queue an event without waiting."""
+        with self._condition:
+            self.queued += 1
+            if len(self._queue) >= self._queue_size:
+                self.dropped += 1
+                self._queue.popleft()
+                EVENTS_DROPPED.inc(self.sink.name)
+            self._queue.append(event)
+            self._condition.notify()
+
+    def _run(self):
+        """Worker thread handling the queued events in order."""
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                event = self._queue.popleft()
+
+            started = time.perf_counter()
+            try:
+                self.sink.handle(event)
+                ok = True
+            except Exception as e:
+                _LOGGER.warning(f"Event sink '{self.sink.name}' failed to handle a '{event.type}' event: {e}")
+                EVENT_FAILURES.inc(self.sink.name)
+                ok = False
+            elapsed = time.perf_counter() - started
+            EVENT_HANDLE_TIME.observe(elapsed, self.sink.name)
+            with self._condition:
+                self.busy += elapsed
+                if ok:
+                    self.handled += 1
+                else:
+                    self.failed += 1
+
+    def metrics(self):
+        """Queue depth and event counters."""
+        with self._condition:
+            return {
+                "depth": len(self._queue),
+                "queued": self.queued,
+                "dropped": self.dropped,
+                "handled": self.handled,
+                "failed": self.failed,
+                "busy": self.busy,
+            }
+
+    def close(self, timeout):
+        """Stop the worker once the queue is drained, then close the sink.  A sink still handling an event after
+        'timeout' seconds is left open, its worker is a daemon thread and ends with the process."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            _LOGGER.warning(f"Event sink '{self.sink.name}' is still busy after {timeout} s, leaving it open")
+            return
+        try:
+            self.sink.close()
+        except Exception as e:
+            _LOGGER.warning(f"Unable to close event sink '{self.sink.name}': {e}")
+
+
+class EventBus:
+    """Class to publish events to the subscribed sinks, publishing never waits for a sink."""
+
+    def __init__(self, queue_size=64):
+        """Create the bus, 'queue_size' is the default number of events each sink can fall behind by."""
+        self._queue_size = queue_size
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, sink, queue_size=None):
+        """Start delivering events to a sink."""
+        worker = _SinkWorker(sink, queue_size or self._queue_size)
+        with self._lock:
+            self._workers = self._workers + [worker]
+        _LOGGER.info(f"Event sink '{sink.name}' subscribed to {', '.join(sink.types or ['every event'])}")
+        return sink
+
+    @property
+    def sinks(self):
+        """Subscribed sinks."""
+        return [worker.sink for worker in self._workers]
+
+    def publish(self, event):
+        """Queue an event for every sink that handles its type."""
+        EVENTS_PUBLISHED.inc(event.type)
+        for worker in self._workers:
+            if worker.accepts(event.type):
+                worker.put(event)
+
+    def metrics(self):
+        """Queue depth and event counters of each sink."""
+        return {worker.sink.name: worker.metrics() for worker in self._workers}
+
+    def log_metrics(self):
+        """Log the sink metrics."""
+        for name, metrics in self.metrics().items():
+            _LOGGER.info(
+                f"Event sink '{name}': {metrics.get('handled')} handled, {metrics.get('failed')} failed, "
+                f"{metrics.get('dropped')} dropped, {metrics.get('depth')} queued, busy {metrics.get('busy'):.1f} s"
+            )
+
+    def close(self, timeout=5.0):
+        """Deliver the queued events and close every sink."""
+        with self._lock:
+            workers = self._workers
+        for worker in workers:
+            worker.close(timeout)
+
+
+class JsonLinesSink(EventSink):
+    """Class to append every event to a file as a JSON line."""
+
+    name = "jsonl"
+
+    def __init__(self, filename):
+        """Open the file for appending."""
+        filename = os.path.expanduser(filename)
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(filename, "a", encoding="utf-8")
+
+    def handle(self, event):
+        self._file.write(json.dumps(event.as_dict(), separators=(",", ":"), default=str))
+        self._file.write("\n")
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class WebhookSink(EventSink):
+    """Class to POST every event as JSON to a local webhook."""
+
+    name = "webhook"
+
+    def __init__(self, url, session=None, timeout=None):
+        """Create the webhook client."""
+        self._url = url
+        self._session = session or get_session("webhook")
+        self._timeout = timeout or request_timeout()
+
+    def handle(self, event):
+        response = self._session.post(self._url, json=event.as_dict(), timeout=self._timeout)
+        response.raise_for_status()
+
+
+def load_sink(spec):
+    """Create a plugin sink from 'module.Class', the class is created without arguments."""
+    moduleName, _, className = spec.rpartition(".")
+    if not moduleName:
+        raise ValueError(f"Event sink '{spec}' must be given as 'module.Class'")
+    sink = getattr(importlib.import_module(moduleName), className)()
+    if not isinstance(sink, EventSink):
+        raise ValueError(f"Event sink '{spec}' is not an EventSink")
+    return sink
+
+
+def create_event_bus(options, external=True):
+    """Event bus with the JSON-lines, webhook and plugin sinks of the 'events' options, 'external' False leaves
+    out the sinks that send events elsewhere."""
+    bus = EventBus(queue_size=options.get('queue_size'))
+    if options.get('jsonl_file'):
+        bus.subscribe(JsonLinesSink(options.get('jsonl_file')))
+    if external and options.get('webhook_url'):
+        bus.subscribe(WebhookSink(options.get('webhook_url')))
+    if external:
+        for spec in options.get('sinks') or []:
+            try:
+                bus.subscribe(load_sink(str(spec)))
+            except Exception as e:
+                _LOGGER.error(f"Unable to load event sink '{spec}': {e}")
+    return bus
@@ -1,26 +1,37 @@
 """Code to interface with the FordPass Connect API as used in the FordPass app"""
 
+import argparse
 import logging
 import sys
 import time
 import requests
 import json
-import pprint
 
 import version
 import logfiles
 from readconfig import read_config
-from utilities import fordtime_to_datetime
+from apicall import api_call, configure_api, log_api_stats
+from metrics import DIFF_TIME, start_metrics_server, update_status
+from utilities import epoch_to_datetime
+from vehiclestatus import CHARGING_STATES, VehicleStatus
+
+from tokencache import CachedVehicle, use_fordpass_sessions
+from geocoder import create_geocoder
+from abrp import AbrpClient, AbrpSender, AbrpSink
+from usgs_elevation import create_elevation_service
+from sessions import configure_sessions
+from poller import VehicleState, VehiclePoller
+from scheduler import PollScheduler
+from statusdiff import StatusDiffer
+from statusstore import StatusStore
+from replay import Recorder, Recording, ReplayVehicle, VirtualClock
+from events import CHARGING_STARTED, STATUS_CHANGED, TRIP_ENDED, TRIP_STARTED, Event, EventSink, create_event_bus
 
-from fordpass import Vehicle
-from geocodio import GeocodioClient
-from abrp import AbrpClient
-from usgs_elevation import usgs_alt
 
-
-_VEHICLECLIENT = None
 _GEOCLIENT = None
-_ABRPCLIENT = None
+_EVENTS = None
+_ELEVATION = None
+_HISTORY = None
 
 _METRIC = False
 _EXTENDED = True
@@ -28,6 +39,9 @@ _PSI = True
 _LOGSTATUS = True
 
 _LOGGER = logging.getLogger("fordconnect")
+_UNTRACKED = logging.getLogger("fordconnect.untracked")
+
+_DIFFER = StatusDiffer(psi=_PSI)
 
 _UNITS = [
     {"speed": "mph", "distance": "miles", "elevation": "ft"},
@@ -45,11 +59,11 @@ _BATTERY = [68, 88]
 
 
 def last_status_update(status, useUTC=True):
-    return fordtime_to_datetime(status.get("lastModifiedDate"), useUTC)
+    return epoch_to_datetime(status.modified, useUTC)
 
 
 def server_time(status, useUTC=True):
-    return fordtime_to_datetime(status.get("serverTime"), useUTC)
+    return epoch_to_datetime(status.server_time, useUTC)
 
 
 def time_since_update(status):
@@ -62,11 +76,12 @@ def time_since_update(status):
 # 'Btwn 60 % and fully open'
 # 'Fully closed position'
 def decode_windows(status):
+    windows = status.path("windowPosition") or {}
     windowPosition = [
-        status.get("windowPosition").get("driverWindowPosition").get("value"),
-        status.get("windowPosition").get("passWindowPosition").get("value"),
-        status.get("windowPosition").get("rearDriverWindowPos").get("value"),
-        status.get("windowPosition").get("rearPassWindowPos").get("value"),
+        windows.get("driverWindowPosition", {}).get("value"),
+        windows.get("passWindowPosition", {}).get("value"),
+        windows.get("rearDriverWindowPos", {}).get("value"),
+        windows.get("rearPassWindowPos", {}).get("value"),
     ]
     uniquePositions = set(windowPosition)
     if len(uniquePositions) == 1 and 'Fully closed position' in uniquePositions:
@@ -77,14 +92,15 @@ def decode_windows(status):
 
 # 'Closed', 'Ajar'
 def decode_doors(status):
+    doors = status.path("doorStatus") or {}
     doorStatus = [
-        status.get("doorStatus").get("rightRearDoor").get("value"),
-        status.get("doorStatus").get("leftRearDoor").get("value"),
-        status.get("doorStatus").get("driverDoor").get("value"),
-        status.get("doorStatus").get("passengerDoor").get("value"),
-        status.get("doorStatus").get("hoodDoor").get("value"),
-        status.get("doorStatus").get("tailgateDoor").get("value"),
-        status.get("doorStatus").get("innerTailgateDoor").get("value"),
+        doors.get("rightRearDoor", {}).get("value"),
+        doors.get("leftRearDoor", {}).get("value"),
+        doors.get("driverDoor", {}).get("value"),
+        doors.get("passengerDoor", {}).get("value"),
+        doors.get("hoodDoor", {}).get("value"),
+        doors.get("tailgateDoor", {}).get("value"),
+        doors.get("innerTailgateDoor", {}).get("value"),
     ]
     if "Ajar" in doorStatus:
         _LOGGER.info(f"Door status is {doorStatus}")
@@ -100,20 +116,17 @@ def decode_lastupdate(status):
 
 # 'Off', 'Start', 'Run'
 def decode_ignition(status):
-    ignitionStatus = status.get("ignitionStatus").get("value")
-    _LOGGER.info(f"Ignition is '{ignitionStatus}'")
+    _LOGGER.info(f"Ignition is '{status.ignition}'")
 
 
 # 'NotReady', 'ChargingAC', 'ChargeTargetReached', 'ChargeStartCommanded', 'ChargeStopCommanded'
 def decode_charging(status):
-    chargingStatus = status.get("chargingStatus").get("value")
-    _LOGGER.info(f"Charging status is '{chargingStatus}'")
+    _LOGGER.info(f"Charging status is '{status.charging}'")
 
 
 # 0 - Not plugged in, 1 - Plugged in
 def decode_plug(status):
-    plugStatus = status.get("plugStatus").get("value")
-    plugState = "plugged in" if plugStatus else "not plugged in"
+    plugState = "plugged in" if status.plug else "not plugged in"
     _LOGGER.info(f"Vehicle is {plugState}")
 
 
@@ -122,19 +135,14 @@ def decode_tpms(status):
     # _LOGGER.info(f"Tire pressures {tirePressureStatus}")
     global _PSI
     adjustKPA = 0.1450377 if _PSI else 1.0
-    tirePressures = [
-        int(round(float(status.get("TPMS").get("leftFrontTirePressure").get("value")) * adjustKPA, 0)),
-        int(round(float(status.get("TPMS").get("rightFrontTirePressure").get("value")) * adjustKPA, 0)),
-        int(round(float(status.get("TPMS").get("outerLeftRearTirePressure").get("value")) * adjustKPA, 0)),
-        int(round(float(status.get("TPMS").get("outerRightRearTirePressure").get("value")) * adjustKPA, 0)),
-    ]
+    tirePressures = [int(round(pressure * adjustKPA, 0)) for pressure in status.tire_pressures]
     _LOGGER.info(f"Tire pressures are {tirePressures}")
 
 
 def decode_odometer(status):
     global _METRIC
 
-    odometer_m = float(status.get("odometer").get("value")) * 1000
+    odometer_m = status.odometer * 1000
     odometer_km = odometer_m * _CONVERSIONS[_METRIC == True].get("distance")
     odometer_miles = odometer_m * _CONVERSIONS[_METRIC == False].get("distance")
     if _METRIC:
@@ -148,7 +156,7 @@ def decode_odometer(status):
 def decode_dte(status):
     global _METRIC
 
-    dte_m = float(status.get("elVehDTE").get("value")) * 1000
+    dte_m = status.dte * 1000
     dte_km = dte_m * _CONVERSIONS[_METRIC == True].get("distance")
     dte_miles = dte_m * _CONVERSIONS[_METRIC == False].get("distance")
     if _METRIC:
@@ -160,39 +168,34 @@ def decode_dte(status):
 
 
 def decode_soc(status):
-    soc = float(status.get("batteryFillLevel").get("value"))
-    battery = status.get("battery")
     _LOGGER.info(
-        f"Battery is at {soc:.1f}% of capacity, health is '{battery.get('batteryHealth').get('value')}', status is {battery.get('batteryStatusActual').get('value')}"
+        f"Battery is at {status.soc:.1f}% of capacity, health is '{status.battery_health}', status is {status.battery_volts}"
     )
 
 
 # 'LOCKED', 'UNLOCKED'
 def decode_locked(status):
-    locked = status.get("lockStatus").get("value")
-    _LOGGER.info(f"Car doors are '{locked}'")
+    _LOGGER.info(f"Car doors are '{status.lock}'")
 
 
 # 'NOTSET', 'SET', 'ACTIVE'
 def decode_alarm(status):
-    alarm = status.get("alarm").get("value")
-    _LOGGER.info(f"Alarm is '{alarm}'")
+    _LOGGER.info(f"Alarm is '{status.alarm}'")
 
 
 def decode_preconditioning(status):
-    remoteStartStatus = status.get("remoteStartStatus").get("value")
-    if remoteStartStatus == 0:
+    if status.remote_start == 0:
         _LOGGER.info(f"Vehicle is not preconditioning")
     else:
-        remoteStartDuration = int(status.get("remoteStart").get("remoteStartDuration"))
-        remoteStartTime = int(status.get("remoteStart").get("remoteStartTime"))
+        remoteStart = status.path("remoteStart")
+        remoteStartDuration = int(remoteStart.get("remoteStartDuration"))
+        remoteStartTime = int(remoteStart.get("remoteStartTime"))
         _LOGGER.info(f"Vehicle is preconditioning, time is {remoteStartTime} for duration {remoteStartDuration}")
 
 
 def decode_location(status) -> str:
     global _GEOCLIENT
-    latitude = float(status.get("gps").get("latitude"))
-    longitude = float(status.get("gps").get("longitude"))
+    latitude, longitude = status.latitude, status.longitude
     if not _GEOCLIENT:
         return f"({latitude:.4f}, {longitude:.4f})"
 
@@ -205,173 +208,10 @@ def decode_location(status) -> str:
 
 
 def differences(previous, current):
-    global _PSI, _LOGSTATUS
-
-    diffs = {}
-
-    # ignitionStatus
-    if previous.get("ignitionStatus").get("value") != current.get("ignitionStatus").get("value"):
-        diffs["ignitionStatus"] = current.get("ignitionStatus").get("value")
-    # odometer
-    if previous.get("odometer").get("value") != current.get("odometer").get("value"):
-        diffs["odometer"] = current.get("odometer").get("value")
-    # elVehDTE
-    if round(float(previous.get("elVehDTE").get("value")), 6) != round(float(current.get("elVehDTE").get("value")), 6):
-        diffs["elVehDTE"] = round(current.get("elVehDTE").get("value"), 1)
-    # batteryFillLevel
-    if previous.get("batteryFillLevel").get("value") != current.get("batteryFillLevel").get("value"):
-        diffs["batteryFillLevel"] = current.get("batteryFillLevel").get("value")
-    # battery
-    if previous.get("battery").get("batteryHealth").get("value") != current.get("battery").get("batteryHealth").get(
-        "value"
-    ):
-        diffs["batteryHealth"] = current.get("battery").get("batteryHealth").get("value")
-    if previous.get("battery").get("batteryStatusActual").get("value") != current.get("battery").get(
-        "batteryStatusActual"
-    ).get("value"):
-        diffs["batteryStatusActual"] = current.get("battery").get("batteryStatusActual").get("value")
-    # batteryPerfStatus
-    if previous.get("batteryPerfStatus").get("value") != current.get("batteryPerfStatus").get("value"):
-        diffs["batteryPerfStatus"] = current.get("batteryPerfStatus").get("value")
-    # batteryChargeStatus
-    if previous.get("batteryChargeStatus").get("value") != current.get("batteryChargeStatus").get("value"):
-        diffs["batteryChargeStatus"] = current.get("batteryChargeStatus").get("value")
-    # gps
-    if previous.get("gps").get("latitude") != current.get("gps").get("latitude"):
-        diffs["latitude"] = current.get("gps").get("latitude")
-        diffs["longitude"] = current.get("gps").get("longitude")
-    if previous.get("gps").get("longitude") != current.get("gps").get("longitude"):
-        diffs["latitude"] = current.get("gps").get("latitude")
-        diffs["longitude"] = current.get("gps").get("longitude")
-    # lockStatus
-    if previous.get("lockStatus").get("value") != current.get("lockStatus").get("value"):
-        diffs["lockStatus"] = current.get("lockStatus").get("value")
-    # alarm
-    if previous.get("alarm").get("value") != current.get("alarm").get("value"):
-        diffs["alarm"] = current.get("alarm").get("value")
-    # chargingStatus
-    if previous.get("chargingStatus").get("value") != current.get("chargingStatus").get("value"):
-        diffs["chargingStatus"] = current.get("chargingStatus").get("value")
-    # chargeStartTime
-    if previous.get("chargeStartTime").get("value") != current.get("chargeStartTime").get("value"):
-        diffs["chargeStartTime"] = current.get("chargeStartTime").get("value")
-    # chargeEndTime
-    if previous.get("chargeEndTime").get("value") != current.get("chargeEndTime").get("value"):
-        diffs["chargeEndTime"] = current.get("chargeEndTime").get("value")
-    # plugStatus
-    if previous.get("plugStatus").get("value") != current.get("plugStatus").get("value"):
-        diffs["plugStatus"] = current.get("plugStatus").get("value")
-    # log modified times
-    # diffs["lastModifiedDate"] = previous.get("lastModifiedDate") + "/" + current.get("lastModifiedDate")
-    # log server times
-    # diffs["serverTime"] = previous.get("serverTime") + "/" + current.get("serverTime")
-    # firmwareUpgInProgress
-    if previous.get("firmwareUpgInProgress").get("value") != current.get("firmwareUpgInProgress").get("value"):
-        diffs["firmwareUpgInProgress"] = current.get("firmwareUpgInProgress").get("value")
-    # deepSleepInProgress
-    if previous.get("deepSleepInProgress").get("value") != current.get("deepSleepInProgress").get("value"):
-        diffs["deepSleepInProgress"] = current.get("deepSleepInProgress").get("value")
-    # PrmtAlarmEvent
-    if previous.get("PrmtAlarmEvent").get("value") != current.get("PrmtAlarmEvent").get("value"):
-        diffs["PrmtAlarmEvent"] = current.get("PrmtAlarmEvent").get("value")
-    # remoteStartStatus
-    if previous.get("remoteStartStatus").get("value") != current.get("remoteStartStatus").get("value"):
-        diffs["remoteStartStatus"] = current.get("remoteStartStatus").get("value")
-    # preCondStatusDsply
-    if previous.get("preCondStatusDsply").get("value") != current.get("preCondStatusDsply").get("value"):
-        diffs["preCondStatusDsply"] = current.get("preCondStatusDsply").get("value")
-    # tirePressure
-    if previous.get("tirePressure").get("value") != current.get("tirePressure").get("value"):
-        diffs["tirePressure"] = current.get("tirePressure").get("value")
-    # oilLife
-    if previous.get("oil").get("oilLife") != current.get("oil").get("oilLife"):
-        diffs["oilLife"] = current.get("oil").get("oilLife")
-    # oilLifeActual
-    if previous.get("oil").get("oilLifeActual") != current.get("oil").get("oilLifeActual"):
-        diffs["oilLifeActual"] = current.get("oil").get("oilLifeActual")
-    # TMPS
-    adjustKPA = 0.1450377 if _PSI else 1.0
-    oldTirePressures = [
-        int(round(float(previous.get("TPMS").get("leftFrontTirePressure").get("value")) * adjustKPA, 0)),
-        int(round(float(previous.get("TPMS").get("rightFrontTirePressure").get("value")) * adjustKPA, 0)),
-        int(round(float(previous.get("TPMS").get("outerLeftRearTirePressure").get("value")) * adjustKPA, 0)),
-        int(round(float(previous.get("TPMS").get("outerRightRearTirePressure").get("value")) * adjustKPA, 0)),
-    ]
-    newTirePressures = [
-        int(round(float(current.get("TPMS").get("leftFrontTirePressure").get("value")) * adjustKPA, 0)),
-        int(round(float(current.get("TPMS").get("rightFrontTirePressure").get("value")) * adjustKPA, 0)),
-        int(round(float(current.get("TPMS").get("outerLeftRearTirePressure").get("value")) * adjustKPA, 0)),
-        int(round(float(current.get("TPMS").get("outerRightRearTirePressure").get("value")) * adjustKPA, 0)),
-    ]
-    for i in range(len(oldTirePressures)):
-        if oldTirePressures[i] != newTirePressures[i]:
-            diffs["TPMS"] = newTirePressures
-            break
-    # fstChrgBulkTEst
-    if previous.get("dcFastChargeData").get("fstChrgBulkTEst").get("value") != current.get("dcFastChargeData").get(
-        "fstChrgBulkTEst"
-    ).get("value"):
-        diffs["fstChrgBulkTEst"] = current.get("dcFastChargeData").get("fstChrgBulkTEst").get("value")
-    # fstChrgCmpltTEst
-    if previous.get("dcFastChargeData").get("fstChrgCmpltTEst").get("value") != current.get("dcFastChargeData").get(
-        "fstChrgCmpltTEst"
-    ).get("value"):
-        diffs["fstChrgCmpltTEst"] = current.get("dcFastChargeData").get("fstChrgCmpltTEst").get("value")
-    # batteryTracLowChargeThreshold
-    if previous.get("batteryTracLowChargeThreshold").get("value") != current.get("batteryTracLowChargeThreshold").get(
-        "value"
-    ):
-        diffs["batteryTracLowChargeThreshold"] = current.get("batteryTracLowChargeThreshold").get("value")
-    # battTracLoSocDDsply
-    if previous.get("battTracLoSocDDsply").get("value") != current.get("battTracLoSocDDsply").get("value"):
-        diffs["battTracLoSocDDsply"] = current.get("battTracLoSocDDsply").get("value")
-    # doorStatus
-    if previous.get("doorStatus").get("rightRearDoor").get("value") != current.get("doorStatus").get(
-        "rightRearDoor"
-    ).get("value"):
-        diffs["rightRearDoor"] = current.get("doorStatus").get("rightRearDoor").get("value")
-    if previous.get("doorStatus").get("leftRearDoor").get("value") != current.get("doorStatus").get("leftRearDoor").get(
-        "value"
-    ):
-        diffs["leftRearDoor"] = current.get("doorStatus").get("leftRearDoor").get("value")
-    if previous.get("doorStatus").get("driverDoor").get("value") != current.get("doorStatus").get("driverDoor").get(
-        "value"
-    ):
-        diffs["driverDoor"] = current.get("doorStatus").get("driverDoor").get("value")
-    if previous.get("doorStatus").get("passengerDoor").get("value") != current.get("doorStatus").get(
-        "passengerDoor"
-    ).get("value"):
-        diffs["passengerDoor"] = current.get("doorStatus").get("passengerDoor").get("value")
-    if previous.get("doorStatus").get("hoodDoor").get("value") != current.get("doorStatus").get("hoodDoor").get(
-        "value"
-    ):
-        diffs["hoodDoor"] = current.get("doorStatus").get("hoodDoor").get("value")
-    if previous.get("doorStatus").get("tailgateDoor").get("value") != current.get("doorStatus").get("tailgateDoor").get(
-        "value"
-    ):
-        diffs["tailgateDoor"] = current.get("doorStatus").get("tailgateDoor").get("value")
-    if previous.get("doorStatus").get("innerTailgateDoor").get("value") != current.get("doorStatus").get(
-        "innerTailgateDoor"
-    ).get("value"):
-        diffs["innerTailgateDoor"] = current.get("doorStatus").get("innerTailgateDoor").get("value")
-    # windowPosition
-    if previous.get("windowPosition").get("driverWindowPosition").get("value") != current.get("windowPosition").get(
-        "driverWindowPosition"
-    ).get("value"):
-        diffs["driverWindowPosition"] = current.get("windowPosition").get("driverWindowPosition").get("value")
-    if previous.get("windowPosition").get("passWindowPosition").get("value") != current.get("windowPosition").get(
-        "rigdriverWindowPosipassWindowPositionionhtRearDoor"
-    ).get("value"):
-        diffs["passWindowPosition"] = current.get("windowPosition").get("passWindowPosition").get("value")
-    if previous.get("windowPosition").get("rearDriverWindowPos").get("value") != current.get("windowPosition").get(
-        "rearDriverWindowPos"
-    ).get("value"):
-        diffs["rearDriverWindowPos"] = current.get("windowPosition").get("rearDriverWindowPos").get("value")
-    if previous.get("windowPosition").get("rearPassWindowPos").get("value") != current.get("windowPosition").get(
-        "rearPassWindowPos"
-    ).get("value"):
-        diffs["rearPassWindowPos"] = current.get("windowPosition").get("rearPassWindowPos").get("value")
+    global _DIFFER, _LOGSTATUS
 
+    with DIFF_TIME.time():
+        diffs = _DIFFER.diff(previous, current)
     if len(diffs) > 0:
         _LOGGER.info(f"{diffs}")
         # if diffs.get("latitude") or diffs.get("longitude"):
@@ -384,99 +224,144 @@ def differences(previous, current):
 
 
 def log_differences(previous, current):
-    previousJSON = json.dumps(previous)
-    currentJSON = json.dumps(current)
-    with open("log/previous.txt", "w") as previousFile:
-        prev = pprint.PrettyPrinter(indent=0, width=10, sort_dicts=True, stream=previousFile)
-        prev.pprint(previousJSON)
-    with open("log/current.txt", "w") as currentFile:
-        cur = pprint.PrettyPrinter(indent=0, width=10, sort_dicts=True, stream=currentFile)
-        cur.pprint(currentJSON)
-
-
-def get_vehicle_status():
-    global _VEHICLECLIENT
-    status = None
-    tries = 3
-    while tries > 0:
-        try:
-            status = _VEHICLECLIENT.status()
-            break
-        except requests.ConnectionError:
-            tries -= 1
-            # _LOGGER.info(f"request.get() timed out, {tries} remaining")
-            if tries == 0:
-                _LOGGER.error(f"FordPass Connect API unavailable")
-                raise
-            continue
-        except Exception as e:
-            _LOGGER.error(f"Unexpected exception: {e}")
-            raise
+    """Append the changes to untracked parts of the status as a JSON line."""
+    global _DIFFER, _UNTRACKED
 
-    return status
+    changes = _DIFFER.untracked(previous, current)
+    if changes:
+        entry = {"vin": current.vin, "modified": current.modified, "changes": changes}
+        _UNTRACKED.info(json.dumps(entry, separators=(",", ":"), default=str))
 
 
-def process_trip(start, end) -> None:
-    """Process the starting and ending status reports for a trip."""
+def get_vehicle_status(vehicle):
+    """Poll the status of a vehicle, parsed once for everything that reads it."""
+    try:
+        return VehicleStatus.from_payload(api_call("status", vehicle.status))
+    except requests.ConnectionError:
+        raise
+    except Exception as e:
+        _LOGGER.error(f"Unexpected exception: {e}")
+        raise
 
-    global _METRIC, _EXTENDED, _CONVERSIONS, _UNITS, _BATTERY
 
-    elapsedTimeHours = (last_status_update(end) - last_status_update(start)).total_seconds() / 3600
+def trip_locations(client, start, end):
+    """Locations of the journeys recorded between two epoch times, None if not available."""
+    if not hasattr(client, "journeys"):
+        return None
+    try:
+        journeys = api_call("journeys", client.journeys, start=int(start), end=int(end) + 1).get("value") or []
+        locations = []
+        for journey in journeys:
+            details = api_call("journey_details", client.journey_details, id=journey.get("journeyID"))
+            locations.extend(details.get("value").get("locations") or [])
+        return locations or None
+    except Exception as e:
+        _LOGGER.warning(f"Unable to fetch the journey locations of the trip: {e}")
+        return None
 
-    percentUsed = float(start.get("batteryFillLevel").get("value")) - float(end.get("batteryFillLevel").get("value"))
-    kwhUsed = percentUsed * 0.01 * _BATTERY[_EXTENDED]
 
-    # Must be meters for conversion lookup table
-    dist_km = end.get("odometer").get("value") - start.get("odometer").get("value")
-    dist_m = dist_km * 1000
-    distance = dist_m * _CONVERSIONS[_METRIC].get("distance")
+def process_trip_samples(samples, client=None, timed=True) -> None:
+    """Log the distance, elevation and energy integrated over the whole path of a trip, 'timed' is False when
+    the trip only took part of the time between its samples."""
 
-    distpkwh = 99.999 if kwhUsed <= 0.0 else distance / kwhUsed
-    averageSpeed = distance / elapsedTimeHours
+    global _METRIC, _EXTENDED, _CONVERSIONS, _UNITS, _BATTERY, _ELEVATION
+
+    # numpy is only loaded once the first trip ends
+    from tripanalysis import analyze_trip
+
+    started = time.perf_counter()
+    locations = trip_locations(client, start=samples.timestamp[0], end=samples.timestamp[-1])
+    trip = analyze_trip(samples, capacity=_BATTERY[_EXTENDED], locations=locations, elevation=_ELEVATION)
 
-    startingElevation = usgs_alt(lat=start.get("gps").get("latitude"), lon=start.get("gps").get("longitude"))
-    endingElevation = usgs_alt(lat=end.get("gps").get("latitude"), lon=end.get("gps").get("longitude"))
-    deltaElevation = (endingElevation - startingElevation) * _CONVERSIONS[_METRIC].get("elevation")
+    units = _UNITS[_METRIC]
+    conversions = _CONVERSIONS[_METRIC]
+    elapsedTimeHours = trip.get("duration") / 3600
+    distance = trip.get("distance") * conversions.get("distance")
+    if timed:
+        took = f"{elapsedTimeHours:.2f} hours"
+        averageSpeed = f"{distance / elapsedTimeHours if elapsedTimeHours > 0 else 0.0:.1f} {units.get('speed')}"
+    else:
+        took = f"at most {elapsedTimeHours:.2f} hours"
+        averageSpeed = "unknown"
+
+    def per_kwh(value):
+        return "unknown" if value is None else f"{value * conversions.get('distance'):.2f}"
+
+    distpkwh = per_kwh(trip.get("per_kwh"))
+    low, high = (per_kwh(value) for value in trip.get("per_kwh_range"))
+
+    elevationChange = "unknown"
+    profile = trip.get("elevation")
+    if profile is not None:
+        elevationUnits = units.get("elevation")
+        elevationChange = (
+            f"{profile.get('net') * conversions.get('elevation'):.0f} {elevationUnits} "
+            f"(climbed {profile.get('climb') * conversions.get('elevation'):.0f} {elevationUnits}, "
+            f"descended {profile.get('descent') * conversions.get('elevation'):.0f} {elevationUnits})"
+        )
 
     _LOGGER.info(
-        f"Trip took {elapsedTimeHours:.2f} hours, {distance:.2f} {_UNITS[_METRIC].get('distance')} using {kwhUsed:.2f} kWh, "
-        f"{distpkwh:.2f} {_UNITS[_METRIC].get('distance')} per kWh, average speed was {averageSpeed:.1f} {_UNITS[_METRIC].get('speed')}, "
-        f"elevation change of {deltaElevation:.0f} {_UNITS[_METRIC].get('elevation')}"
+        f"Trip took {took}, {distance:.2f} {units.get('distance')} using "
+        f"{trip.get('kwh'):.2f} ± {trip.get('kwh_error'):.2f} kWh, {distpkwh} ({low} to {high}) {units.get('distance')} per kWh, "
+        f"average speed was {averageSpeed}, elevation change of {elevationChange}"
+    )
+    _LOGGER.info(
+        f"Trip distance from the {trip.get('distance_source')} data, energy from {trip.get('soc_samples')} charge samples "
+        f"({'least squares fit' if trip.get('soc_method') == 'fit' else 'end points'}), "
+        f"analyzed in {(time.perf_counter() - started) * 1000:.0f} ms"
     )
     _LOGGER.info(f"")
 
 
-def main() -> None:
-    """Set up and start FordPass Connect."""
-
-    global _VEHICLECLIENT, _GEOCLIENT, _ABRPCLIENT
+def process_trip(start, end, samples=None, client=None, timed=True) -> None:
+    """Process the starting and ending status reports for a trip, along with the status reports seen during the trip."""
 
-    logfiles.create_application_log(_LOGGER)
-    _LOGGER.info(f"Ford Connect test utility {version.get_version()}")
+    global _METRIC, _EXTENDED, _CONVERSIONS, _UNITS, _BATTERY, _ELEVATION
 
-    config = read_config()
-    if not config:
-        _LOGGER.error("Error processing YAML configuration - exiting")
+    if samples is not None and len(samples) >= 2:
+        process_trip_samples(samples, client, timed=timed)
         return
 
-    abrp = config.get('abrp')
-    if abrp.get('enable'):
-        _ABRPCLIENT = AbrpClient(abrp.get('api_key'), abrp.get('token'))
+    elapsedTimeHours = (end.modified - start.modified) / 3600
 
-    geocodio = config.get('geocodio')
-    if geocodio.get('enable'):
-        _GEOCLIENT = GeocodioClient(geocodio.get('api_key'))
+    percentUsed = start.soc - end.soc
+    kwhUsed = percentUsed * 0.01 * _BATTERY[_EXTENDED]
 
-    fordconnect = config.get('fordconnect')
-    _VEHICLECLIENT = Vehicle(
-        username=fordconnect.get('username'),
-        password=fordconnect.get('password'),
-        vin=fordconnect.get('vin'),
+    # Must be meters for conversion lookup table
+    dist_km = end.odometer - start.odometer
+    dist_m = dist_km * 1000
+    distance = dist_m * _CONVERSIONS[_METRIC].get("distance")
+
+    distpkwh = 99.999 if kwhUsed <= 0.0 else distance / kwhUsed
+    if timed:
+        took = f"{elapsedTimeHours:.2f} hours"
+        averageSpeed = f"{distance / elapsedTimeHours if elapsedTimeHours > 0 else 0.0:.1f} {_UNITS[_METRIC].get('speed')}"
+    else:
+        took = f"at most {elapsedTimeHours:.2f} hours"
+        averageSpeed = "unknown"
+
+    elevationChange = "unknown"
+    deltaElevation = _ELEVATION.elevation_change(
+        start=(start.latitude, start.longitude),
+        end=(end.latitude, end.longitude),
+    )
+    if deltaElevation is not None:
+        deltaElevation *= _CONVERSIONS[_METRIC].get("elevation")
+        elevationChange = f"{deltaElevation:.0f} {_UNITS[_METRIC].get('elevation')}"
+
+    _LOGGER.info(
+        f"Trip took {took}, {distance:.2f} {_UNITS[_METRIC].get('distance')} using {kwhUsed:.2f} kWh, "
+        f"{distpkwh:.2f} {_UNITS[_METRIC].get('distance')} per kWh, average speed was {averageSpeed}, "
+        f"elevation change of {elevationChange}"
     )
+    _LOGGER.info(f"")
 
-    currentStatus = get_vehicle_status()
-    if _ABRPCLIENT:
-        _ABRPCLIENT.post(currentStatus)
+
+def report_status(state, currentStatus) -> None:
+    """Log the full status of a vehicle when polling starts."""
+
+    _LOGGER.info(f"Status of VIN {state.vin}")
+    publish(Event(STATUS_CHANGED, state.vin, currentStatus.modified, currentStatus))
 
     decode_lastupdate(status=currentStatus)
     decode_odometer(status=currentStatus)
@@ -493,51 +378,207 @@ def main() -> None:
     decode_alarm(status=currentStatus)
     _LOGGER.info(f"Current location '{decode_location(status=currentStatus)}'")
 
-    tripStarted = None
-    tripEnded = None
-    previousStatus = currentStatus
-    try:
-        limit = 4000
-        passes = 0
-        while True:
-            time.sleep(15)
-
-            passes += 1
-            if passes > limit:
-                break
-
-            try:
-                currentStatus = get_vehicle_status()
-            except requests.ConnectionError:
-                continue
-
-            previousModified = last_status_update(previousStatus)
-            currentModified = last_status_update(currentStatus)
-            if currentModified > previousModified:
-                if _ABRPCLIENT:
-                    _ABRPCLIENT.post(currentStatus)
-                diffs = differences(previous=previousStatus, current=currentStatus)
-
-                ignitionStartStates = ["Start", "Run"]
-                ignitionStopStates = ["Off"]
-                if not tripStarted:
-                    if diffs.get("ignitionStatus") in ignitionStartStates:
-                        tripStarted = currentStatus
-                        _LOGGER.info(f"")
-                        _LOGGER.info(f"New trip, departing '{decode_location(status=currentStatus)}'")
-                elif diffs.get("ignitionStatus") in ignitionStopStates:
-                    tripEnded = currentStatus
-
-                if tripStarted and tripEnded:
-                    _LOGGER.info(f"Trip ended, arrived at '{decode_location(status=currentStatus)}'")
-                    process_trip(start=tripStarted, end=tripEnded)
-                    tripStarted = None
-                    tripEnded = None
-
-                previousStatus = currentStatus
 
+class MonitorSink(EventSink):
+    """Class to log trips and charging with their locations, the geocoding and trip analysis run off the poll loop."""
+
+    name = "monitor"
+    types = [TRIP_STARTED, TRIP_ENDED, CHARGING_STARTED]
+
+    def __init__(self, clients=None):
+        """'clients' are the vehicle clients by VIN, used to fetch the journeys of a trip."""
+        self._clients = clients or {}
+
+    def handle(self, event):
+        if event.type == TRIP_STARTED:
+            _LOGGER.info(f"")
+            _LOGGER.info(f"New trip for VIN {event.vin}, departing '{decode_location(status=event.status)}'")
+        elif event.type == TRIP_ENDED:
+            # numpy is only loaded once the first trip ends
+            from tripanalysis import TripSamples
+
+            trip = event.trip
+            _LOGGER.info(f"Trip ended for VIN {event.vin}, arrived at '{decode_location(status=trip.end)}'")
+            if trip.inferred:
+                _LOGGER.info(f"Part of the trip fell between statuses, it was found from the odometer")
+            samples = TripSamples()
+            for point in trip.points:
+                samples.add(point)
+            process_trip(
+                start=trip.start, end=trip.end, samples=samples, client=self._clients.get(event.vin), timed=trip.timed
+            )
+        elif event.type == CHARGING_STARTED:
+            _LOGGER.info(
+                f"Charging started for VIN {event.vin} at {event.status.soc}%, '{decode_location(status=event.status)}'"
+            )
+
+
+def publish(event) -> None:
+    """Publish an event, without an event bus the monitor handles it at once."""
+
+    global _EVENTS
+
+    if _EVENTS:
+        _EVENTS.publish(event)
+    elif event.type in MonitorSink.types:
+        MonitorSink().handle(event)
+
+
+def process_status(state, currentStatus) -> None:
+    """Process a newly polled status report for a vehicle."""
+
+    global _HISTORY
+
+    if _HISTORY:
+        _HISTORY.append(state.vin, currentStatus)
+
+    update_status(state.vin, currentStatus)
+
+    previousStatus = state.previousStatus
+    if previousStatus is None:
+        report_status(state, currentStatus)
+        state.trips.update(currentStatus)
+        state.previousStatus = currentStatus
+        return
+
+    if currentStatus.modified > previousStatus.modified:
+        diffs = differences(previous=previousStatus, current=currentStatus)
+        publish(Event(STATUS_CHANGED, state.vin, currentStatus.modified, currentStatus, changes=diffs))
+
+        ended, started = state.trips.update(currentStatus)
+        for trip in ended:
+            publish(Event(TRIP_ENDED, state.vin, trip.end.modified, currentStatus, previous=trip.start, trip=trip))
+        if started:
+            publish(Event(TRIP_STARTED, state.vin, currentStatus.modified, currentStatus))
+
+        if currentStatus.charging in CHARGING_STATES and previousStatus.charging not in CHARGING_STATES:
+            publish(Event(CHARGING_STARTED, state.vin, currentStatus.modified, currentStatus))
+
+        state.previousStatus = currentStatus
+
+
+def main() -> None:
+    """Set up and start FordPass Connect."""
+
+    global _GEOCLIENT, _EVENTS, _ELEVATION, _HISTORY
+
+    parser = argparse.ArgumentParser(description="Monitor FordPass vehicles")
+    parser.add_argument("--record", metavar="FILE", help="append the FordPass API responses to a recording")
+    parser.add_argument("--replay", metavar="FILE", help="replay a recording instead of calling the FordPass API")
+    parser.add_argument("--speed", type=float, default=0, help="replay this many times faster than real time, 0 for no waiting")
+    args = parser.parse_args()
+
+    logfiles.create_application_log(_LOGGER)
+    if _LOGSTATUS:
+        logfiles.create_untracked_log()
+    _LOGGER.info(f"Ford Connect test utility {version.get_version()}")
+
+    config = read_config()
+    if not config:
+        _LOGGER.error("Error processing YAML configuration - exiting")
+        return
+    configure_api(config.get('api'))
+    configure_sessions(config.get('http'))
+    use_fordpass_sessions()
+    metricsServer = start_metrics_server(config.get('metrics'))
+
+    # a replay never sends old data to ABRP or the other external sinks, or adds it to the status history
+    _EVENTS = create_event_bus(config.get('events'), external=not args.replay)
+    abrp = config.get('abrp')
+    if abrp.get('enable') and not args.replay:
+        _EVENTS.subscribe(
+            AbrpSink(
+                AbrpSender(
+                    AbrpClient(abrp.get('api_key'), abrp.get('token')),
+                    max_pending=abrp.get('queue_size'),
+                    retries=abrp.get('retries'),
+                )
+            )
+        )
+
+    geocodio = config.get('geocodio')
+    if geocodio.get('enable'):
+        _GEOCLIENT = create_geocoder(geocodio)
+
+    _ELEVATION = create_elevation_service(config.get('elevation'))
+
+    history = config.get('history')
+    if history.get('enable'):
+        _HISTORY = StatusStore(
+            ":memory:" if args.replay else history.get('store_file'),
+            batch_size=history.get('batch_size'),
+            flush_interval=history.get('flush_interval'),
+        )
+
+    fordconnect = config.get('fordconnect')
+    recorder = Recorder(args.record) if args.record else None
+    if args.replay:
+        recording = Recording(args.replay)
+        clock = VirtualClock(start=recording.start, speed=args.speed)
+        _LOGGER.info(
+            f"Replaying {recording.count} API responses for {', '.join(recording.vins)} covering "
+            f"{(recording.end - recording.start) / 3600:.1f} hours"
+        )
+        vehicles = [VehicleState(vin=vin, client=ReplayVehicle(recording, vin, clock)) for vin in recording.vins]
+    else:
+        clock = None
+        vehicles = [
+            VehicleState(
+                vin=vin,
+                client=CachedVehicle(
+                    username=fordconnect.get('username'),
+                    password=fordconnect.get('password'),
+                    vin=vin,
+                    cache_file=fordconnect.get('token_cache'),
+                ),
+            )
+            for vin in fordconnect.get('vins')
+        ]
+    if recorder:
+        for state in vehicles:
+            state.client = recorder.wrap(state.client, state.vin)
+    _EVENTS.subscribe(MonitorSink({state.vin: state.client for state in vehicles}))
+
+    poller = config.get('poller')
+    scheduler = PollScheduler(
+        interval=poller.get('interval'),
+        charging_interval=poller.get('charging_interval'),
+        idle_factor=poller.get('idle_factor'),
+        max_interval=poller.get('max_interval'),
+        sleep_interval=poller.get('sleep_interval'),
+    )
+    vehiclePoller = VehiclePoller(
+        vehicles=vehicles,
+        fetch=lambda state: get_vehicle_status(state.client),
+        process=process_status,
+        schedule=scheduler.schedule,
+        max_workers=poller.get('max_workers'),
+        clock=clock.monotonic if clock else time.monotonic,
+        sleep=clock.sleep if clock else time.sleep,
+    )
+    started = time.perf_counter()
+    try:
+        vehiclePoller.run(until=(lambda: clock.time() > recording.end) if args.replay else None)
     except Exception as e:
         _LOGGER.error(f"Unexpected exception: {e}")
+    finally:
+        vehiclePoller.close()
+        # a replay waits for every trip to be analyzed
+        _EVENTS.close(timeout=None if args.replay else 5.0)
+        _EVENTS.log_metrics()
+        if args.replay:
+            _LOGGER.info(
+                f"Replayed {(clock.time() - recording.start) / 3600:.1f} hours in {time.perf_counter() - started:.1f} s"
+            )
+        if recorder:
+            recorder.close()
+        if _GEOCLIENT:
+            _GEOCLIENT.log_stats()
+        log_api_stats()
+        if _HISTORY:
+            _HISTORY.close()
+        if metricsServer:
+            metricsServer.close()
 
 
 if __name__ == "__main__":
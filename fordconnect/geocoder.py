@@ -0,0 +1,60 @@
+"""Reverse geocoding with a persistent cache shared by the fordconnect tools."""
+
+import logging
+import time
+
+from gridcache import GridCache
+from metrics import GEOCODE_TIME
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+
+class CachedGeocoder:
+    """Class to add a persistent location cache to the Geocodio reverse geocoding client."""
+
+    def __init__(self, client, cache):
+        """Wrap a GeocodioClient with a GridCache."""
+        self._client = client
+        self._cache = cache
+
+    def reverse(self, location):
+        """Reverse geocode a (latitude, longitude) pair, only the address components are kept."""
+        started = time.perf_counter()
+        latitude, longitude = location
+        addressComponents = self._cache.get(latitude, longitude)
+        source = "cache"
+        if addressComponents is None:
+            locationInfo = self._client.reverse((latitude, longitude))
+            addressComponents = locationInfo["results"][0]["address_components"]
+            self._cache.put(latitude, longitude, addressComponents)
+            source = "geocodio"
+        GEOCODE_TIME.observe(time.perf_counter() - started, source)
+        return {"results": [{"address_components": addressComponents}]}
+
+    def stats(self):
+        """Hit and miss counters of the location cache."""
+        return self._cache.stats()
+
+    def log_stats(self):
+        """Log the hit rate of the location cache."""
+        stats = self.stats()
+        _LOGGER.info(
+            f"Geocode cache: {stats.get('hits')} hits, {stats.get('misses')} misses, "
+            f"hit rate {stats.get('hit_rate') * 100:.1f}%, {stats.get('entries')} locations cached"
+        )
+
+
+def create_geocoder(options):
+    """Create the cached reverse geocoder from the 'geocodio' options."""
+    # only imported when geocoding is enabled
+    from geocodio import GeocodioClient
+
+    cache = GridCache(
+        filename=options.get('cache_file'),
+        table="reverse_geocode",
+        precision=options.get('cache_precision'),
+        ttl=options.get('cache_ttl_days') * 86400,
+        max_entries=options.get('cache_max_entries'),
+    )
+    return CachedGeocoder(GeocodioClient(options.get('api_key')), cache)
@@ -0,0 +1,129 @@
+"""Persistent cache of values keyed on a quantized latitude/longitude grid."""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+
+class GridCache:
+    """Class to encapsulate a SQLite cache with TTL and LRU eviction keyed on lat/lon grid cells."""
+
+    # inserts between purges of the expired cells, the entry count is read again then since the cache file can
+    # be shared with another tool
+    _PURGE_INTERVAL = 100
+
+    def __init__(self, filename, table, precision=4, ttl=None, max_entries=None):
+        """Open (or create) the cache, 'precision' is the number of decimal places kept in the key."""
+        self._table = table
+        self._scale = 10 ** precision
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+
+        if filename != ":memory:":
+            filename = os.path.expanduser(filename)
+            directory = os.path.dirname(filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(filename, timeout=5.0, check_same_thread=False)
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            f"(lat INTEGER, lon INTEGER, value TEXT, created REAL, used REAL, PRIMARY KEY (lat, lon))"
+        )
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_used ON {table} (used)")
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_created ON {table} (created)")
+        self._db.commit()
+        self._entries = self._count()
+
+    def cell(self, lat, lon):
+        """Grid cell containing a location."""
+        return (int(round(float(lat) * self._scale)), int(round(float(lon) * self._scale)))
+
+    def get(self, lat, lon):
+        """Cached value for a location or None."""
+        cell = self.cell(lat, lon)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT value, created FROM {self._table} WHERE lat = ? AND lon = ?", cell
+            ).fetchone()
+            if row is None or (self._ttl and now - row[1] > self._ttl):
+                self.misses += 1
+                return None
+            self._db.execute(f"UPDATE {self._table} SET used = ? WHERE lat = ? AND lon = ?", (now,) + cell)
+            self._db.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, lat, lon, value):
+        """Store the value for a location, evicting the least recently used cells when full."""
+        cell = self.cell(lat, lon)
+        now = time.time()
+        value = json.dumps(value)
+        with self._lock:
+            inserted = self._db.execute(
+                f"INSERT OR IGNORE INTO {self._table} (lat, lon, value, created, used) VALUES (?, ?, ?, ?, ?)",
+                cell + (value, now, now),
+            ).rowcount
+            if not inserted:
+                self._db.execute(
+                    f"UPDATE {self._table} SET value = ?, created = ?, used = ? WHERE lat = ? AND lon = ?",
+                    (value, now, now) + cell,
+                )
+            self._entries += inserted
+            self._inserts += 1
+            if self._inserts % self._PURGE_INTERVAL == 0:
+                self._purge()
+            if self._max_entries and self._entries > self._max_entries:
+                self._evict()
+            self._db.commit()
+
+    def _count(self):
+        return self._db.execute(f"SELECT COUNT(*) FROM {self._table}").fetchone()[0]
+
+    def _expire(self):
+        """Remove the expired cells."""
+        if self._ttl:
+            self._entries -= self._db.execute(
+                f"DELETE FROM {self._table} WHERE created < ?", (time.time() - self._ttl,)
+            ).rowcount
+
+    def _purge(self):
+        """Remove the expired cells and count the entries again."""
+        self._expire()
+        self._entries = self._count()
+
+    def _evict(self):
+        """Remove expired cells and then the least recently used ones until the cache fits."""
+        self._expire()
+        excess = self._entries - self._max_entries
+        if excess > 0:
+            self._entries -= self._db.execute(
+                f"DELETE FROM {self._table} WHERE rowid IN "
+                f"(SELECT rowid FROM {self._table} ORDER BY used ASC LIMIT ?)",
+                (excess,),
+            ).rowcount
+
+    def stats(self):
+        """Hit and miss counters for the cache."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._entries,
+        }
+
+    def close(self):
+        """Close the cache database."""
+        with self._lock:
+            self._db.close()
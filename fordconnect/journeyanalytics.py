@@ -0,0 +1,216 @@
+"""Vectorized analytics over the location logs of FordPass journeys"""
+
+import logging
+import sys
+
+from itertools import chain
+from operator import itemgetter
+
+import numpy as np
+
+import logfiles
+from readconfig import read_config
+from journeystore import JourneyStore
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+_EARTH_RADIUS = 6371008.8  # meters
+
+# journeys use meters per second and meters
+_STOP_SPEED = 0.5
+_MIN_STOP = 30
+_SPEED_BINS = np.arange(0.0, 42.0, 2.0)
+
+_FIELDS = itemgetter("latitude", "longitude", "timestamp", "speed")
+
+
+class JourneyLocations:
+    """Class to hold the locations of many journeys in contiguous arrays, journey i is [offsets[i], offsets[i + 1])."""
+
+    def __init__(self, journeyIDs, offsets, latitude, longitude, timestamp, speed):
+        """Wrap existing arrays."""
+        self.journeyIDs = journeyIDs
+        self.offsets = offsets
+        self.latitude = latitude
+        self.longitude = longitude
+        self.timestamp = timestamp
+        self.speed = speed
+
+    @classmethod
+    def from_journeys(cls, journeys):
+        """Load the 'locations' of journeys or journey details into contiguous float arrays."""
+        journeyIDs = []
+        locationLists = []
+        for journey in journeys:
+            value = journey.get("value", journey)
+            journeyIDs.append(journey.get("journeyID", value.get("journeyID")))
+            locationLists.append(value.get("locations") or [])
+        counts = [len(locations) for locations in locationLists]
+
+        # one flat pass over every location is much faster than building a list of rows
+        fields = chain.from_iterable(map(_FIELDS, chain.from_iterable(locationLists)))
+        data = np.fromiter(fields, dtype=np.float64, count=4 * sum(counts)).reshape(-1, 4)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(
+            journeyIDs=journeyIDs,
+            offsets=offsets,
+            latitude=np.ascontiguousarray(data[:, 0]),
+            longitude=np.ascontiguousarray(data[:, 1]),
+            timestamp=np.ascontiguousarray(data[:, 2]),
+            speed=np.ascontiguousarray(data[:, 3]),
+        )
+
+    def __len__(self):
+        return len(self.journeyIDs)
+
+    def journey_index(self):
+        """Journey number of every location."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def segments(self):
+        """Index of the first location of every segment joining two locations of the same journey."""
+        first = np.arange(len(self.timestamp) - 1, dtype=np.int64)
+        # drop the segments joining the last location of a journey to the first of the next
+        last = self.offsets[1:-1] - 1
+        keep = np.ones(len(first), dtype=bool)
+        keep[last[(last >= 0) & (last < len(first))]] = False
+        return first[keep]
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great circle distance in meters between arrays of locations in degrees."""
+    lat1, lon1, lat2, lon2 = (np.radians(a) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) * 0.5) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) * 0.5) ** 2
+    return 2.0 * _EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+def _per_journey(locations, segments, values):
+    """Sum segment values by journey."""
+    journey = locations.journey_index()[segments]
+    return np.bincount(journey, weights=values, minlength=len(locations)).astype(np.float64)
+
+
+def path_distances(locations):
+    """Distance in meters along the logged path of every journey."""
+    s = locations.segments()
+    d = haversine(locations.latitude[s], locations.longitude[s], locations.latitude[s + 1], locations.longitude[s + 1])
+    return _per_journey(locations, s, d)
+
+
+def speed_histogram(locations, bins=_SPEED_BINS):
+    """Histogram of the logged speeds in meters per second, returns the counts and bin edges."""
+    return np.histogram(locations.speed, bins=bins)
+
+
+def moving_idle_times(locations, stopSpeed=_STOP_SPEED):
+    """Seconds moving and idle in every journey, a segment is idle when both ends are at or below 'stopSpeed'."""
+    s = locations.segments()
+    dt = locations.timestamp[s + 1] - locations.timestamp[s]
+    idle = (locations.speed[s] <= stopSpeed) & (locations.speed[s + 1] <= stopSpeed)
+    return _per_journey(locations, s, np.where(idle, 0.0, dt)), _per_journey(locations, s, np.where(idle, dt, 0.0))
+
+
+def detect_stops(locations, stopSpeed=_STOP_SPEED, minDuration=_MIN_STOP):
+    """Stops of at least 'minDuration' seconds, returns the journey number, start and end time of each stop."""
+    if len(locations.speed) == 0:
+        empty = np.zeros(0)
+        return empty.astype(np.int64), empty, empty
+
+    stopped = locations.speed <= stopSpeed
+    firsts = np.zeros(len(stopped), dtype=bool)
+    lasts = np.zeros(len(stopped), dtype=bool)
+    starts = locations.offsets[:-1][np.diff(locations.offsets) > 0]
+    ends = locations.offsets[1:][np.diff(locations.offsets) > 0] - 1
+    firsts[starts] = True
+    lasts[ends] = True
+
+    # runs of stopped locations that do not cross a journey boundary
+    previous = np.concatenate(([False], stopped[:-1])) & ~firsts
+    following = np.concatenate((stopped[1:], [False])) & ~lasts
+    runStarts = np.flatnonzero(stopped & ~previous)
+    runEnds = np.flatnonzero(stopped & ~following)
+    duration = locations.timestamp[runEnds] - locations.timestamp[runStarts]
+    long = duration >= minDuration
+    journey = locations.journey_index()[runStarts[long]]
+    return journey, locations.timestamp[runStarts[long]], locations.timestamp[runEnds[long]]
+
+
+def acceleration_stats(locations):
+    """Maximum acceleration, maximum braking and mean absolute acceleration in m/s^2 of every journey."""
+    s = locations.segments()
+    dt = locations.timestamp[s + 1] - locations.timestamp[s]
+    valid = dt > 0
+    s = s[valid]
+    accel = (locations.speed[s + 1] - locations.speed[s]) / dt[valid]
+    journey = locations.journey_index()[s]
+
+    count = len(locations)
+    maxAccel = np.zeros(count)
+    maxBraking = np.zeros(count)
+    np.maximum.at(maxAccel, journey, accel)
+    np.maximum.at(maxBraking, journey, -accel)
+    samples = np.bincount(journey, minlength=count)
+    meanAbs = np.bincount(journey, weights=np.abs(accel), minlength=count) / np.maximum(samples, 1)
+    return maxAccel, maxBraking, meanAbs
+
+
+def analyze(locations, stopSpeed=_STOP_SPEED, minStop=_MIN_STOP):
+    """Per journey distance, moving and idle time, stop count and acceleration statistics."""
+    moving, idle = moving_idle_times(locations, stopSpeed)
+    stopJourneys, _, _ = detect_stops(locations, stopSpeed, minStop)
+    maxAccel, maxBraking, meanAbs = acceleration_stats(locations)
+    return {
+        "journeyID": locations.journeyIDs,
+        "distance": path_distances(locations),
+        "moving": moving,
+        "idle": idle,
+        "stops": np.bincount(stopJourneys, minlength=len(locations)),
+        "max_accel": maxAccel,
+        "max_braking": maxBraking,
+        "mean_abs_accel": meanAbs,
+    }
+
+
+def main():
+    """Summarize the journeys in the journey store."""
+
+    logfiles.create_application_log(_LOGGER)
+
+    config = read_config()
+    if not config:
+        _LOGGER.error("Error processing YAML configuration - exiting")
+        return
+
+    store = JourneyStore(config.get('journeys').get('store_file'))
+    vin = config.get('fordconnect').get('vin')
+    journeys = [store.details(journey.get("journeyID")) or journey for journey in store.journeys(vin)]
+    store.close()
+    if not journeys:
+        _LOGGER.info(f"No journeys stored, run 'journeys.py --sync' first")
+        return
+
+    locations = JourneyLocations.from_journeys(journeys)
+    results = analyze(locations)
+    moving = results.get("moving").sum()
+    idle = results.get("idle").sum()
+    _LOGGER.info(
+        f"{len(locations)} journeys, {len(locations.speed)} locations, {results.get('distance').sum() / 1000:.1f} km, "
+        f"{moving / 3600:.1f} hours moving and {idle / 3600:.1f} hours idle, {results.get('stops').sum()} stops"
+    )
+    counts, edges = speed_histogram(locations)
+    for count, low, high in zip(counts, edges, edges[1:]):
+        _LOGGER.info(f"Speed {low * 3.6:5.1f} - {high * 3.6:5.1f} kph: {count}")
+    _LOGGER.info(
+        f"Hardest acceleration {results.get('max_accel').max():.2f} m/s^2, "
+        f"hardest braking {results.get('max_braking').max():.2f} m/s^2"
+    )
+
+
+if __name__ == "__main__":
+    # make sure we can run this
+    if sys.version_info[0] >= 3 and sys.version_info[1] >= 9:
+        main()
+    else:
+        print("python 3.9 or newer required")
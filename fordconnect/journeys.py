@@ -6,6 +6,7 @@
 # GET https://api.mps.ford.com/api/journey-info/v1/journey/details/<journeyID>?clientVersion=iOS3.29.0&vin=<vin>
 
 
+import argparse
 import logging
 import sys
 import requests
@@ -14,17 +15,24 @@ import random
 import version
 import logfiles
 from readconfig import read_config
+from apicall import api_call, configure_api, log_api_stats
 
 from datetime import timedelta
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
-from fordpass import Vehicle
-from geocodio import GeocodioClient
-from usgs_elevation import usgs_alt
+from tokencache import CachedVehicle, use_fordpass_sessions
+from geocoder import create_geocoder
+from journeystore import JourneyStore, sync_journeys
+from usgs_elevation import create_elevation_service
+from sessions import configure_sessions
 
 
 _VEHICLECLIENT = None
 _GEOCLIENT = None
+_ELEVATION = None
+_STORE = None
+_WORKERS = 8
 
 _LOGGER = logging.getLogger("fordconnect")
 
@@ -46,46 +54,38 @@ def get_journeys(start, end):
 
     global _VEHICLECLIENT
 
-    status = None
-    tries = 3
-    while tries > 0:
-        try:
-            status = _VEHICLECLIENT.journeys(start=start, end=end)
-            break
-        except requests.ConnectionError:
-            tries -= 1
-            # _LOGGER.info(f"request.get() timed out, {tries} remaining")
-            if tries == 0:
-                _LOGGER.error(f"FordPass Connect API unavailable")
-                raise
-            continue
-        except Exception as e:
-            _LOGGER.error(f"Unexpected exception: {e}")
-            break
-    return status
+    try:
+        return api_call("journeys", _VEHICLECLIENT.journeys, start=start, end=end)
+    except requests.ConnectionError:
+        raise
+    except Exception as e:
+        _LOGGER.error(f"Unexpected exception: {e}")
+        return None
 
 
 def get_journey_details(id):
+    """Journey details from the store, fetched and stored if not seen before"""
+    global _STORE
+
+    details = _STORE.details(id) if _STORE else None
+    if details is None:
+        details = fetch_journey_details(id=id)
+        if details and _STORE:
+            _STORE.add_details(id, details)
+    return details
+
+
+def fetch_journey_details(id):
 
     global _VEHICLECLIENT
 
-    status = None
-    tries = 3
-    while tries > 0:
-        try:
-            status = _VEHICLECLIENT.journey_details(id=id)
-            break
-        except requests.ConnectionError:
-            tries -= 1
-            # _LOGGER.info(f"request.get() timed out, {tries} remaining")
-            if tries == 0:
-                _LOGGER.error(f"FordPass Connect API unavailable")
-                raise
-            continue
-        except Exception as e:
-            _LOGGER.error(f"Unexpected exception: {e}")
-            break
-    return status
+    try:
+        return api_call("journey_details", _VEHICLECLIENT.journey_details, id=id)
+    except requests.ConnectionError:
+        raise
+    except Exception as e:
+        _LOGGER.error(f"Unexpected exception: {e}")
+        return None
 
 
 def get_street_town(location):
@@ -93,13 +93,86 @@ def get_street_town(location):
     return f"'{components.get('formatted_street', '???')}, {components.get('city', '???')}'"
 
 
+def fetch_journey(journey, detailed=False, showReverseAddress=False, showElevation=False):
+    """Fetch the details, elevation change and addresses needed to display a journey, safe to run on a worker thread"""
+    global _GEOCLIENT, _ELEVATION
+
+    fetched = {"details": None, "deltaElevation": 0, "addresses": None}
+    source = journey
+    if detailed:
+        fetched["details"] = get_journey_details(id=journey.get("journeyID"))
+        if fetched["details"]:
+            source = fetched["details"].get("value")
+
+    start = source.get("start")
+    end = source.get("end")
+    if showElevation:
+        fetched["deltaElevation"] = _ELEVATION.elevation_change(
+            start=(start.get("latitude"), start.get("longitude")), end=(end.get("latitude"), end.get("longitude"))
+        )
+    if _GEOCLIENT and showReverseAddress:
+        startingLocationInfo = _GEOCLIENT.reverse((start.get("latitude"), start.get("longitude")))
+        endingLocationInfo = _GEOCLIENT.reverse((end.get("latitude"), end.get("longitude")))
+        fetched["addresses"] = (get_street_town(startingLocationInfo), get_street_town(endingLocationInfo))
+    return fetched
+
+
+def fetch_journey_or_unavailable(journey, **options):
+    """Fetch a journey, one that cannot be fetched is marked unavailable instead of failing the whole list"""
+    try:
+        return fetch_journey(journey, **options)
+    except Exception as e:
+        _LOGGER.warning(f"Unable to fetch journey {journey.get('journeyID')}: {e}")
+        return {"details": None, "deltaElevation": None, "addresses": None, "unavailable": True}
+
+
+def prefetch_journeys(journeys, detailed=False, showReverseAddress=False, showElevation=False, workers=None):
+    """Fetch everything needed to display a list of journeys on a bounded worker pool, results are in journey order"""
+    global _WORKERS
+
+    with ThreadPoolExecutor(max_workers=workers or _WORKERS, thread_name_prefix="journeys") as executor:
+        return list(
+            executor.map(
+                lambda journey: fetch_journey_or_unavailable(
+                    journey, detailed=detailed, showReverseAddress=showReverseAddress, showElevation=showElevation
+                ),
+                journeys,
+            )
+        )
+
+
+def describe_route(start, end, fetched):
+    global _MILES, _UNITS, _CONVERSIONS
+
+    deltaElevation = fetched.get("deltaElevation")
+    elevationChange = "unknown"
+    if deltaElevation is not None:
+        elevationChange = f"{_CONVERSIONS[_MILES].get('elevation')*deltaElevation:.0f} {_UNITS[_MILES].get('elevation')}"
+
+    addresses = fetched.get("addresses")
+    if addresses:
+        route = f"From {addresses[0]} to {addresses[1]}"
+    else:
+        route = (
+            f"From ({start.get('latitude'):.03f}, {start.get('longitude'):.03f}) to "
+            f"({end.get('latitude'):.03f}, {end.get('longitude'):.03f})"
+        )
+    return elevationChange, route
+
+
 def display_detailed_journey(
-    journey, showReverseAddress=False, showElevation=False, showLocations=False, showEvents=False
+    journey, showReverseAddress=False, showElevation=False, showLocations=False, showEvents=False, fetched=None
 ):
-    global _GEOCLIENT, _MILES, _UNITS, _CONVERSIONS
+    global _MILES, _UNITS, _CONVERSIONS
 
-    journeyID = journey.get("journeyID")
-    details = get_journey_details(id=journeyID)
+    if fetched is None:
+        fetched = fetch_journey(
+            journey, detailed=True, showReverseAddress=showReverseAddress, showElevation=showElevation
+        )
+    details = fetched.get("details")
+    if not details:
+        _LOGGER.info(f"Details of journey {journey.get('journeyID')} are unavailable")
+        return
 
     summary = details.get("value").get("summary")
     distance = summary.get("distance")
@@ -112,12 +185,7 @@ def display_detailed_journey(
     minutes = (duration % 3600) // 60
     seconds = duration % 60
     journeyDate = datetime.fromtimestamp(start.get("timestamp"))
-
-    deltaElevation = 0
-    if showElevation:
-        startingElevation = usgs_alt(lat=start.get("latitude"), lon=start.get("longitude"))
-        endingElevation = usgs_alt(lat=end.get("latitude"), lon=end.get("longitude"))
-        deltaElevation = endingElevation - startingElevation
+    elevationChange, route = describe_route(start, end, fetched)
 
     _LOGGER.info(
         f"Detailed journey {journey.get('journeyID')} on {journeyDate.strftime('%Y-%m-%d')} at {journeyDate.strftime('%H:%M')}"
@@ -126,18 +194,9 @@ def display_detailed_journey(
         f"Duration: {hours:.0f} hour(s), {minutes:.0f} minute(s) and {seconds:.0f} second(s), "
         f"Distance: {_CONVERSIONS[_MILES].get('distance')*distance:.2f} {_UNITS[_MILES].get('distance')}, "
         f"Average Speed: {_CONVERSIONS[_MILES].get('speed')*avgSpeed:.2f} {_UNITS[_MILES].get('speed')}, "
-        f"Elevation change: {_CONVERSIONS[_MILES].get('elevation')*deltaElevation:.0f} {_UNITS[_MILES].get('elevation')}"
+        f"Elevation change: {elevationChange}"
     )
-
-    if _GEOCLIENT and showReverseAddress:
-        startingLocationInfo = _GEOCLIENT.reverse((start.get("latitude"), start.get("longitude")))
-        endingLocationInfo = _GEOCLIENT.reverse((end.get("latitude"), end.get("longitude")))
-        _LOGGER.info(f"From {get_street_town(startingLocationInfo)} to {get_street_town(endingLocationInfo)}")
-    else:
-        _LOGGER.info(
-            f"From ({start.get('latitude'):.03f}, {start.get('longitude'):.03f}) to "
-            f"({end.get('latitude'):.03f}, {end.get('longitude'):.03f})"
-        )
+    _LOGGER.info(route)
 
     if showLocations:
         locations = details.get("value").get("locations")
@@ -162,8 +221,11 @@ def display_detailed_journey(
                 )
 
 
-def display_journey(journey, showReverseAddress=False, showElevation=False, showLocations=False):
-    global _GEOCLIENT, _MILES, _UNITS, _CONVERSIONS
+def display_journey(journey, showReverseAddress=False, showElevation=False, showLocations=False, fetched=None):
+    global _MILES, _UNITS, _CONVERSIONS
+
+    if fetched is None:
+        fetched = fetch_journey(journey, showReverseAddress=showReverseAddress, showElevation=showElevation)
 
     start = journey.get("start")
     end = journey.get("end")
@@ -172,35 +234,22 @@ def display_journey(journey, showReverseAddress=False, showElevation=False, show
     minutes = (duration % 3600) // 60
     seconds = duration % 60
     journeyDate = datetime.fromtimestamp(start.get("timestamp"))
-
-    deltaElevation = 0
-    if showElevation:
-        startingElevation = usgs_alt(lat=start.get("latitude"), lon=start.get("longitude"))
-        endingElevation = usgs_alt(lat=end.get("latitude"), lon=end.get("longitude"))
-        deltaElevation = endingElevation - startingElevation
+    elevationChange, route = describe_route(start, end, fetched)
 
     distance = journey.get("distance")
     avgSpeed = journey.get("avgSpeed")
 
     _LOGGER.info(
         f"Journey {journey.get('journeyID')} on {journeyDate.strftime('%Y-%m-%d')} at {journeyDate.strftime('%H:%M')}"
+        f"{' (elevation and addresses unavailable)' if fetched.get('unavailable') else ''}"
     )
     _LOGGER.info(
         f"Duration: {hours:.0f} hour(s), {minutes:.0f} minute(s) and {seconds:.0f} second(s), "
         f"Distance: {_CONVERSIONS[_MILES].get('distance')*distance:.2f} {_UNITS[_MILES].get('distance')}, "
         f"Average Speed: {_CONVERSIONS[_MILES].get('speed')*avgSpeed:.2f} {_UNITS[_MILES].get('speed')}, "
-        f"Elevation change: {_CONVERSIONS[_MILES].get('elevation')*deltaElevation:.0f} {_UNITS[_MILES].get('elevation')}"
+        f"Elevation change: {elevationChange}"
     )
-
-    if _GEOCLIENT and showReverseAddress:
-        startingLocationInfo = _GEOCLIENT.reverse((start.get("latitude"), start.get("longitude")))
-        endingLocationInfo = _GEOCLIENT.reverse((end.get("latitude"), end.get("longitude")))
-        _LOGGER.info(f"From {get_street_town(startingLocationInfo)} to {get_street_town(endingLocationInfo)}")
-    else:
-        _LOGGER.info(
-            f"From ({start.get('latitude'):.03f}, {start.get('longitude'):.03f}) to "
-            f"({end.get('latitude'):.03f}, {end.get('longitude'):.03f})"
-        )
+    _LOGGER.info(route)
 
     if showLocations:
         locations = journey.get("locations")
@@ -231,23 +280,32 @@ def display_journeys(
                     newestJourney = journey
             else:
                 newestJourney = journey
+        journeys = [newestJourney]
         _LOGGER.info(f"Most recent logged journey")
-        display_journey(newestJourney, showElevation, showReverseAddress, showLocations)
+    else:
+        _LOGGER.info(f"List of all journeys")
+
+    # one pass fetches everything both views need, the elevation and addresses come from the details if fetched
+    options = {"showReverseAddress": showReverseAddress, "showElevation": showElevation}
+    fetched = prefetch_journeys(journeys, detailed=showDetailedJourney, **options)
+    for journey, journeyFetched in zip(journeys, fetched):
+        display_journey(journey, showLocations=showLocations, fetched=journeyFetched, **options)
         if showDetailedJourney:
             _LOGGER.info(f"")
-            display_detailed_journey(newestJourney, showElevation, showReverseAddress, showLocations, showEvents)
-        return
-
-    _LOGGER.info(f"List of all journeys")
-    for journey in journeys:
-        display_journey(journey, showElevation=False, showReverseAddress=False, showLocations=False)
+            display_detailed_journey(
+                journey, showLocations=showLocations, showEvents=showEvents, fetched=journeyFetched, **options
+            )
         _LOGGER.info(f"")
 
 
 def main():
     """Set up and start FordPass Connect."""
 
-    global _VEHICLECLIENT, _GEOCLIENT, _MILES
+    global _VEHICLECLIENT, _GEOCLIENT, _ELEVATION, _STORE, _WORKERS, _MILES
+
+    parser = argparse.ArgumentParser(description="Display FordPass journeys")
+    parser.add_argument("--sync", action="store_true", help="only sync the journey store, do not display journeys")
+    args = parser.parse_args()
 
     logfiles.create_application_log(_LOGGER)
     _LOGGER.info(f"Ford Connect journey utility {version.get_version()}")
@@ -256,20 +314,49 @@ def main():
     if not config:
         _LOGGER.error("Error processing YAML configuration - exiting")
         return
+    configure_api(config.get('api'))
+    configure_sessions(config.get('http'))
+    use_fordpass_sessions()
 
     fordconnect = config.get('fordconnect')
-    _VEHICLECLIENT = Vehicle(
+    _VEHICLECLIENT = CachedVehicle(
         username=fordconnect.get('username'),
         password=fordconnect.get('password'),
         vin=fordconnect.get('vin'),
+        cache_file=fordconnect.get('token_cache'),
+    )
+    journeyOptions = config.get('journeys')
+    _WORKERS = journeyOptions.get('workers')
+    _STORE = JourneyStore(journeyOptions.get('store_file'))
+    sync_journeys(
+        _STORE,
+        vin=fordconnect.get('vin'),
+        getJourneys=get_journeys,
+        getJourneyDetails=fetch_journey_details,
+        historyDays=journeyOptions.get('history_days'),
+        workers=_WORKERS,
+        detailAttempts=journeyOptions.get('detail_attempts'),
+        detailRetryInterval=journeyOptions.get('detail_retry_interval'),
     )
+    if args.sync:
+        log_api_stats()
+        _STORE.close()
+        return
+
     geocodio = config.get('geocodio')
     if geocodio.get('enable'):
-        _GEOCLIENT = GeocodioClient(geocodio.get('api_key'))
+        _GEOCLIENT = create_geocoder(geocodio)
+    _ELEVATION = create_elevation_service(config.get('elevation'))
 
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=2)
-    journeys = get_journeys(start=int(start_date.timestamp()), end=int(end_date.timestamp())).get("value")
+    journeys = _STORE.journeys(
+        vin=fordconnect.get('vin'), start=int(start_date.timestamp()), end=int(end_date.timestamp())
+    )
+    if not journeys:
+        _LOGGER.info(f"No journeys in the time period")
+        return
+
     display_journeys(
         journeys=journeys,
         showMostRecentJourney=True,
@@ -284,6 +371,11 @@ def main():
     _LOGGER.info(f"Display a random journey in the time period")
     display_journey(journey=journeys[random.randint(0, len(journeys) - 1)])
 
+    if _GEOCLIENT:
+        _GEOCLIENT.log_stats()
+    log_api_stats()
+    _STORE.close()
+
 
 if __name__ == "__main__":
     # make sure we can run this
@@ -0,0 +1,187 @@
+"""Local SQLite store of FordPass journeys and journey details."""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+# journeys still in progress at the end of a sync are picked up by overlapping the next one
+_SYNC_OVERLAP = 6 * 3600
+
+# details that could not be fetched are tried again on a later sync, at most once per interval and only so often
+_DETAIL_ATTEMPTS = 5
+_DETAIL_RETRY_INTERVAL = 3600
+
+
+class JourneyStore:
+    """Class to encapsulate the journey store, journeys and details are keyed by journeyID."""
+
+    def __init__(self, filename):
+        """Open (or create) the journey store."""
+        if filename != ":memory:":
+            filename = os.path.expanduser(filename)
+            directory = os.path.dirname(filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename, timeout=5.0, check_same_thread=False)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS journeys
+                (journeyID TEXT PRIMARY KEY, vin TEXT, start INTEGER, end INTEGER, journey TEXT);
+            CREATE INDEX IF NOT EXISTS journeys_start ON journeys (vin, start);
+            CREATE TABLE IF NOT EXISTS details (journeyID TEXT PRIMARY KEY, details TEXT);
+            CREATE TABLE IF NOT EXISTS synced (vin TEXT PRIMARY KEY, timestamp INTEGER);
+            CREATE TABLE IF NOT EXISTS failed (journeyID TEXT PRIMARY KEY, attempts INTEGER, timestamp INTEGER);
+            """
+        )
+        self._db.commit()
+
+    def add_journeys(self, vin, journeys):
+        """Add or update journeys, returns the number of journeys not seen before."""
+        with self._lock:
+            before = self._db.execute("SELECT COUNT(*) FROM journeys").fetchone()[0]
+            self._db.executemany(
+                "INSERT OR REPLACE INTO journeys (journeyID, vin, start, end, journey) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        journey.get("journeyID"),
+                        vin,
+                        journey.get("start").get("timestamp"),
+                        journey.get("end").get("timestamp"),
+                        json.dumps(journey),
+                    )
+                    for journey in journeys
+                ],
+            )
+            self._db.commit()
+            return self._db.execute("SELECT COUNT(*) FROM journeys").fetchone()[0] - before
+
+    def journeys(self, vin, start=None, end=None):
+        """Stored journeys of a vehicle starting in [start, end), oldest first."""
+        start = 0 if start is None else start
+        end = 2 ** 62 if end is None else end
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT journey FROM journeys WHERE vin = ? AND start >= ? AND start < ? ORDER BY start",
+                (vin, start, end),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def details(self, journeyID):
+        """Stored details of a journey or None."""
+        with self._lock:
+            row = self._db.execute("SELECT details FROM details WHERE journeyID = ?", (journeyID,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add_details(self, journeyID, details):
+        """Store the details of a journey, they never change once the journey has ended."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO details (journeyID, details) VALUES (?, ?)", (journeyID, json.dumps(details))
+            )
+            self._db.execute("DELETE FROM failed WHERE journeyID = ?", (journeyID,))
+            self._db.commit()
+
+    def add_failures(self, journeyIDs, timestamp):
+        """Record a failed attempt to fetch the details of each journey."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO failed (journeyID, attempts, timestamp) VALUES (?, 1, ?) "
+                "ON CONFLICT (journeyID) DO UPDATE SET attempts = attempts + 1, timestamp = excluded.timestamp",
+                [(journeyID, timestamp) for journeyID in journeyIDs],
+            )
+            self._db.commit()
+
+    def missing_details(self, vin, now=None, attempts=_DETAIL_ATTEMPTS, retry_interval=_DETAIL_RETRY_INTERVAL):
+        """IDs of the stored journeys of a vehicle without details that are worth asking for, journeys that
+        failed before are skipped for 'retry_interval' seconds after each attempt and for good after 'attempts'."""
+        now = time.time() if now is None else now
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT journeys.journeyID FROM journeys LEFT JOIN details USING (journeyID) "
+                "LEFT JOIN failed USING (journeyID) "
+                "WHERE journeys.vin = ? AND details.journeyID IS NULL "
+                "AND (failed.journeyID IS NULL OR failed.attempts < ? AND failed.timestamp <= ?) "
+                "ORDER BY journeys.start",
+                (vin, attempts, now - retry_interval),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def abandoned_details(self, vin, attempts=_DETAIL_ATTEMPTS):
+        """Number of stored journeys of a vehicle whose details are no longer asked for."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*) FROM journeys JOIN failed USING (journeyID) WHERE journeys.vin = ? AND failed.attempts >= ?",
+                (vin, attempts),
+            ).fetchone()
+        return row[0]
+
+    def last_synced(self, vin):
+        """Timestamp of the end of the last sync of a vehicle or None."""
+        with self._lock:
+            row = self._db.execute("SELECT timestamp FROM synced WHERE vin = ?", (vin,)).fetchone()
+        return row[0] if row else None
+
+    def set_synced(self, vin, timestamp):
+        """Record the end of a sync of a vehicle."""
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO synced (vin, timestamp) VALUES (?, ?)", (vin, timestamp))
+            self._db.commit()
+
+    def close(self):
+        """Close the journey store."""
+        with self._lock:
+            self._db.close()
+
+
+def sync_journeys(
+    store,
+    vin,
+    getJourneys,
+    getJourneyDetails,
+    historyDays=30,
+    workers=8,
+    now=None,
+    detailAttempts=_DETAIL_ATTEMPTS,
+    detailRetryInterval=_DETAIL_RETRY_INTERVAL,
+):
+    """Fetch the journeys since the last sync and the details of journeys not yet stored, details that could not
+    be fetched are tried again on later syncs up to 'detailAttempts' times, 'detailRetryInterval' seconds apart."""
+    end = int(now or time.time())
+    synced = store.last_synced(vin)
+    start = end - historyDays * 86400 if synced is None else synced - _SYNC_OVERLAP
+
+    response = getJourneys(start=start, end=end)
+    if response is None:
+        _LOGGER.error(f"Unable to sync journeys for VIN {vin}")
+        return 0
+    added = store.add_journeys(vin, response.get("value") or [])
+
+    missing = store.missing_details(vin, now=end, attempts=detailAttempts, retry_interval=detailRetryInterval)
+    fetched = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="journeys") as executor:
+        for journeyID, details in zip(missing, executor.map(lambda id: getJourneyDetails(id=id), missing)):
+            if details:
+                store.add_details(journeyID, details)
+                fetched += 1
+            else:
+                failed.append(journeyID)
+    store.add_failures(failed, end)
+
+    store.set_synced(vin, end)
+    abandoned = store.abandoned_details(vin, attempts=detailAttempts)
+    _LOGGER.info(
+        f"Synced journeys for VIN {vin} from {time.strftime('%Y-%m-%d %H:%M', time.localtime(start))}, "
+        f"{added} new journey(s), {fetched} journey detail(s) fetched, {len(failed)} failed"
+        + (f", {abandoned} no longer tried" if abandoned else "")
+    )
+    return added
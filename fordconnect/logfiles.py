@@ -3,12 +3,17 @@
 import os
 import sys
 import logging
+import logging.handlers
 from datetime import datetime
 
 
 _LOG_FILE = "log/fordconnect"
 _LOG_FORMAT = "[%(asctime)s] [%(module)s] [%(levelname)s] %(message)s"
 
+_UNTRACKED_FILE = "log/untracked.jsonl"
+_UNTRACKED_MAX_BYTES = 1024 * 1024
+_UNTRACKED_BACKUPS = 5
+
 
 def create_application_log(app_logger):
     """Create the application log."""
@@ -36,3 +41,21 @@ def create_application_log(app_logger):
 
     # First entry
     app_logger.info("Created application log %s", filename)
+
+
+def create_untracked_log():
+    """Create the rotating log of untracked status changes, one JSON object per line."""
+    filename = os.path.abspath(os.path.expanduser(_UNTRACKED_FILE))
+    directory = os.path.dirname(filename)
+    if not os.path.isdir(directory):
+        os.mkdir(directory)
+
+    untracked_logger = logging.getLogger("fordconnect.untracked")
+    untracked_logger.propagate = False
+    untracked_logger.setLevel(logging.INFO)
+    handler = logging.handlers.RotatingFileHandler(
+        filename, maxBytes=_UNTRACKED_MAX_BYTES, backupCount=_UNTRACKED_BACKUPS
+    )
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    untracked_logger.addHandler(handler)
+    return untracked_logger
@@ -0,0 +1,319 @@
+"""Counters, gauges and histograms for the monitor, served in the OpenMetrics text format."""
+
+import logging
+import threading
+import time
+
+from bisect import bisect_left
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# seconds, from a cached lookup to a slow API call
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=""):
+    """Label set of a sample, '{name="value",...}' or empty."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    """Format a sample value."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class of the metric types, values are kept per tuple of label values."""
+
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _header(self):
+        """TYPE and HELP lines of the metric."""
+        return [f"# TYPE {self.name} {self.type}", f"# HELP {self.name} {self.help}"]
+
+    def clear(self):
+        """Forget every value."""
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    """Class to count events, the count only goes up."""
+
+    type = "counter"
+
+    def inc(self, *labels, amount=1):
+        """Add to the counter of a label set."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        """Current count of a label set."""
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def render(self):
+        """Sample lines of the metric."""
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [
+            f"{self.name}_total{_labels(self.labels, labels)} {_number(value)}" for labels, value in values
+        ]
+
+
+class Gauge(_Metric):
+    """Class to hold the latest value of a measurement."""
+
+    type = "gauge"
+
+    def set(self, value, *labels):
+        """Set the value of a label set."""
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels):
+        """Current value of a label set, None if never set."""
+        with self._lock:
+            return self._values.get(labels)
+
+    def render(self):
+        """Sample lines of the metric."""
+        with self._lock:
+            values = list(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.labels, labels)} {_number(value)}" for labels, value in values]
+
+
+class Histogram(_Metric):
+    """Class to count observations in buckets, along with their count and sum."""
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        """Add an observation to a label set, the buckets are not cumulative until rendered."""
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                # one count per bucket, the +Inf bucket, then the sum
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, *labels):
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self, labels)
+
+    def count(self, *labels):
+        """Number of observations of a label set."""
+        with self._lock:
+            counts = self._values.get(labels)
+            return sum(counts[:-1]) if counts else 0
+
+    def render(self):
+        """Sample lines of the metric."""
+        with self._lock:
+            values = [(labels, list(counts)) for labels, counts in self._values.items()]
+        lines = self._header()
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket = _labels(self.labels, labels, 'le="' + _number(float(bound)) + '"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(counts[-1])}")
+        return lines
+
+
+class _Timer:
+    """Context manager timing a block into a histogram."""
+
+    __slots__ = ["_histogram", "_labels", "_started"]
+
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+        return False
+
+
+class MetricsRegistry:
+    """Class to hold the metrics of the process, metric names are unique."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        """Register a metric."""
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric '{metric.name}' is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        """Register a counter, the '_total' suffix is added to its samples."""
+        return self._add(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=()):
+        """Register a gauge."""
+        return self._add(Gauge(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        """Register a histogram."""
+        return self._add(Histogram(name, help, labels, buckets))
+
+    def clear(self):
+        """Forget the values of every metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self):
+        """Every metric in the OpenMetrics text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+API_LATENCY = REGISTRY.histogram("fordconnect_api_call_seconds", "FordPass API call latency, every attempt", ["endpoint"])
+API_RETRIES = REGISTRY.counter("fordconnect_api_retries", "FordPass API calls tried again", ["endpoint"])
+API_FAILURES = REGISTRY.counter("fordconnect_api_failures", "FordPass API calls that failed", ["endpoint", "reason"])
+POLL_CYCLE = REGISTRY.histogram("fordconnect_poll_cycle_seconds", "Time to poll and process the due vehicles")
+POLL_FAILURES = REGISTRY.counter("fordconnect_poll_failures", "Status polls that could not be processed", ["vin"])
+DIFF_TIME = REGISTRY.histogram("fordconnect_diff_seconds", "Time to compare a status with the previous one")
+GEOCODE_TIME = REGISTRY.histogram("fordconnect_geocode_seconds", "Reverse geocode lookup time", ["source"])
+ELEVATION_TIME = REGISTRY.histogram("fordconnect_elevation_seconds", "Elevation lookup time", ["source"])
+ABRP_SEND_TIME = REGISTRY.histogram("fordconnect_abrp_send_seconds", "ABRP telemetry request time")
+ABRP_RETRIES = REGISTRY.counter("fordconnect_abrp_retries", "ABRP telemetry requests tried again")
+ABRP_FAILURES = REGISTRY.counter("fordconnect_abrp_failures", "ABRP telemetry samples given up on")
+EVENTS_PUBLISHED = REGISTRY.counter("fordconnect_events_published", "Events published to the event bus", ["type"])
+EVENTS_DROPPED = REGISTRY.counter("fordconnect_events_dropped", "Events dropped from a full sink queue", ["sink"])
+EVENT_FAILURES = REGISTRY.counter("fordconnect_event_failures", "Events a sink failed to handle", ["sink"])
+EVENT_HANDLE_TIME = REGISTRY.histogram("fordconnect_event_handle_seconds", "Time a sink took to handle an event", ["sink"])
+
+# gauge -> (field of the status, scale), tire pressures are reported in kPa
+STATUS_GAUGES = [
+    (REGISTRY.gauge("fordconnect_soc_percent", "Battery state of charge", ["vin"]), "soc", 1.0),
+    (REGISTRY.gauge("fordconnect_dte_meters", "Estimated range", ["vin"]), "dte", 1000.0),
+    (REGISTRY.gauge("fordconnect_odometer_meters", "Odometer reading", ["vin"]), "odometer", 1000.0),
+    (REGISTRY.gauge("fordconnect_battery_volts", "12 V battery voltage", ["vin"]), "battery_volts", 1.0),
+    (REGISTRY.gauge("fordconnect_status_modified_timestamp_seconds", "Time the vehicle last updated its status", ["vin"]), "modified", 1.0),
+]
+TIRE_PRESSURE = REGISTRY.gauge("fordconnect_tire_pressure_kpa", "Tire pressure", ["vin", "tire"])
+TIRES = ["leftFrontTirePressure", "rightFrontTirePressure", "outerLeftRearTirePressure", "outerRightRearTirePressure"]
+
+
+def update_status(vin, status):
+    """Set the status gauges of a vehicle from its latest status."""
+    for gauge, field, scale in STATUS_GAUGES:
+        value = getattr(status, field)
+        if value is not None:
+            gauge.set(value * scale, vin)
+    for tire, value in zip(TIRES, status.tire_pressures):
+        if value is not None:
+            TIRE_PRESSURE.set(value, vin, tire)
+
+
+class MetricsServer:
+    """Class to serve the metrics of a registry over HTTP on a background thread, meant to be scraped locally."""
+
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9464):
+        """Create the server, nothing is bound until started."""
+        self._registry = registry
+        self._host = host
+        self._port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self):
+        """Port being served, the bound port when started on port 0."""
+        return self._server.server_address[1] if self._server else self._port
+
+    def start(self):
+        """Bind the port and start serving."""
+        # only loaded when the exporter is enabled
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        registry = self._registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self._host, self._port), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True)
+        self._thread.start()
+        _LOGGER.info(f"Serving metrics on http://{self._host}:{self.port}/metrics")
+
+    def close(self):
+        """Stop serving and release the port."""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+
+
+def start_metrics_server(options):
+    """Start the exporter from the 'metrics' options, None if it is disabled or the port is taken."""
+    if not options.get('enable'):
+        return None
+    server = MetricsServer(host=options.get('host'), port=options.get('port'))
+    try:
+        server.start()
+    except OSError as e:
+        _LOGGER.error(f"Unable to serve metrics on {options.get('host')}:{options.get('port')}: {e}")
+        return None
+    return server
@@ -8,8 +8,10 @@ import requests
 import version
 import logfiles
 from readconfig import read_config
+from apicall import api_call, configure_api
+from sessions import configure_sessions
 
-from fordpass import Vehicle
+from tokencache import CachedVehicle, use_fordpass_sessions
 
 
 _VEHICLECLIENT = None
@@ -19,23 +21,14 @@ _LOGGER = logging.getLogger("fordconnect")
 
 def get_plug_status():
     global _VEHICLECLIENT
-    status = None
-    tries = 3
-    while tries > 0:
-        try:
-            status = _VEHICLECLIENT.plugstatus()
-            break
-        except requests.ConnectionError:
-            tries -= 1
-            # _LOGGER.info(f"request.get() timed out, {tries} remaining")
-            if tries == 0:
-                _LOGGER.error(f"FordPass Connect API unavailable")
-                raise
-            continue
-        except Exception as e:
-            _LOGGER.error(f"Unexpected exception: {e}")
-            break
-    return status
+
+    try:
+        return api_call("plugstatus", _VEHICLECLIENT.plugstatus)
+    except requests.ConnectionError:
+        raise
+    except Exception as e:
+        _LOGGER.error(f"Unexpected exception: {e}")
+        return None
 
 
 def main():
@@ -50,12 +43,16 @@ def main():
     if not config:
         _LOGGER.error("Error processing YAML configuration - exiting")
         return
+    configure_api(config.get('api'))
+    configure_sessions(config.get('http'))
+    use_fordpass_sessions()
 
     fordconnect = config.get('fordconnect')
-    _VEHICLECLIENT = Vehicle(
+    _VEHICLECLIENT = CachedVehicle(
         username=fordconnect.get('username'),
         password=fordconnect.get('password'),
         vin=fordconnect.get('vin'),
+        cache_file=fordconnect.get('token_cache'),
     )
     plugStatus = get_plug_status()
     _LOGGER.info(f"Plug status: {plugStatus}")
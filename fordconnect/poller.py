@@ -0,0 +1,88 @@
+"""Concurrent polling of one or more vehicles on a FordPass account."""
+
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from metrics import POLL_CYCLE, POLL_FAILURES
+from tripdetector import TripDetector
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+
+class VehicleState:
+    """Class to hold the polling state of a single vehicle."""
+
+    def __init__(self, vin, client):
+        """Create the state for a vehicle."""
+        self.vin = vin
+        self.client = client
+        # the last status that changed, and the status returned by the latest poll
+        self.previousStatus = None
+        self.lastStatus = None
+        self.trips = TripDetector(vin)
+        self.nextPoll = 0.0
+        self.polls = 0
+        self.failures = 0
+
+
+class VehiclePoller:
+    """Class to poll a list of vehicles concurrently with bounded parallelism."""
+
+    def __init__(self, vehicles, fetch, process, schedule=None, max_workers=4, clock=time.monotonic, sleep=time.sleep):
+        """Create the poller, 'fetch' gets a status for a vehicle, 'process' consumes it and
+        'schedule' returns the seconds until a vehicle is polled again, 'clock' and 'sleep' keep the poll times."""
+        self._vehicles = vehicles
+        self._fetch = fetch
+        self._process = process
+        self._schedule = schedule or (lambda state: 15)
+        self._clock = clock
+        self._sleep = sleep
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="poller")
+
+    @property
+    def vehicles(self):
+        """List of vehicle states being polled."""
+        return self._vehicles
+
+    def _fetch_vehicle(self, state):
+        """Fetch the status of one vehicle, runs in a worker thread."""
+        state.polls += 1
+        return self._fetch(state)
+
+    def poll_once(self, vehicles=None):
+        """Fetch the status of the vehicles concurrently and process them as they arrive."""
+        started = time.perf_counter()
+        vehicles = self._vehicles if vehicles is None else vehicles
+        futures = {self._executor.submit(self._fetch_vehicle, state): state for state in vehicles}
+        for future in as_completed(futures):
+            state = futures[future]
+            try:
+                status = future.result()
+                if status:
+                    state.lastStatus = status
+                    self._process(state, status)
+            except Exception as e:
+                state.failures += 1
+                POLL_FAILURES.inc(state.vin)
+                _LOGGER.error(f"Unable to process the status for VIN {state.vin}: {e}")
+            state.nextPoll = self._clock() + self._schedule(state)
+        elapsed = time.perf_counter() - started
+        POLL_CYCLE.observe(elapsed)
+        return elapsed
+
+    def run(self, until=None):
+        """Poll each vehicle whenever it is due, runs until interrupted or the optional 'until' returns True."""
+        while until is None or not until():
+            now = self._clock()
+            due = [state for state in self._vehicles if state.nextPoll <= now]
+            if due:
+                self.poll_once(due)
+            nextPoll = min(state.nextPoll for state in self._vehicles)
+            self._sleep(max(0.0, nextPoll - self._clock()))
+
+    def close(self):
+        """Shut down the worker threads."""
+        self._executor.shutdown(wait=True)
@@ -1,25 +1,15 @@
-"""Custom YAML file loader with !secrets support."""
+"""Validated configuration, parsed from the YAML files and cached, readable by the owner only, until they change."""
 
+import hashlib
+import json
 import logging
 import os
 import sys
 
-from dateutil.parser import parse
-from pathlib import Path
-
-from collections import OrderedDict
-from typing import Dict, List, TextIO, TypeVar, Union
-
-import yaml
-from config import config_from_yaml
-
 
 CONFIG_YAML = "fordconnect.yaml"
-SECRET_YAML = "secrets.yaml"
+CONFIG_CACHE = "cache/config.json"
 
-JSON_TYPE = Union[List, Dict, str]  # pylint: disable=invalid-name
-DICT_T = TypeVar("DICT_T", bound=Dict)  # pylint: disable=invalid-name
-__SECRET_CACHE: Dict[str, JSON_TYPE] = {}
 _LOGGER = logging.getLogger("fordconnect")
 
 
@@ -27,146 +17,241 @@ class ConfigError(Exception):
     """General YAML configurtion file exception."""
 
 
-class FullLineLoader(yaml.FullLoader):
-    """Loader class that keeps track of line numbers."""
-
-    def compose_node(self, parent: yaml.nodes.Node, index: int) -> yaml.nodes.Node:
-        """Annotate a node with the first line it was seen."""
-        last_line: int = self.line
-        node: yaml.nodes.Node = super().compose_node(parent, index)
-        node.__line__ = last_line + 1  # type: ignore
-        return node
-
-
-def load_yaml(fname: str) -> JSON_TYPE:
-    """Load a YAML file."""
-    try:
-        with open(fname, encoding="utf-8") as conf_file:
-            return parse_yaml(conf_file)
-    except UnicodeDecodeError as exc:
-        _LOGGER.error("Unable to read file %s: %s", fname, exc)
-        raise ConfigError(exc) from exc
-
-
-def parse_yaml(content: Union[str, TextIO]) -> JSON_TYPE:
-    """Load a YAML file."""
-    try:
-        # If configuration file is empty YAML returns None
-        # We convert that to an empty dict
-        return yaml.load(content, Loader=FullLineLoader) or OrderedDict()
-    except yaml.YAMLError as exc:
-        _LOGGER.error(str(exc))
-        raise ConfigError(exc) from exc
-
-
-def _load_secret_yaml(secret_path: str) -> JSON_TYPE:
-    """Load the secrets yaml from path."""
-    secret_path = os.path.join(secret_path, SECRET_YAML)
-    if secret_path in __SECRET_CACHE:
-        return __SECRET_CACHE[secret_path]
-
-    logging.debug("Loading %s", secret_path)
-    try:
-        secrets = load_yaml(secret_path)
-        if not isinstance(secrets, dict):
-            raise ConfigError("Secrets is not a dictionary")
-
-    except FileNotFoundError:
-        secrets = {}
-
-    __SECRET_CACHE[secret_path] = secrets
-    return secrets
-
-
-def secret_yaml(loader: FullLineLoader, node: yaml.nodes.Node) -> JSON_TYPE:
-    """Load secrets and embed it into the configuration YAML."""
-    if os.path.basename(loader.name) == SECRET_YAML:
-        _LOGGER.error("secrets.yaml: attempt to load secret from within secrets file")
-        raise ConfigError("secrets.yaml: attempt to load secret from within secrets file")
-
-    secret_path = os.path.dirname(loader.name)
-    home_path = str(Path.home())
-    do_walk = os.path.commonpath([secret_path, home_path]) == home_path
-
-    while True:
-        secrets = _load_secret_yaml(secret_path)
-        if node.value in secrets:
-            _LOGGER.debug(
-                "Secret %s retrieved from secrets.yaml in folder %s",
-                node.value,
-                secret_path,
-            )
-            return secrets[node.value]
+_REQUIRED = "required"
+
+_STRING = (str, int, float)
+_NUMBER = (int, float)
+
+# section -> (key, accepted types, default or _REQUIRED), a section with required keys is optional as a whole
+CONFIG_SCHEMA = {
+    'fordconnect': [
+        ('name', _STRING, _REQUIRED),
+        ('username', _STRING, _REQUIRED),
+        ('password', _STRING, _REQUIRED),
+        ('vin', _STRING, None),
+        ('vins', (list,), None),
+        ('token_cache', (str,), 'cache/token.json'),
+    ],
+    'geocodio': [
+        ('enable', (bool,), _REQUIRED),
+        ('api_key', _STRING, _REQUIRED),
+        ('cache_file', (str,), 'cache/fordconnect.db'),
+        ('cache_precision', (int,), 4),
+        ('cache_ttl_days', _NUMBER, 180),
+        ('cache_max_entries', (int,), 5000),
+    ],
+    'abrp': [
+        ('enable', (bool,), _REQUIRED),
+        ('api_key', _STRING, _REQUIRED),
+        ('token', _STRING, _REQUIRED),
+        ('queue_size', (int,), 32),
+        ('retries', (int,), 3),
+    ],
+    'poller': [
+        ('interval', _NUMBER, 15),
+        ('charging_interval', _NUMBER, 30),
+        ('idle_factor', _NUMBER, 0.1),
+        ('max_interval', _NUMBER, 18),
+        ('sleep_interval', _NUMBER, 18),
+        ('max_workers', (int,), 4),
+    ],
+    'elevation': [
+        ('cache_file', (str,), 'cache/fordconnect.db'),
+        ('cache_precision', (int,), 4),
+        ('cache_max_entries', (int,), 20000),
+    ],
+    'http': [
+        ('pool_size', (int,), 4),
+        ('timeout', _NUMBER, 10.0),
+    ],
+    'journeys': [
+        ('workers', (int,), 8),
+        ('store_file', (str,), 'data/journeys.db'),
+        ('history_days', _NUMBER, 30),
+        ('detail_attempts', (int,), 5),
+        ('detail_retry_interval', _NUMBER, 3600),
+    ],
+    'history': [
+        ('enable', (bool,), True),
+        ('store_file', (str,), 'data/status.db'),
+        ('batch_size', (int,), 40),
+        ('flush_interval', _NUMBER, 60),
+    ],
+    'charging': [
+        ('store_file', (str,), 'data/charging.db'),
+        ('location_radius', _NUMBER, 150),
+    ],
+    'metrics': [
+        ('enable', (bool,), False),
+        ('host', (str,), '127.0.0.1'),
+        ('port', (int,), 9464),
+    ],
+    'events': [
+        ('queue_size', (int,), 64),
+        ('jsonl_file', (str,), None),
+        ('webhook_url', (str,), None),
+        ('sinks', (list,), None),
+    ],
+    'api': [
+        ('attempts', (int,), 3),
+        ('backoff', _NUMBER, 1.0),
+        ('max_backoff', _NUMBER, 30.0),
+        ('failure_threshold', (int,), 5),
+        ('reset_timeout', _NUMBER, 60.0),
+    ],
+}
+
+# the layout of the cache file, a cache of another layout is replaced
+_CACHE_FORMAT = 2
+
+# a changed schema invalidates every cached configuration
+_SCHEMA_HASH = hashlib.sha1(
+    repr([(section, [(key, [t.__name__ for t in types], default) for key, types, default in keys])
+          for section, keys in CONFIG_SCHEMA.items()]).encode()
+).hexdigest()
+
+
+class Options(dict):
+    """Class to hold validated options, values are available as items, with get() and as attributes."""
+
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key) from None
+
+
+def check_section(section, values):
+    """Validate the options of a section against the schema and fill in the defaults."""
+    keys = CONFIG_SCHEMA[section]
+    if values is None:
+        # sections with required options are disabled when missing, the rest use the defaults
+        if any(default == _REQUIRED for _, _, default in keys):
+            return Options()
+        values = {}
+
+    known = {key for key, _, _ in keys}
+    for key in values.keys():
+        if key not in known:
+            _LOGGER.warning(f"Unknown option '{key}' in '{section}' settings is ignored")
+
+    options = Options()
+    for key, types, default in keys:
+        if key not in values.keys() or values.get(key) is None:
+            if default == _REQUIRED:
+                raise ConfigError(f"Missing required '{key}' option in '{section}' settings")
+            options[key] = default
+            continue
+        value = values.get(key)
+        if isinstance(value, bool) and bool not in types or not isinstance(value, types):
+            expected = " or ".join(t.__name__ for t in types)
+            raise ConfigError(f"Option '{key}' in '{section}' settings must be {expected}, not '{value}'")
+        options[key] = str(value) if types == _STRING else value
+    return options
 
-        if not do_walk or (secret_path == home_path):
-            break
-        secret_path = os.path.dirname(secret_path)
 
-    raise ConfigError(f"Secret '{node.value}' not defined")
+def check_fordconnect(options):
+    """A single 'vin' or a list of 'vins' on the same account."""
+    if not options:
+        raise ConfigError(f"Missing 'fordconnect' settings")
+    vins = options.get('vins')
+    if vins is None:
+        if options.get('vin') is None:
+            raise ConfigError(f"Missing required 'vin' or 'vins' option in 'fordconnect' settings")
+        vins = [options.get('vin')]
+    elif len(vins) == 0:
+        raise ConfigError(f"The 'vins' option in 'fordconnect' settings must be a list of VINs")
+    options['vins'] = [str(vin) for vin in vins]
+    options['vin'] = options.get('vin') or options['vins'][0]
+    return options
 
 
-def check_fordconnect(config):
-    """Check for Ford Connect options"""
-    try:
-        vehicleOptions = config.fordconnect.as_dict()
-    except:
-        return {}
-
-    options = {}
-    vehicle_keys = ['name', 'vin', 'username', 'password']
-    for key in vehicle_keys:
-        if key not in vehicleOptions.keys():
-            _LOGGER.error(f"Missing required '{key}' option in 'fordconnect' settings")
-            return {}
-        options[key] = vehicleOptions.get(key, None)
+def compile_config(sections):
+    """Validate the parsed sections, returns the options of every section in the schema."""
+    for section in sections.keys():
+        if section not in CONFIG_SCHEMA:
+            _LOGGER.warning(f"Unknown '{section}' settings are ignored")
+    options = Options((section, check_section(section, sections.get(section))) for section in CONFIG_SCHEMA)
+    check_fordconnect(options['fordconnect'])
     return options
 
 
-def check_geocodio(config):
-    """Check for geocodio options and return"""
+def _fingerprint(filename):
+    """Modification time and size of a file, None if it does not exist."""
     try:
-        geocodioOptions = config.geocodio.as_dict()
-    except:
-        return {}
-
-    options = {}
-    geocodio_keys = ['enable', 'api_key']
-    for key in geocodio_keys:
-        if key not in geocodioOptions.keys():
-            _LOGGER.error(f"Missing required '{key}' option in 'geocodio' settings")
-            return {}
-        options[key] = geocodioOptions.get(key, None)
-    return options
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
 
 
-def check_abrp(config):
-    """Check for geocodio options and return"""
+def _load_cached(cacheFile, yamlFile):
+    """Cached options, secrets included, if none of the YAML files have changed since they were parsed."""
     try:
-        abrpOptions = config.abrp.as_dict()
-    except:
-        return {}
-
-    options = {}
-    abrp_keys = ["enable", "api_key", "token"]
-    for key in abrp_keys:
-        if key not in abrpOptions.keys():
-            _LOGGER.error(f"Missing required '{key}' option in 'abrp' settings")
-            return {}
-        options[key] = abrpOptions.get(key, None)
+        with open(cacheFile) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (
+        cached.get('format') != _CACHE_FORMAT
+        or cached.get('schema') != _SCHEMA_HASH
+        or cached.get('config') != yamlFile
+    ):
+        return None
+    files = cached.get('files') or {}
+    if yamlFile not in files or any(_fingerprint(name) != fingerprint for name, fingerprint in files.items()):
+        return None
+    return Options((section, Options(values)) for section, values in cached.get('options').items())
+
+
+def _save_cached(cacheFile, yamlFile, files, options):
+    """Save the compiled options, readable by the owner only since they hold the secrets like the token cache.
+    A cache written by an older version is replaced."""
+    directory = os.path.dirname(cacheFile)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    cached = {
+        'format': _CACHE_FORMAT,
+        'schema': _SCHEMA_HASH,
+        'config': yamlFile,
+        'files': {name: _fingerprint(name) for name in [yamlFile] + files},
+        'options': options,
+    }
+    temporary = f"{cacheFile}.{os.getpid()}.tmp"
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as f:
+        json.dump(cached, f)
+    os.replace(temporary, cacheFile)
+
+
+def load_config(yaml_file, cache_file=None):
+    """Compiled options of a configuration file, reusing the options cached in 'cache_file' if up to date, a
+    cache hit does not read the YAML files at all."""
+    options = _load_cached(cache_file, yaml_file) if cache_file else None
+    if options is not None:
+        return options
+
+    from yamlsecrets import load_config_yaml, resolve_secrets, secret_files
+
+    options = compile_config(resolve_secrets(load_config_yaml(yaml_file), os.path.dirname(yaml_file)))
+    if cache_file:
+        try:
+            _save_cached(cache_file, yaml_file, secret_files(), options)
+        except (OSError, TypeError, ValueError) as e:
+            _LOGGER.warning(f"Unable to cache the configuration in '{cache_file}': {e}")
+            # an out of date cache, possibly written by an older version, is not left behind
+            try:
+                os.remove(cache_file)
+            except OSError:
+                pass
     return options
 
 
-def read_config():
+def read_config(use_cache=True):
     try:
-        yaml.FullLoader.add_constructor("!secret", secret_yaml)
         yaml_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), CONFIG_YAML)
-        config = config_from_yaml(data=yaml_file, read_from_file=True)
-
-        options = {}
-        options['fordconnect'] = check_fordconnect(config)
-        options['geocodio'] = check_geocodio(config)
-        options['abrp'] = check_abrp(config)
-        return options
+        cache_file = os.path.join(os.path.dirname(yaml_file), CONFIG_CACHE)
+        return load_config(yaml_file, cache_file if use_cache else None)
 
     except Exception as e:
         print(e)
@@ -0,0 +1,221 @@
+"""Recording of FordPass API responses and replay of them on a virtual clock."""
+
+import copy
+import gzip
+import json
+import logging
+import threading
+import time
+
+from bisect import bisect_right
+from datetime import datetime, timezone
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+# vehicle client methods whose responses are recorded
+RECORDED_ENDPOINTS = ["status", "journeys", "journey_details", "chargelogs", "plugstatus"]
+
+
+def _open(filename, mode):
+    """Open a recording as text, compressed if the name ends in '.gz'."""
+    if filename.endswith(".gz"):
+        return gzip.open(filename, mode + "t", encoding="utf-8")
+    return open(filename, mode, encoding="utf-8")
+
+
+def _fordtime(seconds):
+    """Seconds since the epoch as a Ford UTC time string."""
+    return datetime.fromtimestamp(seconds, tz=timezone.utc).strftime("%m-%d-%Y %H:%M:%S")
+
+
+def _unchanged(previous, status):
+    """True if two status responses only differ in their server time."""
+    if previous is None:
+        return False
+    return {**previous, "serverTime": None} == {**status, "serverTime": None}
+
+
+class VirtualClock:
+    """Class to provide time(), monotonic() and sleep() on a clock that runs 'speed' times faster than real time.
+
+    With no speed sleep() returns at once, the clock only moves when something sleeps.
+    """
+
+    def __init__(self, start=0.0, speed=None):
+        """Create the clock at 'start' seconds since the epoch."""
+        self._now = float(start)
+        self._speed = speed
+        self._lock = threading.Lock()
+
+    def time(self):
+        """Current virtual time."""
+        with self._lock:
+            return self._now
+
+    monotonic = time
+
+    def sleep(self, seconds):
+        """Advance the clock, waiting seconds / speed of real time if a speed was given."""
+        if seconds <= 0:
+            return
+        if self._speed:
+            time.sleep(seconds / self._speed)
+        with self._lock:
+            self._now += seconds
+
+
+class Recorder:
+    """Class to append API responses to a recording, one JSON line per response.
+
+    Status responses that only differ from the last one recorded for the vehicle in their server time are
+    skipped, the server time is rebuilt from the clock when they are replayed.
+    """
+
+    def __init__(self, filename, clock=time.time):
+        """Open the recording for appending."""
+        self._file = _open(filename, "a")
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._lastStatus = {}
+        self.recorded = 0
+        self.skipped = 0
+
+    def record(self, vin, endpoint, kwargs, response):
+        """Append a response."""
+        with self._lock:
+            if endpoint == "status":
+                if _unchanged(self._lastStatus.get(vin), response):
+                    self.skipped += 1
+                    return
+                self._lastStatus[vin] = response
+            self._file.write(
+                json.dumps({"time": self._clock(), "vin": vin, "endpoint": endpoint, "args": kwargs, "response": response})
+            )
+            self._file.write("\n")
+            self._file.flush()
+            self.recorded += 1
+
+    def wrap(self, client, vin):
+        """Vehicle client recording the responses of its API calls."""
+        return RecordingVehicle(client, vin, self)
+
+    def close(self):
+        """Close the recording."""
+        with self._lock:
+            self._file.close()
+        _LOGGER.info(f"Recorded {self.recorded} API responses, {self.skipped} unchanged status responses skipped")
+
+
+class RecordingVehicle:
+    """Class to pass API calls through to a vehicle client and record the responses."""
+
+    def __init__(self, client, vin, recorder):
+        """Wrap the client of a vehicle."""
+        self._client = client
+        self._vin = vin
+        self._recorder = recorder
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name not in RECORDED_ENDPOINTS or not callable(attribute):
+            return attribute
+
+        def call(**kwargs):
+            response = attribute(**kwargs)
+            self._recorder.record(self._vin, name, kwargs, response)
+            return response
+
+        return call
+
+
+class Recording:
+    """Class to hold a loaded recording, the responses of each vehicle and endpoint are in time order."""
+
+    def __init__(self, filename):
+        """Load a recording."""
+        self._responses = {}
+        count = 0
+        with _open(filename, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                key = (entry.get("vin"), entry.get("endpoint"))
+                times, responses = self._responses.setdefault(key, ([], []))
+                times.append(entry.get("time"))
+                responses.append((entry.get("args") or {}, entry.get("response")))
+                count += 1
+        for times, responses in self._responses.values():
+            order = sorted(range(len(times)), key=times.__getitem__)
+            times[:] = [times[i] for i in order]
+            responses[:] = [responses[i] for i in order]
+        self.count = count
+
+    @property
+    def vins(self):
+        """VINs with recorded status responses."""
+        return sorted({vin for vin, endpoint in self._responses if endpoint == "status"})
+
+    @property
+    def start(self):
+        """Time of the first recorded status response."""
+        return min(times[0] for (_, endpoint), (times, _) in self._responses.items() if endpoint == "status")
+
+    @property
+    def end(self):
+        """Time of the last recorded status response."""
+        return max(times[-1] for (_, endpoint), (times, _) in self._responses.items() if endpoint == "status")
+
+    def endpoints(self, vin):
+        """Endpoints recorded for a vehicle."""
+        return {endpoint for v, endpoint in self._responses if v == vin}
+
+    def response(self, vin, endpoint, now, kwargs=None):
+        """Latest response recorded by 'now' for the same arguments, None if there is none yet."""
+        times, responses = self._responses.get((vin, endpoint), ([], []))
+        kwargs = kwargs or {}
+        # nothing recorded after 'now' is answered, the replay never sees data from its future
+        for i in range(bisect_right(times, now) - 1, -1, -1):
+            args, response = responses[i]
+            if args == kwargs:
+                return response
+        return None
+
+
+class ReplayVehicle:
+    """Class to answer vehicle client calls from a recording, as of the time of a virtual clock."""
+
+    def __init__(self, recording, vin, clock):
+        """Create the client of a recorded vehicle."""
+        self.vin = vin
+        self._recording = recording
+        self._clock = clock
+        self._endpoints = recording.endpoints(vin)
+
+    def auth(self):
+        """Nothing to log in to."""
+        return True
+
+    def status(self):
+        """Status recorded at the current virtual time, with the server time set to it."""
+        now = self._clock.time()
+        status = self._recording.response(self.vin, "status", now)
+        if status is None:
+            return None
+        status = copy.copy(status)
+        status["serverTime"] = _fordtime(now)
+        return status
+
+    def __getattr__(self, name):
+        # only recorded endpoints exist, hasattr() tells callers what the replay can answer
+        if name.startswith("_") or name not in RECORDED_ENDPOINTS or name not in self._endpoints:
+            raise AttributeError(name)
+
+        def call(**kwargs):
+            response = self._recording.response(self.vin, name, self._clock.time(), kwargs)
+            if response is None:
+                raise LookupError(f"No recorded '{name}' response for {kwargs}")
+            return response
+
+        return call
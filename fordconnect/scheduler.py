@@ -0,0 +1,40 @@
+"""Adaptive polling intervals based on the state of the vehicle."""
+
+from vehiclestatus import CHARGING_STATES, DRIVING_STATES
+
+# a commanded charge is about to start, poll it like one that has
+_ACTIVE_CHARGING_STATES = CHARGING_STATES + ["ChargeStartCommanded"]
+
+
+class PollScheduler:
+    """Class to pick the time until the next status poll of a vehicle."""
+
+    def __init__(self, interval=15, charging_interval=30, idle_factor=0.1, max_interval=18, sleep_interval=18):
+        """Create the scheduler, all intervals are in seconds."""
+        self._interval = interval
+        self._charging_interval = charging_interval
+        self._idle_factor = idle_factor
+        self._max_interval = max(interval, max_interval)
+        self._sleep_interval = sleep_interval
+
+    def schedule(self, state):
+        """Seconds to wait before polling a vehicle again, from the status returned by its latest poll."""
+        return self.next_interval(state.lastStatus)
+
+    def next_interval(self, status):
+        """Seconds to wait before polling a vehicle last seen with this status."""
+        if not status:
+            return self._interval
+        if status.ignition in DRIVING_STATES:
+            return self._interval
+        if status.charging in _ACTIVE_CHARGING_STATES:
+            return self._charging_interval
+        if status.deep_sleep:
+            return self._sleep_interval
+
+        # parked, back off in proportion to how long the status has not changed, only a little since a parked
+        # vehicle can be started at any time and the poll is the only way to see it
+        if status.server_time is None or status.modified is None:
+            return self._interval
+        idle = status.server_time - status.modified
+        return min(self._max_interval, max(self._interval, idle * self._idle_factor))
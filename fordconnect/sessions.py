@@ -0,0 +1,102 @@
+"""Long-lived HTTP sessions shared by the FordPass, ABRP and USGS clients."""
+
+import logging
+import threading
+
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+_OPTIONS = {'pool_size': 4, 'timeout': 10.0}
+_SESSIONS = {}
+_LOCK = threading.Lock()
+
+# session of the client making a call on each thread, used by SessionRequests
+_CURRENT = threading.local()
+
+# the requests module functions a client library may call, everything else is looked up in requests itself
+_REQUEST_METHODS = ["request", "get", "post", "put", "patch", "delete", "head", "options"]
+
+
+def configure_sessions(options):
+    """Set the pool size and timeout used by sessions created from now on."""
+    for key in _OPTIONS.keys():
+        if options.get(key) is not None:
+            _OPTIONS[key] = options.get(key)
+
+
+def request_timeout():
+    """Timeout in seconds for requests made with a shared session."""
+    return _OPTIONS.get('timeout')
+
+
+class TimeoutSession(requests.Session):
+    """Class to give the requests of a session the shared timeout when the caller does not set one."""
+
+    def request(self, method, url, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = request_timeout()
+        return super().request(method, url, **kwargs)
+
+
+class SessionRequests:
+    """Class to stand in for the requests module of a client library that calls requests.get() and friends,
+    the calls are made with the session given to using_session() on the calling thread, or the shared session
+    of 'name' outside of one, so they are pooled and time out."""
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attribute):
+        if attribute in _REQUEST_METHODS:
+            return getattr(getattr(_CURRENT, "session", None) or get_session(self._name), attribute)
+        return getattr(requests, attribute)
+
+
+def install_session_requests(module, name):
+    """Replace the requests module used by a client library with a SessionRequests, called from main()."""
+    if not isinstance(getattr(module, "requests", None), SessionRequests):
+        module.requests = SessionRequests(name)
+
+
+@contextmanager
+def using_session(session):
+    """Make the calls through a SessionRequests on this thread use 'session'."""
+    previous = getattr(_CURRENT, "session", None)
+    _CURRENT.session = session
+    try:
+        yield session
+    finally:
+        _CURRENT.session = previous
+
+
+def new_session():
+    """Pooled keep-alive session with the configured pool size and timeout."""
+    poolSize = _OPTIONS.get('pool_size')
+    adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+    session = TimeoutSession()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(name):
+    """Pooled keep-alive session shared by a named client, created on first use."""
+    with _LOCK:
+        session = _SESSIONS.get(name)
+        if session is None:
+            session = new_session()
+            _SESSIONS[name] = session
+        return session
+
+
+def close_sessions():
+    """Close all of the shared sessions."""
+    with _LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
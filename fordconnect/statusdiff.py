@@ -0,0 +1,224 @@
+"""Table driven comparison of parsed vehicle statuses."""
+
+from collections import OrderedDict
+
+
+_KPA_TO_PSI = 0.1450377
+
+
+def _rounded(digits):
+    """Normalizer rounding a numeric value."""
+
+    def normalize(value):
+        return round(float(value), digits)
+
+    return normalize
+
+
+def _pressure(adjust):
+    """Normalizer converting a kPa tire pressure to whole units."""
+
+    def normalize(value):
+        return int(round(float(value) * adjust, 0))
+
+    return normalize
+
+
+# (diff key, VehicleStatus field or path into the rest of its payload, normalizer name)
+STATUS_FIELDS = [
+    ("ignitionStatus", "ignition", None),
+    ("odometer", "odometer", None),
+    ("elVehDTE", "dte", "dte"),
+    ("batteryFillLevel", "soc", None),
+    ("batteryHealth", "battery_health", None),
+    ("batteryStatusActual", "battery_volts", None),
+    ("batteryPerfStatus", "battery_perf", None),
+    ("batteryChargeStatus", "battery_charge", None),
+    ("latitude", "latitude", None),
+    ("longitude", "longitude", None),
+    ("lockStatus", "lock", None),
+    ("alarm", "alarm", None),
+    ("chargingStatus", "charging", None),
+    ("chargeStartTime", "charge_start_time", None),
+    ("chargeEndTime", "charge_end_time", None),
+    ("plugStatus", "plug", None),
+    ("firmwareUpgInProgress", "firmware_upgrade", None),
+    ("deepSleepInProgress", "deep_sleep", None),
+    ("PrmtAlarmEvent", "alarm_event", None),
+    ("remoteStartStatus", "remote_start", None),
+    ("preCondStatusDsply", "preconditioning", None),
+    ("tirePressure", "tire_pressure", None),
+    ("oilLife", "oil_life", None),
+    ("oilLifeActual", "oil_life_actual", None),
+    ("leftFrontTirePressure", "left_front_tire", "pressure"),
+    ("rightFrontTirePressure", "right_front_tire", "pressure"),
+    ("outerLeftRearTirePressure", "left_rear_tire", "pressure"),
+    ("outerRightRearTirePressure", "right_rear_tire", "pressure"),
+    ("fstChrgBulkTEst", "fast_charge_bulk", None),
+    ("fstChrgCmpltTEst", "fast_charge_complete", None),
+    ("batteryTracLowChargeThreshold", "low_charge_threshold", None),
+    ("battTracLoSocDDsply", "low_charge_display", None),
+    ("rightRearDoor", ("doorStatus", "rightRearDoor", "value"), None),
+    ("leftRearDoor", ("doorStatus", "leftRearDoor", "value"), None),
+    ("driverDoor", ("doorStatus", "driverDoor", "value"), None),
+    ("passengerDoor", ("doorStatus", "passengerDoor", "value"), None),
+    ("hoodDoor", ("doorStatus", "hoodDoor", "value"), None),
+    ("tailgateDoor", ("doorStatus", "tailgateDoor", "value"), None),
+    ("innerTailgateDoor", ("doorStatus", "innerTailgateDoor", "value"), None),
+    ("driverWindowPosition", ("windowPosition", "driverWindowPosition", "value"), None),
+    ("passWindowPosition", ("windowPosition", "passWindowPosition", "value"), None),
+    ("rearDriverWindowPos", ("windowPosition", "rearDriverWindowPos", "value"), None),
+    ("rearPassWindowPos", ("windowPosition", "rearPassWindowPos", "value"), None),
+]
+
+# keys always reported together when any one of them changes
+LINKED_FIELDS = [("latitude", "longitude")]
+
+# keys reported as a single list when any one of them changes
+COMBINED_FIELDS = {
+    "TPMS": (
+        "leftFrontTirePressure",
+        "rightFrontTirePressure",
+        "outerLeftRearTirePressure",
+        "outerRightRearTirePressure",
+    ),
+}
+
+
+def _safe_get(payload, path):
+    """Follow a path into a payload, None if any part is missing."""
+    value = payload
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def deep_diff(previous, current, skip=frozenset(), ignoredKeys=frozenset()):
+    """Structural comparison of two payloads, returns {dotted path: [old, new]} for the changed leaves."""
+    changes = {}
+    stack = [((), previous, current)]
+    while stack:
+        path, old, new = stack.pop()
+        if old == new or path in skip:
+            continue
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in old.keys() | new.keys():
+                if key not in ignoredKeys:
+                    stack.append((path + (key,), old.get(key), new.get(key)))
+        else:
+            changes[".".join(str(key) for key in path)] = [old, new]
+    return dict(sorted(changes.items()))
+
+
+class StatusDiffer:
+    """Class to compare vehicle statuses using a compiled field table."""
+
+    _CACHE_SIZE = 32
+
+    def __init__(self, fields=STATUS_FIELDS, psi=True):
+        """Compile the field table into a flattening function."""
+        self._keys = tuple(key for key, _, _ in fields)
+        self._sources = tuple(source for _, source, _ in fields)
+        normalizers = {"dte": _rounded(1), "pressure": _pressure(_KPA_TO_PSI if psi else 1.0)}
+        self._normalizers = tuple(normalizers[name] if name else None for _, _, name in fields)
+
+        index = {key: i for i, key in enumerate(self._keys)}
+        self._linked = {}
+        for group in LINKED_FIELDS:
+            for key in group:
+                self._linked[index[key]] = tuple(index[k] for k in group)
+        self._combined = {}
+        for combinedKey, group in COMBINED_FIELDS.items():
+            indexes = tuple(index[k] for k in group)
+            for i in indexes:
+                self._combined[i] = (combinedKey, indexes)
+
+        # fields in the rest of the payload, read once for each distinct rest
+        self._restPaths = tuple(source for source in self._sources if isinstance(source, tuple))
+        self._skip = frozenset(self._restPaths)
+        self._restValues = OrderedDict()
+
+        self._flatten_fast = self._compile()
+        self._cache = OrderedDict()
+
+    def _compile(self):
+        """Generate a single function that reads and normalizes every field."""
+        namespace = {"rest_values": self._rest_values}
+        lines = ["def flatten(status):"]
+        if self._restPaths:
+            lines.append("    rest = rest_values(status)")
+        lines.append("    return (")
+        restIndex = 0
+        for i, (source, normalizer) in enumerate(zip(self._sources, self._normalizers)):
+            if isinstance(source, tuple):
+                access = f"rest[{restIndex}]"
+                restIndex += 1
+            else:
+                access = f"status.{source}"
+            if normalizer:
+                namespace[f"n{i}"] = normalizer
+                lines.append(f"        None if (v{i} := {access}) is None else n{i}(v{i}),")
+            else:
+                lines.append(f"        {access},")
+        lines.append("    )")
+        exec("\n".join(lines), namespace)
+        return namespace["flatten"]
+
+    def _rest_values(self, status):
+        """Values of the fields in the rest of the payload, statuses that share the rest share the values."""
+        values = self._restValues.get(status.rest)
+        if values is None:
+            rest = status.rest_dict()
+            values = tuple(_safe_get(rest, path) for path in self._restPaths)
+            self._restValues[status.rest] = values
+            if len(self._restValues) > self._CACHE_SIZE:
+                self._restValues.popitem(last=False)
+        return values
+
+    @property
+    def keys(self):
+        """Keys of the flattened status values."""
+        return self._keys
+
+    def flatten(self, status):
+        """Flatten a status to a tuple of normalized values, each status is flattened once."""
+        cached = self._cache.get(id(status))
+        if cached and cached[0] is status:
+            return cached[1]
+
+        flat = self._flatten_fast(status)
+
+        self._cache[id(status)] = (status, flat)
+        if len(self._cache) > self._CACHE_SIZE:
+            self._cache.popitem(last=False)
+        return flat
+
+    def diff_flat(self, previous, current):
+        """Compare two flattened statuses."""
+        diffs = {}
+        if previous == current:
+            return diffs
+
+        keys = self._keys
+        for i, (old, new) in enumerate(zip(previous, current)):
+            if old == new:
+                continue
+            combined = self._combined.get(i)
+            if combined:
+                diffs[combined[0]] = [current[j] for j in combined[1]]
+                continue
+            for j in self._linked.get(i, (i,)):
+                diffs[keys[j]] = current[j]
+        return diffs
+
+    def diff(self, previous, current):
+        """Compare two statuses, returns the changed values of the current status."""
+        return self.diff_flat(self.flatten(previous), self.flatten(current))
+
+    def untracked(self, previous, current):
+        """Changes to the rest of the payloads of two statuses not covered by the field table."""
+        if previous.rest == current.rest:
+            return {}
+        return deep_diff(previous.rest_dict(), current.rest_dict(), self._skip)
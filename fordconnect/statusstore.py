@@ -0,0 +1,138 @@
+"""Append-only SQLite history of polled vehicle status."""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from statusdiff import STATUS_FIELDS, StatusDiffer
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+
+class StatusStore:
+    """Class to encapsulate the status history, every poll is recorded but a status is only stored when it changes."""
+
+    def __init__(self, filename, fields=STATUS_FIELDS, batch_size=40, flush_interval=60.0):
+        """Open (or create) the status history."""
+        if filename != ":memory:":
+            filename = os.path.expanduser(filename)
+            directory = os.path.dirname(filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+        # typed values without the normalizers, tire pressures stay in kPa
+        self._differ = StatusDiffer([(key, source, None) for key, source, _ in fields])
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._polls = []
+        self._statuses = []
+        self._lastModified = {}
+        self._lastFlush = time.monotonic()
+
+        columns = ", ".join(f"{key} NUMERIC" for key in self._differ.keys)
+        self._db = sqlite3.connect(filename, timeout=5.0, check_same_thread=False)
+        self._db.executescript(
+            f"""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS polls
+                (vin TEXT, polled INTEGER, modified INTEGER, PRIMARY KEY (vin, polled)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS status
+                (vin TEXT, modified INTEGER, {columns}, PRIMARY KEY (vin, modified)) WITHOUT ROWID;
+            """
+        )
+        self._db.commit()
+        # fields added to the table after the history was created start out empty
+        stored = {row[1] for row in self._db.execute("PRAGMA table_info(status)")}
+        for key in self._differ.keys:
+            if key not in stored:
+                self._db.execute(f"ALTER TABLE status ADD COLUMN {key} NUMERIC")
+        self._db.commit()
+        self._keys = self._differ.keys
+        self._insert = (
+            f"INSERT OR IGNORE INTO status (vin, modified, {', '.join(self._keys)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(self._keys))})"
+        )
+
+    @property
+    def keys(self):
+        """Fields stored for each status."""
+        return self._keys
+
+    def append(self, vin, status):
+        """Record a polled status, writes are batched until 'batch_size' polls or 'flush_interval' seconds."""
+        if status.server_time is None or status.modified is None:
+            return
+        polled, modified = int(status.server_time), int(status.modified)
+
+        with self._lock:
+            self._polls.append((vin, polled, modified))
+            if self._lastModified.get(vin) != modified:
+                self._lastModified[vin] = modified
+                self._statuses.append((vin, modified) + self._differ.flatten(status))
+            if len(self._polls) >= self._batch_size or time.monotonic() - self._lastFlush >= self._flush_interval:
+                self._flush()
+
+    def _flush(self):
+        """Write the pending polls and statuses in one transaction, caller holds the lock."""
+        self._lastFlush = time.monotonic()
+        if not self._polls:
+            return
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO polls (vin, polled, modified) VALUES (?, ?, ?)", self._polls)
+            self._db.executemany(self._insert, self._statuses)
+        self._polls = []
+        self._statuses = []
+
+    def flush(self):
+        """Write anything still pending."""
+        with self._lock:
+            self._flush()
+
+    def _range(self, start, end):
+        """Open ended time range defaults."""
+        return 0 if start is None else start, 2 ** 62 if end is None else end
+
+    def statuses(self, vin, start=None, end=None, fields=None):
+        """Stored statuses of a vehicle last modified in [start, end) as dicts, oldest first."""
+        keys = [key for key in (fields or self._keys) if key in self._keys]
+        start, end = self._range(start, end)
+        with self._lock:
+            self._flush()
+            rows = self._db.execute(
+                f"SELECT {', '.join(['modified'] + keys)} FROM status "
+                f"WHERE vin = ? AND modified >= ? AND modified < ? ORDER BY modified",
+                (vin, start, end),
+            ).fetchall()
+        keys = ["modified"] + keys
+        return [dict(zip(keys, row)) for row in rows]
+
+    def series(self, vin, field, start=None, end=None):
+        """(modified, value) pairs of a single field of a vehicle in [start, end), oldest first."""
+        if field not in self._keys:
+            raise KeyError(field)
+        start, end = self._range(start, end)
+        with self._lock:
+            self._flush()
+            return self._db.execute(
+                f"SELECT modified, {field} FROM status WHERE vin = ? AND modified >= ? AND modified < ? ORDER BY modified",
+                (vin, start, end),
+            ).fetchall()
+
+    def polls(self, vin, start=None, end=None):
+        """(polled, modified) pairs of every poll of a vehicle in [start, end), oldest first."""
+        start, end = self._range(start, end)
+        with self._lock:
+            self._flush()
+            return self._db.execute(
+                "SELECT polled, modified FROM polls WHERE vin = ? AND polled >= ? AND polled < ? ORDER BY polled",
+                (vin, start, end),
+            ).fetchall()
+
+    def close(self):
+        """Write anything pending and close the status history."""
+        with self._lock:
+            self._flush()
+            self._db.close()
@@ -0,0 +1,138 @@
+"""FordPass vehicle client that shares its access token between runs through a protected file."""
+
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+import requests
+
+from fordpass import Vehicle
+
+from sessions import install_session_requests, new_session, using_session
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+# refresh_token is only kept by fordpass versions that refresh the access token
+_TOKEN_ATTRIBUTES = ["token", "expiresAt", "refresh_token"]
+
+# a cached token this close to expiring is not worth starting with
+_EXPIRY_MARGIN = 60
+
+# API calls made with the token, the ones the installed fordpass has are retried once after a 401
+_API_METHODS = ["status", "chargelogs", "triplogs", "plugstatus", "journeys", "journey_details"]
+
+_LOCK = threading.Lock()
+
+
+def use_fordpass_sessions():
+    """Make the requests fordpass makes during the calls of a CachedVehicle use the session of that client.
+
+    fordpass calls requests.get() and requests.post() without a timeout, a stalled FordPass server would hang
+    the caller for good.  Called once from main() after configure_sessions().
+    """
+    install_session_requests(sys.modules[Vehicle.__module__], "fordpass")
+
+
+def _read_tokens(filename):
+    """Tokens of every account in the cache file, empty if missing or unreadable."""
+    try:
+        with open(filename) as tokenFile:
+            tokens = json.load(tokenFile)
+    except (OSError, ValueError):
+        return {}
+    return tokens if isinstance(tokens, dict) else {}
+
+
+def _write_tokens(filename, tokens):
+    """Replace the cache file, readable by the owner only."""
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    temporary = f"{filename}.{os.getpid()}.tmp"
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as tokenFile:
+        json.dump(tokens, tokenFile)
+    os.replace(temporary, filename)
+
+
+class CachedVehicle(Vehicle):
+    """Class to reuse the FordPass access token of an account until it expires, across vehicles and tools.
+
+    A cached token can be revoked before it expires, when a call made with one is rejected with a 401 the
+    token is dropped from the cache and the call is made once more after logging in.  Each client has its own
+    session, used for the requests of its calls once use_fordpass_sessions() has been called.
+    """
+
+    def __init__(self, username, password, vin, cache_file="cache/token.json", session=None):
+        """Create the vehicle client, nothing is read until a token is needed."""
+        super().__init__(username=username, password=password, vin=vin)
+        self.session = session or new_session()
+        self._cache_file = os.path.expanduser(cache_file)
+        self.auth_time = None
+        self.auth_cached = None
+        for name in _API_METHODS:
+            method = getattr(self, name, None)
+            if method is not None:
+                setattr(self, name, functools.partial(self._call, method))
+
+    def _call(self, method, *args, **kwargs):
+        """Make an API call with the session of the client, logging in again if FordPass rejects the cached token."""
+        with using_session(self.session):
+            try:
+                return method(*args, **kwargs)
+            except requests.HTTPError as e:
+                if not self.auth_cached or e.response is None or e.response.status_code != 401:
+                    raise
+            _LOGGER.warning("FordPass rejected the cached token, logging in again")
+            self.invalidate()
+            return method(*args, **kwargs)
+
+    def invalidate(self):
+        """Forget the token, it is dropped from the cache unless another client has replaced it already."""
+        with _LOCK:
+            tokens = _read_tokens(self._cache_file)
+            cached = tokens.get(self.username)
+            if cached and cached.get("token") == self.token:
+                del tokens[self.username]
+                try:
+                    _write_tokens(self._cache_file, tokens)
+                except OSError as e:
+                    _LOGGER.warning(f"Unable to remove the FordPass token from '{self._cache_file}': {e}")
+            self.token = None
+            self.auth_cached = None
+
+    def auth(self):
+        """Use the cached token of the account if still valid, otherwise log in and cache the new token."""
+        started = time.perf_counter()
+        with _LOCK:
+            cached = _read_tokens(self._cache_file).get(self.username)
+            if cached and (cached.get("expiresAt") or 0) > time.time() + _EXPIRY_MARGIN:
+                for key in _TOKEN_ATTRIBUTES:
+                    if key in cached:
+                        setattr(self, key, cached.get(key))
+                self.auth_cached = True
+            else:
+                result = self._login()
+                tokens = _read_tokens(self._cache_file)
+                tokens[self.username] = {
+                    key: getattr(self, key) for key in _TOKEN_ATTRIBUTES if getattr(self, key, None) is not None
+                }
+                try:
+                    _write_tokens(self._cache_file, tokens)
+                except OSError as e:
+                    _LOGGER.warning(f"Unable to cache the FordPass token in '{self._cache_file}': {e}")
+                self.auth_cached = False
+        self.auth_time = time.perf_counter() - started
+        source = "cached token" if self.auth_cached else "login"
+        _LOGGER.info(f"FordPass authentication took {self.auth_time * 1000:.0f} ms ({source})")
+        return True if self.auth_cached else result
+
+    def _login(self):
+        """Full FordPass login."""
+        with using_session(self.session):
+            return super().auth()
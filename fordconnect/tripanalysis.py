@@ -0,0 +1,148 @@
+"""Path integrated distance, elevation and energy of a trip."""
+
+import logging
+import math
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from journeyanalytics import haversine
+from usgs_elevation import ElevationError
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+# the vehicle reports the state of charge in 0.5 % steps
+_SOC_STEP = 0.5
+
+# elevations are looked up at up to this many points spaced evenly along the path
+_ELEVATION_POINTS = 24
+_ELEVATION_WORKERS = 8
+
+
+class TripSamples:
+    """Class to collect the status reports seen while a trip is in progress."""
+
+    def __init__(self):
+        self.timestamp = []
+        self.odometer = []
+        self.soc = []
+        self.latitude = []
+        self.longitude = []
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def add(self, status):
+        """Add a status report, reports missing any of the values are skipped."""
+        sample = (status.modified, status.odometer, status.soc, status.latitude, status.longitude)
+        if None in sample:
+            return
+        if self.timestamp and sample[0] <= self.timestamp[-1]:
+            return
+        for values, value in zip((self.timestamp, self.odometer, self.soc, self.latitude, self.longitude), sample):
+            values.append(value)
+
+
+def path_distance(latitude, longitude):
+    """Cumulative distance in meters along a path."""
+    segments = haversine(latitude[:-1], longitude[:-1], latitude[1:], longitude[1:])
+    return np.concatenate(([0.0], np.cumsum(segments)))
+
+
+def elevation_profile(latitude, longitude, elevation, points=_ELEVATION_POINTS):
+    """Total climb and descent in meters along a path, None if the elevations are not available."""
+    if elevation is None or len(latitude) < 2:
+        return None
+    cumulative = path_distance(latitude, longitude)
+    stops = np.linspace(0.0, cumulative[-1], min(points, len(latitude)))
+    lats = np.interp(stops, cumulative, latitude)
+    lons = np.interp(stops, cumulative, longitude)
+    try:
+        with ThreadPoolExecutor(max_workers=_ELEVATION_WORKERS, thread_name_prefix="elevation") as executor:
+            heights = np.array(list(executor.map(elevation.elevation, lats, lons)), dtype=np.float64)
+    except ElevationError as e:
+        _LOGGER.warning(f"Unable to look up the trip elevations: {e}")
+        return None
+    steps = np.diff(heights)
+    return {
+        "climb": float(steps[steps > 0].sum()),
+        "descent": float(-steps[steps < 0].sum()),
+        "net": float(heights[-1] - heights[0]),
+    }
+
+
+def soc_used(samples):
+    """Percent of charge used, its error bound and the method that gave them, using every state of charge
+    sample of the trip.
+
+    The end points give the charge used to within one 0.5 % step (each reading is within half a step).
+    With three or more samples a least squares fit of the state of charge against the odometer averages
+    out the steps, its slope is used with a bound of three standard errors of the fit, but only when that
+    bound is tighter than the end point step.  The method is "fit" or "end points".
+    """
+    odometer = np.asarray(samples.odometer, dtype=np.float64)
+    soc = np.asarray(samples.soc, dtype=np.float64)
+    distance = odometer[-1] - odometer[0]
+    used = soc[0] - soc[-1]
+    bound = _SOC_STEP
+    method = "end points"
+
+    if len(soc) >= 3 and distance > 0 and np.ptp(odometer) > 0:
+        x = odometer - odometer.mean()
+        slope = float((x * (soc - soc.mean())).sum() / (x * x).sum())
+        residuals = soc - soc.mean() - slope * x
+        # quantization noise of each reading plus the scatter around the fit
+        variance = max(_SOC_STEP ** 2 / 12, float((residuals * residuals).sum()) / max(len(soc) - 2, 1))
+        fittedBound = 3.0 * math.sqrt(variance / float((x * x).sum())) * distance
+        if fittedBound < bound:
+            used, bound, method = -slope * distance, fittedBound, "fit"
+    return used, bound, method
+
+
+def analyze_trip(samples, capacity, locations=None, elevation=None):
+    """Distance, climb, descent and energy of a trip.
+
+    'samples' are the TripSamples of the trip, 'capacity' the usable battery size in kWh and
+    'locations' the optional journey locations (dicts with latitude and longitude) of the trip.
+    Distances are in meters and energies in kWh.
+    """
+    if locations:
+        latitude = np.fromiter((location.get("latitude") for location in locations), dtype=np.float64)
+        longitude = np.fromiter((location.get("longitude") for location in locations), dtype=np.float64)
+        source = "journey"
+    else:
+        latitude = np.asarray(samples.latitude, dtype=np.float64)
+        longitude = np.asarray(samples.longitude, dtype=np.float64)
+        source = "status"
+
+    odometerDistance = (samples.odometer[-1] - samples.odometer[0]) * 1000 if len(samples) else 0.0
+    pathDistance = float(path_distance(latitude, longitude)[-1]) if len(latitude) > 1 else 0.0
+    # status positions are minutes apart and cut corners, never trust them over the odometer
+    if source == "status" and pathDistance < odometerDistance:
+        distance, source = odometerDistance, "odometer"
+    else:
+        distance = pathDistance
+
+    used, bound, method = soc_used(samples) if len(samples) >= 2 else (0.0, _SOC_STEP, "end points")
+    kwh = used * 0.01 * capacity
+    kwhError = bound * 0.01 * capacity
+    duration = samples.timestamp[-1] - samples.timestamp[0] if len(samples) >= 2 else 0.0
+
+    def per_kwh(energy):
+        return distance / energy if energy > 0 else None
+
+    return {
+        "distance": distance,
+        "distance_source": source,
+        "duration": duration,
+        "soc_samples": len(samples),
+        "soc_method": method,
+        "kwh": kwh,
+        "kwh_error": kwhError,
+        "per_kwh": per_kwh(kwh),
+        # least efficient first
+        "per_kwh_range": (per_kwh(kwh + kwhError), per_kwh(kwh - kwhError)),
+        "elevation": elevation_profile(latitude, longitude, elevation),
+    }
@@ -0,0 +1,175 @@
+"""Streaming trip detection from the statuses of a vehicle, polled live or read back from the status history."""
+
+from typing import NamedTuple
+
+from vehiclestatus import DRIVING_STATES
+
+# status history fields read to find trips, in TripPoint order after 'modified'
+_STORED_FIELDS = ["ignitionStatus", "odometer", "batteryFillLevel", "latitude", "longitude"]
+
+
+class TripPoint(NamedTuple):
+    """The parts of a status used to find and sample trips, times are epoch seconds and the odometer is in km."""
+
+    modified: float
+    ignition: str
+    odometer: float
+    soc: float
+    latitude: float
+    longitude: float
+
+    @classmethod
+    def from_status(cls, status):
+        """Point of a VehicleStatus."""
+        return cls(status.modified, status.ignition, status.odometer, status.soc, status.latitude, status.longitude)
+
+    def as_dict(self):
+        """Point as a dict that can be written as JSON."""
+        return self._asdict()
+
+
+class Trip(NamedTuple):
+    """Trip of a vehicle, 'points' run from the start to the end and 'inferred' is True if the ignition was not
+    seen going on and off, the trip was found from the odometer or ended by a gap in the statuses.
+
+    'timed' is False for a trip that started and ended between two statuses, it took some part of the
+    time between them so only the longest it could have taken is known.
+    """
+
+    vin: str
+    start: TripPoint
+    end: TripPoint
+    points: list
+    inferred: bool
+    timed: bool = True
+
+    @property
+    def distance(self):
+        """Odometer distance in km, None if not known."""
+        if self.start.odometer is None or self.end.odometer is None:
+            return None
+        return self.end.odometer - self.start.odometer
+
+    @property
+    def duration(self):
+        """Seconds from the first to the last status of the trip, None if not timed."""
+        return self.end.modified - self.start.modified if self.timed else None
+
+    @property
+    def max_duration(self):
+        """Longest the trip could have taken in seconds."""
+        return self.end.modified - self.start.modified
+
+    def as_dict(self):
+        """Trip as a dict that can be written as JSON, without the points in between."""
+        return {
+            "vin": self.vin,
+            "start": self.start.as_dict(),
+            "end": self.end.as_dict(),
+            "distance": self.distance,
+            "duration": self.duration,
+            "max_duration": self.max_duration,
+            "points": len(self.points),
+            "inferred": self.inferred,
+        }
+
+
+class TripDetector:
+    """Class to find the trips of a vehicle in its statuses, fed one at a time, oldest first.
+
+    A trip starts at the first status with the ignition on and ends at the next one with it off.  Statuses
+    can be minutes apart, so the odometer is checked as well: a distance of at least 'min_distance' km
+    between two statuses with the ignition off is a trip that started and ended between them, and when
+    more than 'max_gap' seconds pass between statuses during a trip the trip is ended at the last status
+    before the gap.
+    """
+
+    def __init__(self, vin, min_distance=0.5, max_gap=3600.0):
+        """Create the detector for a vehicle that is parked."""
+        self.vin = vin
+        self._min_distance = min_distance
+        self._max_gap = max_gap
+        self._points = None
+        self._last = None
+        self.trips = 0
+        self.inferred = 0
+
+    @property
+    def driving(self):
+        """True while a trip is in progress."""
+        return self._points is not None
+
+    @property
+    def started(self):
+        """First point of the trip in progress, None when parked."""
+        return self._points[0] if self._points else None
+
+    def _end(self, point, inferred):
+        """Finish the trip in progress at a point."""
+        if self._points[-1] is not point:
+            self._points.append(point)
+        trip = Trip(self.vin, self._points[0], point, self._points, inferred)
+        self._points = None
+        self.trips += 1
+        self.inferred += inferred
+        return trip
+
+    def _moved(self, previous, point):
+        """True if the odometer shows a trip between two statuses."""
+        if previous.odometer is None or point.odometer is None:
+            return False
+        return point.odometer - previous.odometer >= self._min_distance
+
+    def update(self, status):
+        """Add the next status (a VehicleStatus or TripPoint), returns the trips it ended and the point a trip
+        started at, None if no trip started."""
+        point = status if isinstance(status, TripPoint) else TripPoint.from_status(status)
+        last = self._last
+        if point.modified is None or last is not None and point.modified <= last.modified:
+            return [], None
+        self._last = point
+
+        ended = []
+        driving = point.ignition in DRIVING_STATES
+        gap = last is not None and point.modified - last.modified > self._max_gap
+        if self._points is not None:
+            if not driving:
+                return [self._end(point, inferred=gap)], None
+            if not gap:
+                self._points.append(point)
+                return ended, None
+            # lost sight of the vehicle during the trip, it ended somewhere in the gap
+            ended.append(self._end(last, inferred=True))
+
+        if driving:
+            self._points = [point]
+            return ended, point
+        if last is not None and self._moved(last, point):
+            # the ignition was off both times but the vehicle moved, the whole trip fell between the statuses
+            ended.append(Trip(self.vin, last, point, [last, point], True, timed=False))
+            self.trips += 1
+            self.inferred += 1
+        return ended, None
+
+    def feed(self, statuses):
+        """Add statuses or trip points oldest first, returns the trips they ended."""
+        trips = []
+        for status in statuses:
+            trips.extend(self.update(status)[0])
+        return trips
+
+
+def stored_points(store, vin, start=None, end=None):
+    """Trip points of the statuses of a vehicle in the status history last modified in [start, end), oldest first."""
+    return [
+        TripPoint(
+            status.get("modified"),
+            status.get("ignitionStatus"),
+            status.get("odometer"),
+            status.get("batteryFillLevel"),
+            status.get("latitude"),
+            status.get("longitude"),
+        )
+        for status in store.statuses(vin, start, end, fields=_STORED_FIELDS)
+    ]
+
@@ -0,0 +1,93 @@
+"""Rebuild the trips of the monitored vehicles from the status history"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+import version
+import logfiles
+from readconfig import read_config
+from statusstore import StatusStore
+from tripdetector import TripDetector, stored_points
+from utilities import epoch_to_datetime
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+
+def log_trip(trip):
+    """Log a single trip."""
+    departed = epoch_to_datetime(trip.start.modified, useUTC=False).strftime('%Y-%m-%d %H:%M')
+    distance = "unknown" if trip.distance is None else f"{trip.distance:.1f} km"
+    if trip.timed:
+        duration = f"{trip.duration / 60:.0f} minutes"
+    else:
+        duration = f"at most {trip.max_duration / 60:.0f} minutes"
+    inferred = ", found from the odometer" if trip.inferred else ""
+    _LOGGER.info(f"{departed}: {duration}, {distance}{inferred}")
+
+
+def rebuild_trips(store, vin, start=None):
+    """Trips of a vehicle found in the status history since 'start' (epoch seconds), and the statuses read."""
+    points = stored_points(store, vin, start=start)
+    detector = TripDetector(vin)
+    trips = detector.feed(points)
+    if detector.driving:
+        _LOGGER.info(f"A trip that started {epoch_to_datetime(detector.started.modified, useUTC=False)} is still in progress")
+    return trips, len(points)
+
+
+def main():
+    """Set up and rebuild the trip history."""
+
+    parser = argparse.ArgumentParser(description="Rebuild the trips of the vehicles from the status history")
+    parser.add_argument("--days", type=float, help="only the last this many days")
+    parser.add_argument("--output", metavar="FILE", help="write the trips as JSON lines")
+    parser.add_argument("--quiet", action="store_true", help="only log the totals")
+    args = parser.parse_args()
+
+    logfiles.create_application_log(_LOGGER)
+    _LOGGER.info(f"Ford Connect trip history utility {version.get_version()}")
+
+    config = read_config()
+    if not config:
+        _LOGGER.error("Error processing YAML configuration - exiting")
+        return
+
+    start = int(time.time() - args.days * 86400) if args.days else None
+    store = StatusStore(config.get('history').get('store_file'))
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    try:
+        for vin in config.get('fordconnect').get('vins'):
+            started = time.perf_counter()
+            trips, statuses = rebuild_trips(store, vin, start)
+            elapsed = time.perf_counter() - started
+
+            _LOGGER.info(f"Trips of VIN {vin}:")
+            if not args.quiet:
+                for trip in trips:
+                    log_trip(trip)
+            distance = sum(trip.distance or 0.0 for trip in trips)
+            inferred = sum(trip.inferred for trip in trips)
+            _LOGGER.info(
+                f"{len(trips)} trips ({inferred} found from the odometer), {distance:.0f} km, "
+                f"rebuilt from {statuses} statuses in {elapsed:.2f} s"
+            )
+            if output:
+                for trip in trips:
+                    output.write(json.dumps(trip.as_dict(), separators=(",", ":")))
+                    output.write("\n")
+    finally:
+        store.close()
+        if output:
+            output.close()
+
+
+if __name__ == "__main__":
+    # make sure we can run this
+    if sys.version_info[0] >= 3 and sys.version_info[1] >= 9:
+        main()
+    else:
+        print("python 3.9 or newer required")
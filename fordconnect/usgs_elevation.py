@@ -1,5 +1,21 @@
+import logging
 import requests
 import sys
+import threading
+import time
+
+from concurrent.futures import Future
+
+from gridcache import GridCache
+from metrics import ELEVATION_TIME
+from sessions import get_session, request_timeout
+
+
+_LOGGER = logging.getLogger("fordconnect")
+
+
+class ElevationError(Exception):
+    """Elevation lookup failed."""
 
 
 # convert meters to feet
@@ -8,28 +24,120 @@ def m_toft(m):
 
 
 # retrieve USGS altitude
-def usgs_alt(lat, lon):
+def usgs_alt(lat, lon, session=None, timeout=None):
     url = "http://nationalmap.gov/epqs/pqs.php"
     params = {"x": lon, "y": lat, "units": "Meters", "output": "json"}
+    session = session or get_session("usgs")
     try:
-        r = requests.get(url, params=params)
+        r = session.get(url, params=params, timeout=timeout or request_timeout())
     except requests.exceptions.RequestException as e:
-        print(e)
-        sys.exit(1)
-    if r.status_code == 200:
-        try:
-            data = r.json()
-        except e:
-            print(e)
-            sys.exit(1)
+        raise ElevationError(f"USGS elevation request failed: {e}") from e
+    if r.status_code != 200:
+        raise ElevationError(f"USGS elevation request failed: {r.status_code}")
 
+    try:
+        data = r.json()
         alt = float(data["USGS_Elevation_Point_Query_Service"]["Elevation_Query"]["Elevation"])
-        # print(f"USGS alt: {alt:.1f} m, {m_toft(alt):.1f} ft")
-        return alt
+    except (ValueError, KeyError, TypeError) as e:
+        raise ElevationError(f"Unexpected USGS elevation response: {e}") from e
+    # print(f"USGS alt: {alt:.1f} m, {m_toft(alt):.1f} ft")
+    return alt
+
+
+class ElevationService:
+    """Class to memoize elevation lookups on a grid, concurrent requests for a grid cell share one fetch."""
+
+    def __init__(self, cache=None, precision=4, fetch=usgs_alt):
+        """Create the service, 'cache' is an optional GridCache using the same precision."""
+        self._cache = cache
+        self._scale = 10 ** precision
+        self._fetch = fetch
+        self._memo = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.hits = 0
+
+    def elevation(self, lat, lon):
+        """Elevation in meters of the grid cell containing a location, raises ElevationError on failure."""
+        started = time.perf_counter()
+        cell = (int(round(float(lat) * self._scale)), int(round(float(lon) * self._scale)))
+        with self._lock:
+            if cell in self._memo:
+                self.hits += 1
+                alt = self._memo[cell]
+                ELEVATION_TIME.observe(time.perf_counter() - started, "memory")
+                return alt
+            future = self._inflight.get(cell)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[cell] = future
+            else:
+                self.hits += 1
+
+        if not owner:
+            alt = future.result()
+            ELEVATION_TIME.observe(time.perf_counter() - started, "memory")
+            return alt
+
+        try:
+            latitude = cell[0] / self._scale
+            longitude = cell[1] / self._scale
+            alt = self._cache.get(latitude, longitude) if self._cache else None
+            source = "cache"
+            if alt is None:
+                self.fetches += 1
+                alt = self._fetch(lat=latitude, lon=longitude)
+                if self._cache:
+                    self._cache.put(latitude, longitude, alt)
+                source = "usgs"
+            else:
+                self.hits += 1
+            ELEVATION_TIME.observe(time.perf_counter() - started, source)
+            with self._lock:
+                self._memo[cell] = alt
+            future.set_result(alt)
+            return alt
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[cell]
+
+    def elevation_change(self, start, end):
+        """Change in elevation in meters between two (lat, lon) locations, None if unavailable."""
+        try:
+            return self.elevation(*end) - self.elevation(*start)
+        except ElevationError as e:
+            _LOGGER.warning(f"{e}")
+            return None
+
+    def stats(self):
+        """Lookup counters for the service."""
+        return {"hits": self.hits, "fetches": self.fetches, "cells": len(self._memo)}
+
+
+def create_elevation_service(options):
+    """Create the elevation service from the 'elevation' options."""
+    cache = None
+    if options.get('cache_file'):
+        cache = GridCache(
+            filename=options.get('cache_file'),
+            table="elevation",
+            precision=options.get('cache_precision'),
+            max_entries=options.get('cache_max_entries'),
+        )
+    return ElevationService(cache=cache, precision=options.get('cache_precision'))
 
 
 def main():
-    usgs_alt(42.955701, -76.921108)
+    try:
+        print(f"USGS alt: {usgs_alt(42.955701, -76.921108):.1f} m")
+    except ElevationError as e:
+        print(e)
+        sys.exit(1)
 
 
 if __name__ == "__main__":
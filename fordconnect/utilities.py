@@ -1,22 +1,112 @@
 """Helper code"""
 
 import logging
-from datetime import datetime
+from array import array
+from datetime import date, datetime
+from functools import lru_cache
 from dateutil import tz
 
 
 _LOGGER = logging.getLogger("fordconnect")
 
+# built once, tzlocal() reads the system zone information every time it is created
+_UTC = tz.tzutc()
+_LOCAL = tz.tzlocal()
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_NAN = float("nan")
+
+
+def _is_fixed_format(fordTimeString):
+    """True if the string looks like 'MM-DD-YYYY HH:MM:SS' with optional fractional seconds."""
+    s = fordTimeString
+    return (
+        19 <= len(s) <= 26
+        and s[2] == s[5] == "-"
+        and s[13] == s[16] == ":"
+        and s[10] == " "
+        and (len(s) == 19 or (s[19] == "." and s[20:].isdigit()))
+    )
+
+
+@lru_cache(maxsize=64)
+def _day_epoch(day):
+    """Seconds since the epoch at the start of a 'MM-DD-YYYY' day."""
+    return (date(int(day[6:10]), int(day[0:2]), int(day[3:5])).toordinal() - _EPOCH_ORDINAL) * 86400
+
+
+@lru_cache(maxsize=1024)
+def _minute_epoch(minute):
+    """Seconds since the epoch at the start of a 'MM-DD-YYYY HH:MM' minute, timestamps in a list share most minutes."""
+    hours, minutes = int(minute[11:13]), int(minute[14:16])
+    if hours > 23 or minutes > 59:
+        raise ValueError(f"time out of range: '{minute}'")
+    return _day_epoch(minute[:10]) + hours * 3600 + minutes * 60
+
+
+@lru_cache(maxsize=256)
+def _parse_utc(fordTimeString):
+    """Parse a Ford UTC time string, the same few strings are parsed again and again while polling."""
+    if _is_fixed_format(fordTimeString):
+        s = fordTimeString
+        try:
+            return datetime(
+                int(s[6:10]),
+                int(s[0:2]),
+                int(s[3:5]),
+                int(s[11:13]),
+                int(s[14:16]),
+                int(s[17:19]),
+                int(s[20:].ljust(6, "0")) if len(s) > 20 else 0,
+                tzinfo=_UTC,
+            )
+        except ValueError:
+            pass
 
-def fordtime_to_datetime(fordTimeString, useUTC=True):
-    """Convert Ford UTC time string to local datetime object"""
-    from_zone = tz.tzutc()
-    to_zone = tz.tzlocal()
     try:
         utc_dt = datetime.strptime(fordTimeString, "%m-%d-%Y %H:%M:%S.%f")
-    except:
+    except ValueError:
         utc_dt = datetime.strptime(fordTimeString, "%m-%d-%Y %H:%M:%S")
-    utc = utc_dt.replace(tzinfo=from_zone)
+    return utc_dt.replace(tzinfo=_UTC)
+
+
+def fordtime_to_datetime(fordTimeString, useUTC=True):
+    """Convert Ford UTC time string to local datetime object"""
+    utc = _parse_utc(fordTimeString)
     if useUTC:
         return utc
-    return utc.astimezone(to_zone)
+    return utc.astimezone(_LOCAL)
+
+
+def fordtime_to_epoch(fordTimeString):
+    """Convert Ford UTC time string to seconds since the epoch"""
+    s = fordTimeString
+    if _is_fixed_format(s):
+        try:
+            seconds = int(s[17:19])
+            if seconds < 60:
+                seconds += _minute_epoch(s[:16])
+                return seconds + int(s[20:]) / 10 ** (len(s) - 20) if len(s) > 20 else float(seconds)
+        except ValueError:
+            pass
+    return _parse_utc(s).timestamp()
+
+
+def epoch_to_datetime(epoch, useUTC=True):
+    """Convert seconds since the epoch to a UTC or local datetime object"""
+    utc = datetime.fromtimestamp(epoch, tz=_UTC)
+    if useUTC:
+        return utc
+    return utc.astimezone(_LOCAL)
+
+
+def fordtimes_to_epochs(fordTimeStrings):
+    """Convert Ford UTC time strings to an array of seconds since the epoch, NaN for missing or malformed times"""
+    epochs = array("d")
+    append = epochs.append
+    for s in fordTimeStrings:
+        try:
+            append(fordtime_to_epoch(s))
+        except (TypeError, ValueError):
+            append(_NAN)
+    return epochs
@@ -0,0 +1,245 @@
+"""Vehicle status parsed once from a FordPass status payload, the fields read on every poll as attributes."""
+
+import json
+import threading
+import zlib
+
+from utilities import fordtime_to_epoch
+
+
+def _value(payload, path):
+    """Value at a path in the payload, None if any part is missing."""
+    value = payload
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _number(value):
+    """Float of a number or numeric string, None if missing or not a number."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _epoch(value):
+    """Ford UTC time string to seconds since the epoch, None if missing or malformed."""
+    try:
+        return fordtime_to_epoch(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _StateNames:
+    """Class to share one copy of each state string between every status."""
+
+    def __init__(self):
+        self.names = {}
+        self._lock = threading.Lock()
+
+    def name(self, value):
+        """Shared copy of a state string, anything that is not a string is kept as is."""
+        if not isinstance(value, str):
+            return value
+        name = self.names.get(value)
+        if name is None:
+            with self._lock:
+                name = self.names.setdefault(value, value)
+        return name
+
+
+class _RestOfPayload:
+    """Class to keep the rest of each payload as compressed JSON, a rest equal to a recent one shares its copy."""
+
+    _RECENT = 8
+
+    def __init__(self):
+        self._recent = []
+        self._lock = threading.Lock()
+
+    def compress(self, rest):
+        """Compressed JSON of the rest of a payload."""
+        with self._lock:
+            for recent, compressed in self._recent:
+                if recent == rest:
+                    return compressed
+        compressed = zlib.compress(json.dumps(rest, separators=(",", ":"), default=str).encode("utf-8"))
+        with self._lock:
+            self._recent = [(rest, compressed)] + self._recent[: self._RECENT - 1]
+        return compressed
+
+
+def _without(value, parsed):
+    """Copy of a part of the payload without the parsed paths and the timestamps, parts left empty are dropped."""
+    rest = {}
+    for key, item in value.items():
+        skip = parsed.get(key)
+        if skip is True or key in _IGNORED_KEYS:
+            continue
+        if type(item) is dict:
+            item = _without(item, skip or _NOTHING_PARSED)
+            if not item:
+                continue
+        rest[key] = item
+    return rest
+
+
+# 'Off', 'Start', 'Run'
+DRIVING_STATES = ["Start", "Run"]
+
+# 'NotReady', 'ChargingAC', 'ChargeTargetReached', 'ChargeStartCommanded', 'ChargeStopCommanded'
+CHARGING_STATES = ["ChargingAC", "ChargingDC"]
+
+# name -> path in the payload and how the value is converted
+NUMBER_FIELDS = [
+    ("modified", ("lastModifiedDate",), _epoch),
+    ("server_time", ("serverTime",), _epoch),
+    ("odometer", ("odometer", "value"), _number),
+    ("dte", ("elVehDTE", "value"), _number),
+    ("soc", ("batteryFillLevel", "value"), _number),
+    ("battery_volts", ("battery", "batteryStatusActual", "value"), _number),
+    ("latitude", ("gps", "latitude"), _number),
+    ("longitude", ("gps", "longitude"), _number),
+    ("left_front_tire", ("TPMS", "leftFrontTirePressure", "value"), _number),
+    ("right_front_tire", ("TPMS", "rightFrontTirePressure", "value"), _number),
+    ("left_rear_tire", ("TPMS", "outerLeftRearTirePressure", "value"), _number),
+    ("right_rear_tire", ("TPMS", "outerRightRearTirePressure", "value"), _number),
+    ("plug", ("plugStatus", "value"), _number),
+    ("remote_start", ("remoteStartStatus", "value"), _number),
+    ("deep_sleep", ("deepSleepInProgress", "value"), _number),
+]
+
+STATE_FIELDS = [
+    ("ignition", ("ignitionStatus", "value")),
+    ("charging", ("chargingStatus", "value")),
+    ("lock", ("lockStatus", "value")),
+    ("alarm", ("alarm", "value")),
+    ("battery_health", ("battery", "batteryHealth", "value")),
+]
+
+# kept as they are, strings shared like the states
+VALUE_FIELDS = [
+    ("battery_perf", ("batteryPerfStatus", "value")),
+    ("battery_charge", ("batteryChargeStatus", "value")),
+    ("charge_start_time", ("chargeStartTime", "value")),
+    ("charge_end_time", ("chargeEndTime", "value")),
+    ("firmware_upgrade", ("firmwareUpgInProgress", "value")),
+    ("alarm_event", ("PrmtAlarmEvent", "value")),
+    ("preconditioning", ("preCondStatusDsply", "value")),
+    ("tire_pressure", ("tirePressure", "value")),
+    ("oil_life", ("oil", "oilLife")),
+    ("oil_life_actual", ("oil", "oilLifeActual")),
+    ("fast_charge_bulk", ("dcFastChargeData", "fstChrgBulkTEst", "value")),
+    ("fast_charge_complete", ("dcFastChargeData", "fstChrgCmpltTEst", "value")),
+    ("low_charge_threshold", ("batteryTracLowChargeThreshold", "value")),
+    ("low_charge_display", ("battTracLoSocDDsply", "value")),
+]
+
+# keys at any depth that change with every status without the vehicle changing
+_IGNORED_KEYS = frozenset(["timestamp"])
+
+
+def _parsed_paths():
+    """Tree of the payload paths parsed into fields, True marks a parsed item."""
+    tree = {"vin": True}
+    for path in [path for _, path, _ in NUMBER_FIELDS] + [path for _, path in STATE_FIELDS + VALUE_FIELDS]:
+        node = tree
+        for key in path[:-1]:
+            node = node.setdefault(key, {})
+        node[path[-1]] = True
+    return tree
+
+
+_PARSED = _parsed_paths()
+_NOTHING_PARSED = {}
+_NAMES = _StateNames()
+_REST = _RestOfPayload()
+
+
+class VehicleStatus:
+    """Class to hold a vehicle status, parsed once when it is polled.
+
+    The fields used on every poll are plain attributes: numbers as floats (None if the payload did not have
+    them) and states as strings shared between statuses.  The rest of the payload (doors, windows, remote start
+    and anything not parsed) is kept as compressed JSON without the timestamps, shared by the statuses where it
+    did not change, and is reached through rest_dict() or path().
+    """
+
+    __slots__ = (
+        ["vin", "rest"]
+        + [name for name, _, _ in NUMBER_FIELDS]
+        + [name for name, _ in STATE_FIELDS]
+        + [name for name, _ in VALUE_FIELDS]
+    )
+
+    @classmethod
+    def from_payload(cls, payload):
+        """Parse a status payload, None stays None."""
+        if payload is None:
+            return None
+        if isinstance(payload, VehicleStatus):
+            return payload
+        status = cls.__new__(cls)
+        try:
+            _parse_fast(status, payload)
+        except (KeyError, TypeError, ValueError):
+            _parse_slow(status, payload)
+        status.rest = _REST.compress(_without(payload, _PARSED))
+        return status
+
+    def rest_dict(self):
+        """The rest of the payload, decompressed on each call."""
+        return json.loads(zlib.decompress(self.rest))
+
+    def path(self, *keys):
+        """Item at a path in the rest of the payload, None if any part is missing."""
+        return _value(self.rest_dict(), keys)
+
+    def as_dict(self):
+        """Typed fields as a dict, for writing out without the rest of the payload."""
+        fields = {"vin": self.vin}
+        for name, _, _ in NUMBER_FIELDS:
+            fields[name] = getattr(self, name)
+        for name, _ in STATE_FIELDS + VALUE_FIELDS:
+            fields[name] = getattr(self, name)
+        return fields
+
+    @property
+    def tire_pressures(self):
+        """Tire pressures in kPa, left front, right front, left rear and right rear."""
+        return [self.left_front_tire, self.right_front_tire, self.left_rear_tire, self.right_rear_tire]
+
+
+def _parse_slow(status, payload):
+    """Parse a payload missing part of the expected layout or with a state not seen before."""
+    status.vin = payload.get("vin")
+    for name, path, convert in NUMBER_FIELDS:
+        setattr(status, name, convert(_value(payload, path)))
+    for name, path in STATE_FIELDS + VALUE_FIELDS:
+        setattr(status, name, _NAMES.name(_value(payload, path)))
+
+
+def _compile():
+    """Generate a single function that parses a payload with the full layout and only known states."""
+    namespace = {"epoch": fordtime_to_epoch, "number": float, "names": _NAMES.names, "name": _NAMES.name}
+    lines = ["def parse(status, payload):", "    status.vin = payload.get('vin')"]
+    for name, path, convert in NUMBER_FIELDS:
+        access = "payload" + "".join(f"[{key!r}]" for key in path)
+        lines.append(f"    status.{name} = {'epoch' if convert is _epoch else 'number'}({access})")
+    for name, path in STATE_FIELDS:
+        # a state not seen before is a KeyError, the slow path adds it
+        access = "payload" + "".join(f"[{key!r}]" for key in path)
+        lines.append(f"    status.{name} = names[{access}]")
+    for name, path in VALUE_FIELDS:
+        access = "payload" + "".join(f"[{key!r}]" for key in path)
+        lines.append(f"    status.{name} = name({access})")
+    exec("\n".join(lines), namespace)
+    return namespace["parse"]
+
+
+_parse_fast = _compile()
@@ -1,7 +1,8 @@
 """
 Gets the current version number.
-If in a git repository, it is the current git tag.
-Otherwise it is the one contained in the PKG-INFO file.
+The version is written to _version.py when the package is built or installed,
+otherwise it comes from the installed package metadata and, as a last resort
+in a git checkout, from the current git tag.
 To use this script, simply import it in your setup.py file
 and use the results of get_version() as your package version:
     from version import *
@@ -13,8 +14,9 @@ and use the results of get_version() as your package version:
 """
 # This program is placed into the public domain.
 
-__all__ = "get_version"
+__all__ = ["get_version", "write_version_file"]
 
+from functools import lru_cache
 from os.path import dirname, isdir, join
 from pathlib import Path
 import os
@@ -23,8 +25,37 @@ import subprocess
 
 version_re = re.compile("^Version: (.+)$", re.M)
 
+_VERSION_FILE = join(dirname(__file__), "_version.py")
+_DISTRIBUTION = "fordconnect"
 
+
+def write_version_file(version):
+    """Record the version at build or install time."""
+    with open(_VERSION_FILE, "w") as fh:
+        fh.write(f'__version__ = "{version}"\n')
+
+
+@lru_cache(maxsize=None)
 def get_version():
+    """Get the version number, the git tag is only used when nothing cheaper is available."""
+    try:
+        from _version import __version__
+
+        return __version__
+    except ImportError:
+        pass
+
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+
+        return version(_DISTRIBUTION)
+    except (ImportError, PackageNotFoundError):
+        pass
+
+    return get_git_version()
+
+
+def get_git_version():
     """Get a version number for a tag."""
     # Assume we find no tags
     version = "unknown"
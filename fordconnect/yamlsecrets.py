@@ -0,0 +1,148 @@
+"""Custom YAML file loader with !secrets support."""
+
+import logging
+import os
+
+from pathlib import Path
+
+from collections import OrderedDict
+from typing import Dict, List, TextIO, TypeVar, Union
+
+import yaml
+
+from readconfig import ConfigError
+
+
+SECRET_YAML = "secrets.yaml"
+SECRET_TAG = "!secret"
+
+JSON_TYPE = Union[List, Dict, str]  # pylint: disable=invalid-name
+DICT_T = TypeVar("DICT_T", bound=Dict)  # pylint: disable=invalid-name
+__SECRET_CACHE: Dict[str, JSON_TYPE] = {}
+_LOGGER = logging.getLogger("fordconnect")
+
+
+class FullLineLoader(yaml.FullLoader):
+    """Loader class that keeps track of line numbers."""
+
+    def compose_node(self, parent: yaml.nodes.Node, index: int) -> yaml.nodes.Node:
+        """Annotate a node with the first line it was seen."""
+        last_line: int = self.line
+        node: yaml.nodes.Node = super().compose_node(parent, index)
+        node.__line__ = last_line + 1  # type: ignore
+        return node
+
+
+def load_yaml(fname: str) -> JSON_TYPE:
+    """Load a YAML file."""
+    try:
+        with open(fname, encoding="utf-8") as conf_file:
+            return parse_yaml(conf_file)
+    except UnicodeDecodeError as exc:
+        _LOGGER.error("Unable to read file %s: %s", fname, exc)
+        raise ConfigError(exc) from exc
+
+
+def parse_yaml(content: Union[str, TextIO]) -> JSON_TYPE:
+    """Load a YAML file."""
+    try:
+        # If configuration file is empty YAML returns None
+        # We convert that to an empty dict
+        return yaml.load(content, Loader=FullLineLoader) or OrderedDict()
+    except yaml.YAMLError as exc:
+        _LOGGER.error(str(exc))
+        raise ConfigError(exc) from exc
+
+
+def _load_secret_yaml(secret_path: str) -> JSON_TYPE:
+    """Load the secrets yaml from path."""
+    secret_path = os.path.join(secret_path, SECRET_YAML)
+    if secret_path in __SECRET_CACHE:
+        return __SECRET_CACHE[secret_path]
+
+    logging.debug("Loading %s", secret_path)
+    try:
+        secrets = load_yaml(secret_path)
+        if not isinstance(secrets, dict):
+            raise ConfigError("Secrets is not a dictionary")
+
+    except FileNotFoundError:
+        secrets = {}
+
+    __SECRET_CACHE[secret_path] = secrets
+    return secrets
+
+
+def resolve_secret(name: str, secret_path: str) -> JSON_TYPE:
+    """Value of a secret in the secrets.yaml of a folder, or of the folders above it up to the home folder."""
+    home_path = str(Path.home())
+    do_walk = os.path.commonpath([secret_path, home_path]) == home_path
+
+    while True:
+        secrets = _load_secret_yaml(secret_path)
+        if name in secrets:
+            _LOGGER.debug(
+                "Secret %s retrieved from secrets.yaml in folder %s",
+                name,
+                secret_path,
+            )
+            return secrets[name]
+
+        if not do_walk or (secret_path == home_path):
+            break
+        secret_path = os.path.dirname(secret_path)
+
+    raise ConfigError(f"Secret '{name}' not defined")
+
+
+def secret_yaml(loader: FullLineLoader, node: yaml.nodes.Node) -> JSON_TYPE:
+    """Load secrets and embed it into the configuration YAML."""
+    if os.path.basename(loader.name) == SECRET_YAML:
+        _LOGGER.error("secrets.yaml: attempt to load secret from within secrets file")
+        raise ConfigError("secrets.yaml: attempt to load secret from within secrets file")
+    return resolve_secret(node.value, os.path.dirname(loader.name))
+
+
+# registered once, the first time a configuration file has to be parsed
+yaml.FullLoader.add_constructor(SECRET_TAG, secret_yaml)
+
+
+class SecretNameLoader(FullLineLoader):
+    """Loader class that keeps the name of each secret instead of its value, as {'!secret': name}."""
+
+
+def secret_name(loader: SecretNameLoader, node: yaml.nodes.Node) -> JSON_TYPE:
+    """Placeholder for a secret, replaced by resolve_secrets()."""
+    return {SECRET_TAG: node.value}
+
+
+SecretNameLoader.add_constructor(SECRET_TAG, secret_name)
+
+
+def load_config_yaml(filename: str) -> JSON_TYPE:
+    """Parse the configuration file, leaving the !secret values as placeholders."""
+    try:
+        with open(filename, encoding="utf-8") as conf_file:
+            return yaml.load(conf_file, Loader=SecretNameLoader) or OrderedDict()
+    except UnicodeDecodeError as exc:
+        _LOGGER.error("Unable to read file %s: %s", filename, exc)
+        raise ConfigError(exc) from exc
+    except yaml.YAMLError as exc:
+        _LOGGER.error(str(exc))
+        raise ConfigError(exc) from exc
+
+
+def resolve_secrets(value: JSON_TYPE, secret_path: str) -> JSON_TYPE:
+    """Replace the placeholders in parsed configuration with the values of the secrets."""
+    if isinstance(value, dict):
+        if len(value) == 1 and SECRET_TAG in value:
+            return resolve_secret(value[SECRET_TAG], secret_path)
+        return {key: resolve_secrets(item, secret_path) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_secrets(item, secret_path) for item in value]
+    return value
+
+
+def secret_files():
+    """Every secrets.yaml consulted so far, including the ones that do not exist."""
+    return list(__SECRET_CACHE.keys())
@@ -1,11 +1,36 @@
+import os
+import sys
+
 from setuptools import setup
+from setuptools.command.build_py import build_py
+from setuptools.command.develop import develop
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fordconnect'))
+from version import write_version_file  # noqa: E402
+
+VERSION = '0.2.8'
 
 with open('README.md', 'r') as fh:
     long_description = fh.read()
 
+
+# the tools read the version from fordconnect/_version.py instead of running git at startup, it is only
+# written when the package is built or installed, not when setup.py is run for its metadata
+class BuildWithVersion(build_py):
+    def run(self):
+        write_version_file(VERSION)
+        super().run()
+
+
+class DevelopWithVersion(develop):
+    def run(self):
+        write_version_file(VERSION)
+        super().run()
+
+
 setup(
     name='fordconnect',
-    version='0.2.8',
+    version=VERSION,
     author='sillygoose',
     author_email='sillygoose@me.com',
     description='Python examples for accessing FordPass status, trips, and charging queries.',
@@ -23,7 +48,8 @@ setup(
         'python-dateutil',
         'fordpass',
         'pygeocodio',
-        'python-configuration',
         'pyyaml',
-    ]
+        'numpy',
+    ],
+    cmdclass={'build_py': BuildWithVersion, 'develop': DevelopWithVersion},
 )
@@ -0,0 +1,6 @@
+"""The tools import each other as top level modules, run the tests the same way."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fordconnect"))
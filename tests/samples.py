@@ -0,0 +1,49 @@
+"""Status payloads shared by the tests."""
+
+import copy
+
+from datetime import datetime, timezone
+
+
+# 2021-09-12 00:00:00 UTC
+EPOCH = 1631404800
+
+_STATUS = {
+    "vin": "1234567890",
+    "ignitionStatus": {"value": "Off"},
+    "odometer": {"value": 3042.0},
+    "elVehDTE": {"value": 311.3},
+    "batteryFillLevel": {"value": 88.5},
+    "battery": {"batteryHealth": {"value": "STATUS_GOOD"}, "batteryStatusActual": {"value": 13.7}},
+    "gps": {"latitude": "42.955701", "longitude": "-76.921108"},
+    "lockStatus": {"value": "LOCKED"},
+    "alarm": {"value": "SET"},
+    "chargingStatus": {"value": "NotReady"},
+    "plugStatus": {"value": 0},
+    "deepSleepInProgress": {"value": False},
+    "remoteStartStatus": {"value": 0},
+    "TPMS": {
+        "leftFrontTirePressure": {"value": "262"},
+        "rightFrontTirePressure": {"value": "258"},
+        "outerLeftRearTirePressure": {"value": "256"},
+        "outerRightRearTirePressure": {"value": "258"},
+    },
+    "doorStatus": {"driverDoor": {"value": "Closed"}, "passengerDoor": {"value": "Closed"}},
+}
+
+
+def fordtime(seconds):
+    """Ford UTC time string of 'seconds' after EPOCH."""
+    return datetime.fromtimestamp(EPOCH + seconds, tz=timezone.utc).strftime("%m-%d-%Y %H:%M:%S")
+
+
+def status_payload(modified=0, server_time=None, ignition="Off", charging="NotReady", sleep=False, odometer=3042.0):
+    """Status payload last modified 'modified' seconds after EPOCH, polled at 'server_time' (the same by default)."""
+    status = copy.deepcopy(_STATUS)
+    status["lastModifiedDate"] = fordtime(modified)
+    status["serverTime"] = fordtime(modified if server_time is None else server_time)
+    status["ignitionStatus"]["value"] = ignition
+    status["chargingStatus"]["value"] = charging
+    status["deepSleepInProgress"]["value"] = sleep
+    status["odometer"]["value"] = odometer
+    return status
@@ -0,0 +1,75 @@
+import pytest
+import requests
+
+from apicall import ApiCaller, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def failing(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+
+    def fn():
+        raise requests.HTTPError(f"{status_code}", response=response)
+
+    return fn
+
+
+def test_retryable_errors_are_retried():
+    clock = Clock()
+    caller = ApiCaller(attempts=3, backoff=1.0, sleep=clock.sleep, clock=clock)
+    results = [requests.ConnectionError("down"), requests.Timeout("slow"), "status"]
+
+    def fn():
+        result = results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert caller.call("status", fn) == "status"
+    stats = caller.stats().get("status")
+    assert stats.get("retries") == 2 and stats.get("succeeded") == 1
+    # full jitter backoff, at most 1 s then 2 s
+    assert clock.now <= 3.0
+
+
+def test_client_errors_are_not_retried():
+    caller = ApiCaller(attempts=3, sleep=lambda seconds: None)
+    with pytest.raises(requests.HTTPError):
+        caller.call("status", failing(404))
+    assert caller.stats().get("status").get("retries") == 0
+
+
+def test_circuit_opens_and_lets_one_trial_through():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60.0, clock=clock)
+    assert not breaker.failure()
+    assert breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now = 60.0
+    assert breaker.allow() and not breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed"
+
+
+def test_open_circuit_rejects_calls():
+    clock = Clock()
+    caller = ApiCaller(attempts=1, failure_threshold=2, reset_timeout=60.0, sleep=clock.sleep, clock=clock)
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError):
+            caller.call("status", failing(503))
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        caller.call("status", lambda: calls.append(1))
+    assert calls == []
+    assert caller.stats().get("status").get("rejected") == 1
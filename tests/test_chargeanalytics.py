@@ -0,0 +1,63 @@
+import pytest
+
+from chargeanalytics import ChargeAnalytics, ChargeTotals
+from samples import fordtime
+
+HOME = {"name": "Home", "latitude": "42.955701", "longitude": "-76.921108"}
+# 50 m from home
+DRIVEWAY = {"name": "Driveway", "latitude": "42.956150", "longitude": "-76.921108"}
+WORK = {"name": "Work", "latitude": "43.048122", "longitude": "-76.147424"}
+
+
+def charge_log(chargeId, day, hours, start, end, location):
+    plugIn = day * 86400
+    return {
+        "chargeId": chargeId,
+        "plugInTime": fordtime(plugIn),
+        "plugOutTime": fordtime(plugIn + hours * 3600),
+        "startBatteryLevel": start,
+        "endBatteryLevel": end,
+        "chargeLocation": location,
+    }
+
+
+LOGS = [
+    charge_log("c1", 0, 8, 40.0, 90.0, HOME),
+    charge_log("c2", 1, 1, 60.0, 80.0, WORK),
+    charge_log("c3", 2, 4, 50.0, 75.0, DRIVEWAY),
+    charge_log("c4", 40, 2, 30.0, 50.0, HOME),
+]
+
+
+def test_totals_add_up():
+    totals = ChargeTotals()
+    analytics = ChargeAnalytics(":memory:", capacity=100)
+    for log in LOGS[:3]:
+        totals.add(analytics.session("vin", log))
+    summary = totals.as_dict()
+    assert summary.get("sessions") == 3
+    assert summary.get("kwh") == pytest.approx(95.0)
+    assert summary.get("duration") == 13 * 3600
+    assert summary.get("average_power") == pytest.approx(95.0 / 13)
+    assert summary.get("max_power") == pytest.approx(20.0)
+
+
+def test_logs_are_added_incrementally_and_once(tmp_path):
+    filename = str(tmp_path / "charging.db")
+    analytics = ChargeAnalytics(filename, capacity=100, radius=150)
+    assert len(analytics.add_logs("vin", LOGS[:2])) == 2
+    # the first two logs again with two new ones, only the new ones are added
+    assert [s.charge_id for s in analytics.add_logs("vin", LOGS)] == ["c3", "c4"]
+    assert analytics.add_logs("vin", LOGS) == []
+
+    locations = analytics.location_totals("vin")
+    # the driveway is within the radius of home
+    assert [(total.get("name"), total.get("sessions")) for total in locations] == [("Home", 3), ("Work", 1)]
+    assert locations[0].get("kwh") == pytest.approx(95.0)
+    analytics.close()
+
+    # the totals are kept in the store, not rebuilt from the sessions
+    reopened = ChargeAnalytics(filename, capacity=100, radius=150)
+    assert reopened.location_totals("vin") == locations
+    assert [total.get("sessions") for total in reopened.month_totals("vin")] == [3, 1]
+    reopened.close()
@@ -0,0 +1,91 @@
+import json
+import threading
+
+import pytest
+
+from events import CHARGING_STARTED, STATUS_CHANGED, TRIP_STARTED, Event, EventBus, EventSink, JsonLinesSink, load_sink
+
+
+class ListSink(EventSink):
+    """Sink keeping the events it handled, 'gate' holds the worker inside handle() until it is set."""
+
+    name = "list"
+
+    def __init__(self, types=None, gate=None):
+        self.types = types
+        self.gate = gate
+        self.entered = threading.Event()
+        self.events = []
+        self.closed = False
+
+    def handle(self, event):
+        self.entered.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.events.append(event)
+
+    def close(self):
+        self.closed = True
+
+
+def event(eventType=STATUS_CHANGED, time=0.0):
+    return Event(eventType, "vin", time, None)
+
+
+def test_sinks_only_get_their_types():
+    bus = EventBus()
+    every = bus.subscribe(ListSink())
+    trips = bus.subscribe(ListSink(types=[TRIP_STARTED]))
+    for eventType in (STATUS_CHANGED, TRIP_STARTED, CHARGING_STARTED):
+        bus.publish(event(eventType))
+    bus.close()
+    assert [e.type for e in every.events] == [STATUS_CHANGED, TRIP_STARTED, CHARGING_STARTED]
+    assert [e.type for e in trips.events] == [TRIP_STARTED]
+
+
+def test_full_queue_drops_the_oldest_event():
+    gate = threading.Event()
+    bus = EventBus(queue_size=2)
+    sink = bus.subscribe(ListSink(gate=gate))
+    bus.publish(event(time=0))
+    assert sink.entered.wait(5)
+    # the worker is inside handle() with the first event, the queue holds two of the next four
+    for time in range(1, 5):
+        bus.publish(event(time=time))
+    gate.set()
+    bus.close()
+    assert [e.time for e in sink.events] == [0, 3, 4]
+    assert bus.metrics().get("list").get("dropped") == 2
+
+
+def test_close_drains_the_queue_and_closes_the_sink(tmp_path):
+    filename = tmp_path / "events.jsonl"
+    bus = EventBus()
+    sink = bus.subscribe(JsonLinesSink(str(filename)))
+    for time in range(10):
+        bus.publish(event(time=time))
+    bus.close()
+    assert sink._file.closed
+    assert [json.loads(line).get("time") for line in filename.read_text().splitlines()] == list(range(10))
+
+
+def test_busy_sink_is_left_open():
+    gate = threading.Event()
+    bus = EventBus()
+    sink = bus.subscribe(ListSink(gate=gate))
+    bus.publish(event())
+    assert sink.entered.wait(5)
+    bus.close(timeout=0.05)
+    assert not sink.closed
+    gate.set()
+
+
+def test_load_sink_errors():
+    with pytest.raises(ValueError):
+        load_sink("ListSink")
+    with pytest.raises(ImportError):
+        load_sink("no_such_module.Sink")
+    with pytest.raises(AttributeError):
+        load_sink("events.NoSuchSink")
+    with pytest.raises(ValueError):
+        load_sink("collections.OrderedDict")
@@ -0,0 +1,84 @@
+import types
+
+import pytest
+
+import gridcache
+from gridcache import GridCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = types.SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(gridcache, "time", types.SimpleNamespace(time=lambda: clock.now))
+    return clock
+
+
+def test_nearby_locations_share_a_cell(clock):
+    cache = GridCache(":memory:", "places", precision=4)
+    cache.put(42.95570, -76.92110, {"address": "home"})
+    assert cache.get(42.955704, -76.921096) == {"address": "home"}
+    assert cache.get(42.9560, -76.9211) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = GridCache(":memory:", "places", ttl=3600)
+    cache.put(42.9557, -76.9211, "home")
+    clock.now += 3600
+    assert cache.get(42.9557, -76.9211) == "home"
+    clock.now += 1
+    assert cache.get(42.9557, -76.9211) is None
+
+
+def test_least_recently_used_cells_are_evicted(clock):
+    cache = GridCache(":memory:", "places", max_entries=2)
+    cache.put(1.0, 1.0, "a")
+    clock.now += 1
+    cache.put(2.0, 2.0, "b")
+    clock.now += 1
+    # using 'a' makes 'b' the least recently used
+    assert cache.get(1.0, 1.0) == "a"
+    clock.now += 1
+    cache.put(3.0, 3.0, "c")
+    assert cache.stats().get("entries") == 2
+    assert cache.get(2.0, 2.0) is None
+    assert cache.get(1.0, 1.0) == "a" and cache.get(3.0, 3.0) == "c"
+
+
+def test_expired_cells_are_evicted_first(clock):
+    cache = GridCache(":memory:", "places", ttl=100, max_entries=2)
+    cache.put(1.0, 1.0, "old")
+    clock.now += 50
+    cache.put(2.0, 2.0, "b")
+    clock.now += 40
+    assert cache.get(1.0, 1.0) == "old"
+    clock.now += 20
+    # 'old' was used last but has expired, 'b' is kept
+    cache.put(3.0, 3.0, "c")
+    assert cache.get(2.0, 2.0) == "b" and cache.get(3.0, 3.0) == "c"
+    assert cache.stats().get("entries") == 2
+
+
+def test_entries_are_counted_without_scanning_the_table(clock):
+    cache = GridCache(":memory:", "places", max_entries=3)
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+    for i in range(5):
+        cache.put(float(i), float(i), i)
+        clock.now += 1
+    # replacing a cell does not add an entry
+    cache.put(4.0, 4.0, "again")
+    assert cache.stats().get("entries") == 3
+    assert not [statement for statement in statements if "COUNT(*)" in statement]
+    assert cache.get(2.0, 2.0) == 2 and cache.get(4.0, 4.0) == "again"
+    assert cache.get(1.0, 1.0) is None
+
+
+def test_expired_cells_are_purged_below_the_limit(clock):
+    cache = GridCache(":memory:", "places", ttl=100, max_entries=1000)
+    cache.put(0.0, 0.0, "old")
+    clock.now += 200
+    for i in range(1, GridCache._PURGE_INTERVAL):
+        cache.put(float(i), float(i), i)
+    assert cache.stats().get("entries") == GridCache._PURGE_INTERVAL - 1
+    assert cache._count() == GridCache._PURGE_INTERVAL - 1
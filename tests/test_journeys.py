@@ -0,0 +1,77 @@
+import logging
+
+import pytest
+
+import journeys
+
+
+def _journey(id):
+    return {
+        "journeyID": id,
+        "start": {"latitude": 42.95, "longitude": -76.92, "timestamp": 1631450000},
+        "end": {"latitude": 42.99, "longitude": -76.95, "timestamp": 1631451200},
+        "distance": 12000.0,
+        "avgSpeed": 10.0,
+    }
+
+
+class StubClient:
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.details = []
+
+    def journey_details(self, id):
+        self.details.append(id)
+        if id in self.failing:
+            raise RuntimeError(f"journey {id} is broken")
+        journey = _journey(id)
+        return {"value": {"summary": journey, "start": journey["start"], "end": journey["end"],
+                          "locations": [], "events": []}}
+
+
+class StubElevation:
+    def __init__(self):
+        self.calls = 0
+
+    def elevation_change(self, start, end):
+        self.calls += 1
+        return 12.0
+
+
+@pytest.fixture
+def tool(monkeypatch):
+    monkeypatch.setattr(journeys, "_STORE", None)
+    monkeypatch.setattr(journeys, "_GEOCLIENT", None)
+    monkeypatch.setattr(journeys, "_ELEVATION", StubElevation())
+    monkeypatch.setattr(journeys, "_VEHICLECLIENT", StubClient())
+    # the details are fetched through the shared API caller, a failure is not worth retrying here
+    monkeypatch.setattr(journeys, "api_call", lambda endpoint, fn, **kwargs: fn(**kwargs))
+    return journeys
+
+
+def test_summary_and_details_are_fetched_in_one_pass(tool):
+    tool.display_journeys([_journey("A"), _journey("B")], showDetailedJourney=True, showElevation=True)
+    assert sorted(tool._VEHICLECLIENT.details) == ["A", "B"]
+    assert tool._ELEVATION.calls == 2
+
+
+def test_failed_journey_is_marked_unavailable(tool, monkeypatch, caplog):
+    def elevation_change(start, end):
+        if start[0] is None:
+            raise ValueError("no location")
+        return 12.0
+
+    monkeypatch.setattr(tool._ELEVATION, "elevation_change", elevation_change)
+    broken = _journey("B")
+    broken["start"] = {"latitude": None, "longitude": None, "timestamp": 1631450000}
+    fetched = tool.prefetch_journeys([_journey("A"), broken, _journey("C")], showElevation=True, workers=2)
+    assert [f.get("unavailable", False) for f in fetched] == [False, True, False]
+    assert fetched[0].get("deltaElevation") == 12.0
+
+
+def test_failed_details_fall_back_to_the_summary(tool, caplog):
+    tool._VEHICLECLIENT.failing.add("B")
+    with caplog.at_level(logging.INFO, logger="fordconnect"):
+        tool.display_journeys([_journey("A"), _journey("B")], showDetailedJourney=True, showElevation=True)
+    assert "Details of journey B are unavailable" in caplog.text
+    assert "Detailed journey A" in caplog.text
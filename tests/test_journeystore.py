@@ -0,0 +1,49 @@
+from journeystore import JourneyStore, sync_journeys
+
+
+def journey(journeyID, start):
+    return {"journeyID": journeyID, "start": {"timestamp": start}, "end": {"timestamp": start + 600}}
+
+
+class Api:
+    """Journeys API stub, the details of the journeys in 'broken' can never be fetched."""
+
+    def __init__(self, journeys, broken):
+        self._journeys = journeys
+        self.broken = set(broken)
+        self.detail_calls = []
+
+    def journeys(self, start, end):
+        return {"value": [j for j in self._journeys if start <= j["start"]["timestamp"] < end]}
+
+    def details(self, id):
+        self.detail_calls.append(id)
+        return None if id in self.broken else {"journeyID": id}
+
+
+def sync(store, api, now):
+    return sync_journeys(
+        store, "vin", api.journeys, api.details, now=now, workers=2, detailAttempts=3, detailRetryInterval=3600
+    )
+
+
+def test_failed_details_are_retried_with_a_limit():
+    store = JourneyStore(":memory:")
+    api = Api([journey(f"j{i}", 1000 + i) for i in range(4)], broken=["j1", "j2"])
+    now = 100000
+    assert sync(store, api, now) == 4
+    assert sorted(api.detail_calls) == ["j0", "j1", "j2", "j3"]
+
+    # too soon to try again
+    api.detail_calls.clear()
+    sync(store, api, now + 600)
+    assert api.detail_calls == []
+
+    # j2 recovers on the second attempt, j1 is given up after the third
+    api.broken.discard("j2")
+    for hours in (2, 4, 6, 8):
+        sync(store, api, now + hours * 3600)
+    assert api.detail_calls == ["j1", "j2", "j1"]
+    assert store.details("j2") == {"journeyID": "j2"}
+    assert store.missing_details("vin", now=now + 100 * 3600, attempts=3) == []
+    assert store.abandoned_details("vin", attempts=3) == 1
@@ -0,0 +1,71 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+
+from metrics import CONTENT_TYPE, REGISTRY, MetricsRegistry, MetricsServer, update_status
+from samples import EPOCH, status_payload
+from vehiclestatus import VehicleStatus
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("test_seconds", "Test latency", ["endpoint"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value, "status")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# TYPE test_seconds histogram", "# HELP test_seconds Test latency"]
+    assert 'test_seconds_bucket{endpoint="status",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{endpoint="status",le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{endpoint="status",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{endpoint="status"} 4' in lines
+    assert 'test_seconds_sum{endpoint="status"} 6.25' in lines
+    assert histogram.count("status") == 4
+    assert lines[-1] == "# EOF"
+
+
+def test_counter_samples_have_the_total_suffix():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_failures", "Test failures", ["endpoint", "reason"])
+    counter.inc("status", 'say "500"')
+    counter.inc("status", 'say "500"', amount=2)
+
+    text = registry.render()
+    assert '# TYPE test_failures counter' in text
+    assert 'test_failures_total{endpoint="status",reason="say \\"500\\""} 3\n' in text
+    assert text.endswith("# EOF\n")
+    with pytest.raises(ValueError):
+        registry.counter("test_failures", "Registered twice")
+
+
+@pytest.fixture
+def status_metrics():
+    REGISTRY.clear()
+    yield REGISTRY
+    REGISTRY.clear()
+
+
+def test_status_gauges_are_scraped(status_metrics):
+    update_status("1234567890", VehicleStatus.from_payload(status_payload(modified=60)))
+
+    server = MetricsServer(port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics", timeout=5) as response:
+            contentType = response.headers.get("Content-Type")
+            text = response.read().decode()
+        with pytest.raises(urllib.error.HTTPError):
+            urllib.request.urlopen(f"http://127.0.0.1:{server.port}/other", timeout=5)
+    finally:
+        server.close()
+
+    assert contentType == CONTENT_TYPE
+    assert 'fordconnect_soc_percent{vin="1234567890"} 88.5' in text
+    assert 'fordconnect_odometer_meters{vin="1234567890"} 3042000.0' in text
+    assert f'fordconnect_status_modified_timestamp_seconds{{vin="1234567890"}} {float(EPOCH + 60)!r}' in text
+    assert 'fordconnect_tire_pressure_kpa{vin="1234567890",tire="leftFrontTirePressure"} 262.0' in text
+    assert text.endswith("# EOF\n")
+    assert metrics.TIRE_PRESSURE.value("1234567890", "outerRightRearTirePressure") == 258.0
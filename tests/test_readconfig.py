@@ -0,0 +1,112 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+from readconfig import CONFIG_SCHEMA, ConfigError, check_section, compile_config, load_config
+
+
+_SECRETS = {"fc_vehicle_name": "Mach-E", "fc_vehicle_vin": "1234567890", "fc_vehicle_username": "driver@example.com",
+            "fc_vehicle_password": "hunter2", "abrp_token": "abrp-secret"}
+
+_CONFIG = """
+fordconnect:
+  name: !secret fc_vehicle_name
+  vin: !secret fc_vehicle_vin
+  username: !secret fc_vehicle_username
+  password: !secret fc_vehicle_password
+abrp:
+  enable: true
+  api_key: abrp-key
+  token: !secret abrp_token
+poller:
+  interval: 20
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    with open(tmp_path / "secrets.yaml", "w") as f:
+        for name, value in _SECRETS.items():
+            f.write(f"{name}: '{value}'\n")
+    with open(tmp_path / "fordconnect.yaml", "w") as f:
+        f.write(_CONFIG)
+    return str(tmp_path / "fordconnect.yaml")
+
+
+def test_defaults_are_filled_in():
+    options = check_section('poller', {'interval': 20})
+    assert options.interval == 20
+    assert options.get('max_workers') == 4
+
+
+def test_missing_section_with_required_options_is_disabled():
+    assert check_section('abrp', None) == {}
+    assert check_section('http', None).get('timeout') == 10.0
+
+
+def test_wrong_type_and_missing_required_option_are_errors():
+    with pytest.raises(ConfigError):
+        check_section('poller', {'max_workers': 'four'})
+    with pytest.raises(ConfigError):
+        check_section('metrics', {'enable': 'yes'})
+    with pytest.raises(ConfigError):
+        check_section('abrp', {'enable': True, 'api_key': 'key'})
+
+
+def test_bool_is_not_a_number():
+    with pytest.raises(ConfigError):
+        check_section('poller', {'interval': True})
+
+
+def test_single_vin_becomes_the_list_of_vins():
+    options = compile_config({'fordconnect': {'name': 'car', 'username': 'u', 'password': 'p', 'vin': 12345}})
+    assert options.fordconnect.vins == ['12345']
+    with pytest.raises(ConfigError):
+        compile_config({'fordconnect': {'name': 'car', 'username': 'u', 'password': 'p'}})
+
+
+def test_every_section_is_compiled():
+    options = compile_config({'fordconnect': {'name': 'car', 'username': 'u', 'password': 'p', 'vins': ['1', '2']}})
+    assert set(options.keys()) == set(CONFIG_SCHEMA.keys())
+
+
+def test_cache_hit_does_not_read_the_yaml_files(config_file, tmp_path, monkeypatch):
+    cacheFile = str(tmp_path / "cache" / "config.json")
+    parsed = load_config(config_file, cacheFile)
+    assert parsed.fordconnect.password == "hunter2"
+    assert parsed.abrp.token == "abrp-secret"
+    assert parsed.poller.interval == 20
+    # the secrets are cached, readable by the owner only
+    assert os.stat(cacheFile).st_mode & 0o777 == 0o600
+
+    # neither PyYAML nor the secrets loader is needed on a hit
+    monkeypatch.setitem(sys.modules, "yamlsecrets", None)
+    cached = load_config(config_file, cacheFile)
+    assert cached == parsed
+    assert cached.poller.interval == 20
+
+
+def test_changed_secrets_invalidate_the_cache(config_file, tmp_path):
+    cacheFile = str(tmp_path / "cache" / "config.json")
+    load_config(config_file, cacheFile)
+    secrets = tmp_path / "secrets.yaml"
+    secrets.write_text(secrets.read_text().replace("hunter2", "correct horse"))
+    os.utime(secrets, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+    # the next run starts without the secrets this one has read
+    import yamlsecrets
+    vars(yamlsecrets)["__SECRET_CACHE"].clear()
+    assert load_config(config_file, cacheFile).fordconnect.password == "correct horse"
+
+
+def test_cache_of_an_older_version_is_replaced(config_file, tmp_path):
+    cacheFile = tmp_path / "cache" / "config.json"
+    cacheFile.parent.mkdir()
+    cacheFile.write_text(json.dumps({"config": config_file, "sections": {"fordconnect": {"password": "old"}}}))
+    os.chmod(cacheFile, 0o644)
+    assert load_config(config_file, str(cacheFile)).fordconnect.password == "hunter2"
+    cached = json.loads(cacheFile.read_text())
+    assert "sections" not in cached and cached["options"]["fordconnect"]["password"] == "hunter2"
+    assert os.stat(cacheFile).st_mode & 0o777 == 0o600
@@ -0,0 +1,84 @@
+import gzip
+
+import pytest
+
+from replay import Recorder, Recording, ReplayVehicle, VirtualClock
+from samples import EPOCH, fordtime, status_payload
+
+
+class StubClient:
+    """Vehicle client answering from a list of status payloads."""
+
+    def __init__(self, statuses):
+        self._statuses = list(statuses)
+
+    def status(self):
+        return self._statuses.pop(0)
+
+    def journeys(self, start=None, end=None):
+        return [{"id": 1, "start": start, "end": end}]
+
+
+def _record(filename, statuses, times):
+    clock = iter(times)
+    recorder = Recorder(filename, clock=lambda: next(clock))
+    client = recorder.wrap(StubClient(statuses), "1234567890")
+    for _ in statuses:
+        client.status()
+    recorder.close()
+    return recorder
+
+
+def test_unchanged_statuses_are_skipped(tmp_path):
+    filename = str(tmp_path / "recording.jsonl")
+    # the same status polled three times, only the server time differs
+    statuses = [status_payload(server_time=seconds) for seconds in (0, 15, 30)] + [status_payload(modified=45)]
+    recorder = _record(filename, statuses, [EPOCH + 15 * i for i in range(4)])
+    assert recorder.recorded == 2 and recorder.skipped == 2
+    assert Recording(filename).count == 2
+
+
+def test_compressed_recording_round_trip(tmp_path):
+    filename = str(tmp_path / "recording.jsonl.gz")
+    statuses = [status_payload(), status_payload(modified=60, ignition="Run")]
+    _record(filename, statuses, [EPOCH, EPOCH + 60])
+    with gzip.open(filename, "rt") as f:
+        assert len(f.readlines()) == 2
+
+    recording = Recording(filename)
+    assert recording.vins == ["1234567890"]
+    assert (recording.start, recording.end) == (EPOCH, EPOCH + 60)
+    assert recording.response("1234567890", "status", EPOCH + 59)["ignitionStatus"]["value"] == "Off"
+    assert recording.response("1234567890", "status", EPOCH + 60)["ignitionStatus"]["value"] == "Run"
+
+
+def test_nothing_is_answered_before_the_first_recording(tmp_path):
+    filename = str(tmp_path / "recording.jsonl")
+    _record(filename, [status_payload()], [EPOCH])
+    recording = Recording(filename)
+    assert recording.response("1234567890", "status", EPOCH - 1) is None
+    assert ReplayVehicle(recording, "1234567890", VirtualClock(start=EPOCH - 1)).status() is None
+
+
+def test_replayed_status_has_the_virtual_server_time(tmp_path):
+    filename = str(tmp_path / "recording.jsonl")
+    recorder = Recorder(filename, clock=lambda: EPOCH)
+    client = recorder.wrap(StubClient([status_payload()]), "1234567890")
+    client.status()
+    client.journeys(start="a", end="b")
+    recorder.close()
+
+    recording = Recording(filename)
+    clock = VirtualClock(start=EPOCH)
+    vehicle = ReplayVehicle(recording, "1234567890", clock)
+    clock.sleep(90)
+    status = vehicle.status()
+    assert status["serverTime"] == fordtime(90)
+    assert status["lastModifiedDate"] == fordtime(0)
+    # the recording itself is left as it was
+    assert recording.response("1234567890", "status", EPOCH + 90)["serverTime"] == fordtime(0)
+
+    assert vehicle.journeys(start="a", end="b") == [{"id": 1, "start": "a", "end": "b"}]
+    with pytest.raises(LookupError):
+        vehicle.journeys(start="c", end="d")
+    assert not hasattr(vehicle, "chargelogs")
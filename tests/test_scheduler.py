@@ -0,0 +1,67 @@
+from poller import VehiclePoller, VehicleState
+from replay import VirtualClock
+from samples import status_payload
+from scheduler import PollScheduler
+from vehiclestatus import VehicleStatus
+
+
+def _status(**kwargs):
+    return VehicleStatus.from_payload(status_payload(**kwargs))
+
+
+def test_no_status_uses_the_interval():
+    assert PollScheduler(interval=15).next_interval(None) == 15
+
+
+def test_driving_and_charging_intervals():
+    scheduler = PollScheduler(interval=15, charging_interval=30)
+    assert scheduler.next_interval(_status(ignition="Run", server_time=3600)) == 15
+    assert scheduler.next_interval(_status(charging="ChargingAC", server_time=3600)) == 30
+    assert scheduler.next_interval(_status(charging="ChargeStartCommanded", server_time=3600)) == 30
+
+
+def test_deep_sleep_interval():
+    assert PollScheduler(sleep_interval=300).next_interval(_status(sleep=True)) == 300
+
+
+def test_parked_backoff_grows_up_to_the_limit():
+    scheduler = PollScheduler(interval=15, idle_factor=0.1, max_interval=120)
+    assert scheduler.next_interval(_status(server_time=60)) == 15
+    assert scheduler.next_interval(_status(server_time=600)) == 60
+    assert scheduler.next_interval(_status(server_time=7200)) == 120
+
+
+def test_max_interval_is_never_below_the_interval():
+    assert PollScheduler(interval=15, max_interval=5).next_interval(_status(server_time=7200)) == 15
+
+
+def test_unchanged_status_backs_off_through_the_poller():
+    """A parked vehicle keeps returning the same status, only the server time moves on."""
+    clock = VirtualClock()
+
+    class Parked:
+        def status(self):
+            return _status(server_time=clock.time())
+
+    processed = []
+    polled = []
+
+    def process(state, status):
+        processed.append(status)
+        polled.append(clock.time())
+        if state.previousStatus is None or status.modified > state.previousStatus.modified:
+            state.previousStatus = status
+
+    state = VehicleState("1234567890", Parked())
+    scheduler = PollScheduler(interval=15, idle_factor=0.1, max_interval=120)
+    poller = VehiclePoller([state], fetch=lambda s: s.client.status(), process=process,
+                           schedule=scheduler.schedule, clock=clock.monotonic, sleep=clock.sleep)
+    poller.run(until=lambda: clock.time() >= 6 * 3600)
+    poller.close()
+
+    assert state.lastStatus is processed[-1]
+    assert state.previousStatus is processed[0]
+    # 15 s polls for the first 20 minutes, then every 2 minutes
+    assert polled[1] - polled[0] == 15
+    assert polled[-1] - polled[-2] == 120
+    assert state.polls < 20 * 4 + 6 * 30
@@ -0,0 +1,86 @@
+import socket
+import sys
+import threading
+import time
+
+import pytest
+import requests
+
+import sessions
+import tokencache
+
+
+@pytest.fixture
+def stalled_url():
+    """URL of a server that accepts connections and never answers."""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(4)
+    held = []
+    threading.Thread(target=lambda: held.append(server.accept()), daemon=True).start()
+    yield f"http://127.0.0.1:{server.getsockname()[1]}/status"
+    server.close()
+
+
+@pytest.fixture
+def short_timeout():
+    saved = dict(sessions._OPTIONS)
+    sessions.close_sessions()
+    sessions.configure_sessions({"timeout": 0.2})
+    yield
+    sessions._OPTIONS.update(saved)
+    sessions.close_sessions()
+
+
+def test_session_requests_time_out(stalled_url, short_timeout):
+    started = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        sessions.get_session("test").get(stalled_url)
+    assert time.perf_counter() - started < 2.0
+
+
+@pytest.fixture
+def fordpass_module():
+    """The fordpass module, with the requests it had restored afterwards."""
+    module = sys.modules[tokencache.Vehicle.__module__]
+    saved = module.requests
+    yield module
+    module.requests = saved
+
+
+class StalledVehicle(tokencache.CachedVehicle):
+    """Vehicle whose status request goes to a server that never answers, the way fordpass makes it."""
+
+    url = None
+
+    def __init__(self, cache_file):
+        super().__init__(username="user", password="password", vin="1234567890", cache_file=cache_file)
+        self.token = "token"
+
+    def status(self):
+        return sys.modules[tokencache.Vehicle.__module__].requests.get(self.url)
+
+
+def test_importing_fordpass_clients_leaves_fordpass_alone(fordpass_module):
+    assert fordpass_module.requests is requests
+
+
+def test_fordpass_calls_use_the_session_of_the_client(stalled_url, short_timeout, fordpass_module, tmp_path):
+    tokencache.use_fordpass_sessions()
+    fordpassRequests = fordpass_module.requests
+    assert isinstance(fordpassRequests, sessions.SessionRequests)
+    # the rest of the requests module is still there for the library
+    assert fordpassRequests.HTTPError is requests.HTTPError
+
+    StalledVehicle.url = stalled_url
+    first = StalledVehicle(str(tmp_path / "token.json"))
+    second = StalledVehicle(str(tmp_path / "token.json"))
+    assert first.session is not second.session
+    used = []
+    original = first.session.request
+    first.session.request = lambda *args, **kwargs: used.append(args) or original(*args, **kwargs)
+    started = time.perf_counter()
+    with pytest.raises(requests.Timeout):
+        first.status()
+    assert time.perf_counter() - started < 2.0
+    assert used and used[0][0] == "GET"
@@ -0,0 +1,66 @@
+from samples import status_payload
+from statusdiff import StatusDiffer
+from vehiclestatus import VehicleStatus
+
+
+def parsed(payload):
+    return VehicleStatus.from_payload(payload)
+
+
+def test_unchanged_status_has_no_differences():
+    differ = StatusDiffer()
+    assert differ.diff(parsed(status_payload()), parsed(status_payload(modified=60))) == {}
+
+
+def test_changed_fields_are_reported_with_the_new_values():
+    differ = StatusDiffer()
+    current = parsed(status_payload(ignition="Run", odometer=3050.0))
+    assert differ.diff(parsed(status_payload()), current) == {"ignitionStatus": "Run", "odometer": 3050.0}
+
+
+def test_linked_and_combined_fields():
+    differ = StatusDiffer()
+    previous = status_payload()
+    current = status_payload()
+    current["gps"]["latitude"] = "42.960000"
+    current["TPMS"]["leftFrontTirePressure"]["value"] = "241"
+    diffs = differ.diff(parsed(previous), parsed(current))
+    assert diffs["latitude"] == 42.96 and diffs["longitude"] == -76.921108
+    # kPa reported as whole psi, all four tires together
+    assert diffs["TPMS"] == [35, 37, 37, 37]
+
+
+def test_pressure_noise_below_a_psi_is_ignored():
+    differ = StatusDiffer()
+    current = status_payload()
+    current["TPMS"]["leftFrontTirePressure"]["value"] = "263"
+    assert differ.diff(parsed(status_payload()), parsed(current)) == {}
+
+
+def test_missing_sections_are_none():
+    differ = StatusDiffer()
+    previous = status_payload()
+    current = status_payload(ignition="Run")
+    del current["TPMS"]
+    del current["doorStatus"]
+    diffs = differ.diff(parsed(previous), parsed(current))
+    assert diffs["ignitionStatus"] == "Run"
+    assert diffs["TPMS"] == [None, None, None, None]
+    assert diffs["driverDoor"] is None
+
+
+def test_door_changes_are_read_from_the_rest_of_the_payload():
+    differ = StatusDiffer()
+    current = status_payload(modified=60)
+    current["doorStatus"]["driverDoor"]["value"] = "Ajar"
+    assert differ.diff(parsed(status_payload()), parsed(current)) == {"driverDoor": "Ajar"}
+
+
+def test_untracked_changes():
+    differ = StatusDiffer()
+    previous = status_payload()
+    current = status_payload(modified=60, ignition="Run")
+    current["newSensor"] = {"value": 1, "timestamp": "now"}
+    current["doorStatus"]["driverDoor"]["value"] = "Ajar"
+    assert differ.untracked(parsed(previous), parsed(current)) == {"newSensor": [None, {"value": 1}]}
+    assert differ.untracked(parsed(previous), parsed(status_payload(modified=60, ignition="Run"))) == {}
@@ -0,0 +1,96 @@
+import json
+import time
+
+import pytest
+import requests
+
+from tokencache import CachedVehicle
+
+
+class StubVehicle(CachedVehicle):
+    """Vehicle that logs in and fetches its status without calling FordPass."""
+
+    revoked = set()
+
+    def __init__(self, cache_file):
+        super().__init__(username="user", password="password", vin="1234567890", cache_file=cache_file)
+        self.logins = 0
+        self.calls = 0
+
+    def _login(self):
+        self.logins += 1
+        self.token = f"token-{self.logins}"
+        self.expiresAt = time.time() + 3600
+        return True
+
+    def status(self):
+        self.calls += 1
+        if self.token is None:
+            self.auth()
+        if self.token in self.revoked:
+            response = requests.Response()
+            response.status_code = 401
+            raise requests.HTTPError("401 Unauthorized", response=response)
+        return {"vin": self.vin, "token": self.token}
+
+
+def _write(filename, token, expiresAt):
+    with open(filename, "w") as f:
+        json.dump({"user": {"token": token, "expiresAt": expiresAt}}, f)
+
+
+def _cached(filename):
+    with open(filename) as f:
+        return json.load(f).get("user")
+
+
+def test_login_is_cached_for_the_next_client(tmp_path):
+    filename = str(tmp_path / "token.json")
+    first = StubVehicle(filename)
+    assert first.status().get("token") == "token-1"
+    assert first.auth_cached is False
+
+    second = StubVehicle(filename)
+    assert second.status().get("token") == "token-1"
+    assert second.auth_cached is True
+    assert second.logins == 0
+
+
+def test_expired_token_is_not_used(tmp_path):
+    filename = str(tmp_path / "token.json")
+    _write(filename, "old", time.time() + 10)
+    vehicle = StubVehicle(filename)
+    assert vehicle.status().get("token") == "token-1"
+    assert vehicle.logins == 1
+    assert _cached(filename).get("token") == "token-1"
+
+
+def test_rejected_cached_token_is_dropped_and_login_retried_once(tmp_path, monkeypatch):
+    filename = str(tmp_path / "token.json")
+    _write(filename, "revoked", time.time() + 3600)
+    monkeypatch.setattr(StubVehicle, "revoked", {"revoked"})
+    vehicle = StubVehicle(filename)
+    assert vehicle.status().get("token") == "token-1"
+    assert vehicle.calls == 2
+    assert vehicle.logins == 1
+    assert _cached(filename).get("token") == "token-1"
+
+
+def test_rejected_fresh_login_is_not_retried(tmp_path, monkeypatch):
+    filename = str(tmp_path / "token.json")
+    monkeypatch.setattr(StubVehicle, "revoked", {"token-1"})
+    vehicle = StubVehicle(filename)
+    with pytest.raises(requests.HTTPError):
+        vehicle.status()
+    assert vehicle.calls == 1
+    assert vehicle.logins == 1
+
+
+def test_token_replaced_by_another_client_is_kept(tmp_path):
+    filename = str(tmp_path / "token.json")
+    _write(filename, "newer", time.time() + 3600)
+    vehicle = StubVehicle(filename)
+    vehicle.token = "revoked"
+    vehicle.invalidate()
+    assert vehicle.token is None
+    assert _cached(filename).get("token") == "newer"
@@ -0,0 +1,41 @@
+import math
+
+import pytest
+
+from tripanalysis import TripSamples, analyze_trip, soc_used
+
+
+def samples_of(odometer, soc):
+    samples = TripSamples()
+    samples.timestamp = [60.0 * i for i in range(len(odometer))]
+    samples.odometer = list(odometer)
+    samples.soc = list(soc)
+    samples.latitude = [42.9557] * len(odometer)
+    samples.longitude = [-76.9211] * len(odometer)
+    return samples
+
+
+def test_two_samples_use_the_end_points():
+    assert soc_used(samples_of([3042.0, 3052.0], [80.0, 78.5])) == (1.5, 0.5, "end points")
+
+
+def test_many_samples_use_the_fit_when_tighter():
+    odometer = [3042.0 + 0.25 * i for i in range(81)]
+    # 0.2 % per km, reported in 0.5 % steps
+    soc = [math.floor((80.0 - 0.2 * (km - 3042.0)) * 2) / 2 for km in odometer]
+    used, bound, method = soc_used(samples_of(odometer, soc))
+    assert method == "fit"
+    assert bound < 0.5
+    assert used == pytest.approx(4.0, abs=bound)
+
+
+def test_fit_looser_than_the_end_points_falls_back():
+    used, bound, method = soc_used(samples_of([3042.0, 3042.1, 3042.2], [80.0, 75.0, 79.5]))
+    assert (used, bound, method) == (0.5, 0.5, "end points")
+
+
+def test_analysis_reports_the_method():
+    trip = analyze_trip(samples_of([3042.0, 3052.0], [80.0, 78.5]), 88)
+    assert trip.get("soc_method") == "end points"
+    assert trip.get("kwh") == pytest.approx(1.32)
+    assert trip.get("kwh_error") == pytest.approx(0.44)
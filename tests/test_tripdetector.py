@@ -0,0 +1,45 @@
+from tripdetector import TripDetector, TripPoint
+
+
+def point(minutes, ignition="Off", odometer=3042.0, soc=80.0):
+    return TripPoint(minutes * 60.0, ignition, odometer, soc, 42.9557, -76.9211)
+
+
+def test_ignition_on_and_off():
+    detector = TripDetector("vin")
+    trips = detector.feed([point(0), point(1, "Run"), point(10, "Run", 3050.0), point(20, "Off", 3055.0)])
+    assert len(trips) == 1
+    trip = trips[0]
+    assert trip.start.modified == 60.0 and trip.end.modified == 1200.0
+    assert trip.distance == 13.0
+    assert trip.duration == 1140.0
+    assert not trip.inferred and trip.timed
+    assert not detector.driving
+
+
+def test_gap_ends_the_trip_at_the_last_status():
+    detector = TripDetector("vin", max_gap=3600.0)
+    trips = detector.feed([point(0, "Run"), point(5, "Run", 3046.0), point(125, "Run", 3100.0)])
+    assert len(trips) == 1
+    assert trips[0].end.modified == 300.0
+    assert trips[0].inferred and trips[0].timed
+    # the status after the gap starts a new trip
+    assert detector.driving and detector.started.modified == 7500.0
+
+
+def test_odometer_trip_between_statuses_is_not_timed():
+    detector = TripDetector("vin", min_distance=0.5)
+    trips = detector.feed([point(0), point(240, "Off", 3060.0)])
+    assert len(trips) == 1
+    trip = trips[0]
+    assert trip.inferred and not trip.timed
+    assert trip.distance == 18.0
+    assert trip.duration is None
+    assert trip.max_duration == 14400.0
+    assert trip.as_dict()["duration"] is None
+
+
+def test_small_odometer_change_and_stale_statuses_are_ignored():
+    detector = TripDetector("vin", min_distance=0.5)
+    assert detector.feed([point(0), point(60, "Off", 3042.4), point(30, "Run")]) == []
+    assert detector.trips == 0 and not detector.driving
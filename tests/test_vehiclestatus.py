@@ -0,0 +1,77 @@
+import pytest
+
+from samples import EPOCH, status_payload
+from vehiclestatus import NUMBER_FIELDS, STATE_FIELDS, VALUE_FIELDS, VehicleStatus, _parse_fast, _parse_slow
+
+
+def test_typed_fields():
+    status = VehicleStatus.from_payload(status_payload(modified=60, server_time=75, ignition="Run"))
+    assert status.vin == "1234567890"
+    assert status.modified == EPOCH + 60
+    assert status.server_time == EPOCH + 75
+    assert status.ignition == "Run"
+    assert status.odometer == 3042.0
+    assert status.latitude == pytest.approx(42.955701)
+    assert status.tire_pressures == [262.0, 258.0, 256.0, 258.0]
+    assert status.deep_sleep == 0.0
+
+
+def test_none_and_parsed_statuses_pass_through():
+    status = VehicleStatus.from_payload(status_payload())
+    assert VehicleStatus.from_payload(None) is None
+    assert VehicleStatus.from_payload(status) is status
+
+
+def test_fast_and_slow_parsers_agree():
+    payload = status_payload(ignition="Start", charging="ChargingAC")
+    for name, path in VALUE_FIELDS:
+        part = payload
+        for key in path[:-1]:
+            part = part.setdefault(key, {})
+        part[path[-1]] = None
+    fast = VehicleStatus.__new__(VehicleStatus)
+    slow = VehicleStatus.__new__(VehicleStatus)
+    # the fast parser only knows the states seen before
+    VehicleStatus.from_payload(payload)
+    _parse_fast(fast, payload)
+    _parse_slow(slow, payload)
+    for name in ["vin"] + [name for name, _, _ in NUMBER_FIELDS] + [name for name, _ in STATE_FIELDS + VALUE_FIELDS]:
+        assert getattr(fast, name) == getattr(slow, name), name
+
+
+def test_new_state_takes_the_slow_path_and_is_shared():
+    first = VehicleStatus.from_payload(status_payload(charging="NewChargingState"))
+    second = VehicleStatus.from_payload(status_payload(charging="".join(["NewCharging", "State"])))
+    assert first.charging == "NewChargingState"
+    assert second.charging is first.charging
+
+
+def test_missing_and_malformed_fields_are_none():
+    payload = status_payload()
+    del payload["gps"]
+    payload["TPMS"]["leftFrontTirePressure"]["value"] = "---"
+    payload["lastModifiedDate"] = "not a time"
+    status = VehicleStatus.from_payload(payload)
+    assert status.latitude is None and status.longitude is None
+    assert status.left_front_tire is None
+    assert status.right_front_tire == 258.0
+    assert status.modified is None
+    assert status.ignition == "Off"
+
+
+def test_rest_of_the_payload():
+    payload = status_payload()
+    payload["remoteStart"] = {"remoteStartDuration": 10, "remoteStartTime": 0, "timestamp": "now"}
+    status = VehicleStatus.from_payload(payload)
+    assert status.path("doorStatus", "driverDoor", "value") == "Closed"
+    assert status.path("doorStatus", "missing", "value") is None
+    assert status.path("remoteStart") == {"remoteStartDuration": 10, "remoteStartTime": 0}
+    # the parsed fields and the timestamps are not kept twice
+    assert status.path("ignitionStatus") is None
+    assert "vin" not in status.rest_dict() and "gps" not in status.rest_dict()
+
+
+def test_unchanged_rest_is_shared():
+    first = VehicleStatus.from_payload(status_payload(modified=0))
+    second = VehicleStatus.from_payload(status_payload(modified=60, ignition="Run"))
+    assert second.rest is first.rest